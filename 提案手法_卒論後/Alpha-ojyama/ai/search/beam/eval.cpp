@@ -32,7 +32,7 @@ void evaluate(node::Data& node, i32 tear, i32 waste, const Weight& w)
         }
         else {
             // Find the best matching form
-            for (i32 i = 0; i < _countof(list); ++i) {
+            for (i32 i = 0; i < std::size(list); ++i) {
                 form = std::max(form, form::evaluate(node.field, heights, list[i]));
             }
         }
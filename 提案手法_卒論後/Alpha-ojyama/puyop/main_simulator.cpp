@@ -2,40 +2,59 @@
 #include <fstream>
 #include <sstream>
 #include <string>
+#include <cstdio>
+#include <cstring>
 #include "../core/core.h"
 #include "../core/field.h"
 #include "../core/move.h"
 #include "../core/chain.h"
+#include "simulator.h"
+
+#ifdef _WIN32
+#include <io.h>
+#include <fcntl.h>
+#endif
 
 /**
  * puyop_simulator.exe
  * 
  * シンプル版（おじゃまぷよはPython側で管理）
+ *
+ * 使い方:
+ *   ファイルモード: puyop_simulator.exe <input_field> <x> <rotation> <color1> <color2> <output_field> <output_result>
+ *   サーバーモード: puyop_simulator.exe --server
+ *
+ * サーバーモードでは起動時に挨拶 (8 bytes): "PUYS", プロトコル版数 int32 を標準出力へ書き、
+ * 以後は標準入力からバイナリのリクエストを読み続けて、
+ * 1リクエストごとに標準出力へバイナリのレスポンスを返す（プロセスは使い回す）。
+ *   リクエスト (88 bytes): board int8[14*6]（y=0が最下段, 行優先）, x, rotation, color1, color2 (int8)
+ *   レスポンス (96 bytes): board int8[14*6], score int32, chain int32, game_over int32
+ *   game_over は 1=ゲームオーバー, 0=継続, -1=引数エラー（x / rotation が範囲外か、子ぷよが壁の外に出る。board は入力のまま）
  */
 
-static int cell_type_to_int(cell:: Type t) {
-    switch (t) {
-    case cell::Type::NONE:    return 0;
-    case cell::Type::RED:     return 1;
-    case cell::Type::GREEN:   return 2;
-    case cell::Type::BLUE:    return 3;
-    case cell::Type::YELLOW:  return 4;
-    case cell::Type::GARBAGE: return 6;
-    default:                  return 0;
-    }
-}
-
-static cell:: Type int_to_cell_type(int val) {
-    switch (val) {
-    case 0: return cell::Type::NONE;
-    case 1: return cell::Type::RED;
-    case 2: return cell::Type::GREEN;
-    case 3: return cell::Type::BLUE;
-    case 4: return cell::Type::YELLOW;
-    case 6: return cell::Type::GARBAGE;
-    default:   return cell::Type::NONE;
-    }
-}
+struct Request
+{
+    i8 board[BOARD_SIZE];
+    i8 x;
+    i8 r;
+    i8 c1;
+    i8 c2;
+};
+
+struct Reply
+{
+    i8 board[BOARD_SIZE];
+    i32 score;
+    i32 chain;
+    i32 game_over;
+};
+
+static_assert(sizeof(Request) == 88, "Request layout must match the Python side");
+static_assert(sizeof(Reply) == 96, "Reply layout must match the Python side");
+
+// Request / Reply のレイアウトを変えたら上げる（Python側の SERVER_PROTOCOL_VERSION と揃える）
+constexpr char SERVER_MAGIC[4] = { 'P', 'U', 'Y', 'S' };
+constexpr i32 SERVER_PROTOCOL_VERSION = 1;
 
 Field load_field(const std::string& filename) {
     std::ifstream file(filename);
@@ -67,6 +86,53 @@ Field load_field(const std::string& filename) {
     return field;
 }
 
+// サーバーモード: 標準入力が閉じられるまでリクエストを処理し続ける
+int run_server() {
+#ifdef _WIN32
+    _setmode(_fileno(stdin), _O_BINARY);
+    _setmode(_fileno(stdout), _O_BINARY);
+#endif
+
+    // 挨拶: Python側はこれで --server 対応のビルドか・版数が合うかを確かめる
+    if (std::fwrite(SERVER_MAGIC, sizeof(SERVER_MAGIC), 1, stdout) != 1 ||
+        std::fwrite(&SERVER_PROTOCOL_VERSION, sizeof(SERVER_PROTOCOL_VERSION), 1, stdout) != 1) {
+        return 1;
+    }
+    std::fflush(stdout);
+
+    Request request;
+    Reply reply;
+
+    while (std::fread(&request, sizeof(Request), 1, stdin) == 1) {
+        i32 x = request.x;
+        i32 r = request.r;
+        if (!placement_in_bounds(x, r)) {
+            std::memcpy(reply.board, request.board, sizeof(reply.board));
+            reply.score = 0;
+            reply.chain = 0;
+            reply.game_over = -1;
+        }
+        else {
+            Field field = field_from_array(request.board);
+
+            bool game_over = false;
+            auto chain_result = simulate(field, x, r, request.c1, request.c2, game_over);
+
+            field_to_array(field, reply.board);
+            reply.score = chain_result.score;
+            reply.chain = chain_result.count;
+            reply.game_over = game_over ? 1 : 0;
+        }
+
+        if (std::fwrite(&reply, sizeof(Reply), 1, stdout) != 1) {
+            return 1;
+        }
+        std::fflush(stdout);
+    }
+
+    return 0;
+}
+
 void save_field(const Field& field, const std::string& filename) {
     std::ofstream file(filename);
 
@@ -80,9 +146,14 @@ void save_field(const Field& field, const std::string& filename) {
 }
 
 int main(int argc, char* argv[]) {
+    if (argc >= 2 && std::string(argv[1]) == "--server") {
+        return run_server();
+    }
+
     if (argc < 8) {
         std::cerr << "Usage: " << argv[0] 
-                  << " <input_field> <x> <rotation> <color1> <color2> <output_field> <output_result>\n";
+                  << " <input_field> <x> <rotation> <color1> <color2> <output_field> <output_result>\n"
+                  << "       " << argv[0] << " --server\n";
         return 1;
     }
 
@@ -96,6 +167,11 @@ int main(int argc, char* argv[]) {
 
     std::cerr << "[DEBUG][C++] params: x=" << x << " r=" << r << " c1=" << c1 << " c2=" << c2 << std::endl;
 
+    if (!placement_in_bounds(x, r)) {
+        std::cerr << "[ERROR][C++] placement out of bounds: x=" << x << ", r=" << r << std::endl;
+        return 1;
+    }
+
     Field field = load_field(input_field_file);
 
     auto dir = static_cast<direction:: Type>(r);
@@ -0,0 +1,138 @@
+#include "../core/core.h"
+#include "simulator.h"
+#include "../ai/search/beam/beam.h"
+
+/**
+ * puyo_capi.dll / puyo_capi.so
+ *
+ * Field::drop_pair, Field::pop, chain::get_score をフラットなC ABIで公開する共有ライブラリ
+ * Python側（AlphaGo-Zero-master/puyo_native.py）から ctypes で呼び出す。
+ *
+ * puyo_beam_search は ai/search/beam の beam::search_multi を呼び、初手の候補ごとのスコアを返す
+ * （Python側 beam_prior.py から MCTS の事前確率として使う）。
+ *
+ * 盤面は int8[14*6]（y=0が最下段, 行優先）の連続バッファをそのまま受け取る（コピー不要）。
+ * board と out_board に同じバッファを渡してもよい。
+ */
+
+#ifdef _WIN32
+#define PUYO_API extern "C" __declspec(dllexport)
+#else
+#define PUYO_API extern "C" __attribute__((visibility("default")))
+#endif
+
+constexpr i32 PUYO_CAPI_VERSION = 3;
+
+PUYO_API i32 puyo_capi_version()
+{
+    return PUYO_CAPI_VERSION;
+}
+
+// 1手進める
+// 戻り値: 1=ゲームオーバー, 0=継続, -1=引数エラー
+PUYO_API i32 puyo_step(const i8* board, i8* out_board, i32 x, i32 r, i32 c1, i32 c2, i32* score, i32* chain)
+{
+    if (!placement_in_bounds(x, r)) {
+        return -1;
+    }
+
+    Field field = field_from_array(board);
+
+    bool game_over = false;
+    auto chain_result = simulate(field, x, r, c1, c2, game_over);
+
+    field_to_array(field, out_board);
+    *score = chain_result.score;
+    *chain = chain_result.count;
+
+    return game_over ? 1 : 0;
+}
+
+// n盤面をまとめて1手ずつ進める（boards / out_boards は int8[n][14*6]）
+// game_overs[i]: 1=ゲームオーバー, 0=継続, -1=引数エラー（その盤面はそのままコピー）
+// 戻り値: 引数エラーだった盤面の数
+PUYO_API i32 puyo_step_batch(
+    i32 n,
+    const i8* boards,
+    i8* out_boards,
+    const i32* xs,
+    const i32* rs,
+    const i32* c1s,
+    const i32* c2s,
+    i32* scores,
+    i32* chains,
+    i32* game_overs)
+{
+    i32 errors = 0;
+
+    for (i32 i = 0; i < n; ++i) {
+        const i8* board = boards + static_cast<i64>(i) * BOARD_SIZE;
+        i8* out_board = out_boards + static_cast<i64>(i) * BOARD_SIZE;
+
+        game_overs[i] = puyo_step(board, out_board, xs[i], rs[i], c1s[i], c2s[i], &scores[i], &chains[i]);
+
+        if (game_overs[i] < 0) {
+            if (out_board != board) {
+                memcpy(out_board, board, BOARD_SIZE);
+            }
+            scores[i] = 0;
+            chains[i] = 0;
+            ++errors;
+        }
+    }
+
+    return errors;
+}
+
+// ビームサーチ（beam::search_multi）で初手の候補を評価する
+// queue: 分かっているペア（c1s[i], c2s[i]）を n_queue 個。足りない分は search_multi が乱数のツモで補う
+// weights: beam::eval::Weight のメンバを宣言順に並べた i32[15]（config.json の "build"）
+// out_scores: i64[BOARD_WIDTH * 4]。action = x + r * 6 の位置に候補のスコアを書く（候補にない手は -1）
+// 戻り値: 候補の数, -1=引数エラー
+PUYO_API i32 puyo_beam_search(
+    const i8* board,
+    i32 n_queue,
+    const i32* c1s,
+    const i32* c2s,
+    const i32* weights,
+    i32 width,
+    i32 depth,
+    i64* out_scores)
+{
+    if (n_queue < 1 || width < 1 || depth < n_queue) {
+        return -1;
+    }
+
+    Field field = field_from_array(board);
+
+    cell::Queue queue;
+    for (i32 i = 0; i < n_queue; ++i) {
+        queue.push_back({ int_to_cell_type(c1s[i]), int_to_cell_type(c2s[i]) });
+    }
+
+    beam::eval::Weight w;
+    i32* members[] = {
+        &w.chain, &w.y, &w.key, &w.chi,
+        &w.shape, &w.well, &w.bump, &w.form, &w.link_2, &w.link_3, &w.waste_14, &w.side, &w.nuisance,
+        &w.tear, &w.waste
+    };
+    for (size_t i = 0; i < std::size(members); ++i) {
+        *members[i] = weights[i];
+    }
+
+    beam::Configs configs;
+    configs.width = static_cast<size_t>(width);
+    configs.depth = static_cast<size_t>(depth);
+
+    auto result = beam::search_multi(field, queue, w, configs);
+
+    for (i32 i = 0; i < BOARD_WIDTH * static_cast<i32>(direction::COUNT); ++i) {
+        out_scores[i] = -1;
+    }
+    for (const auto& candidate : result.candidates) {
+        i32 action = candidate.placement.x + static_cast<i32>(candidate.placement.r) * BOARD_WIDTH;
+        out_scores[action] = static_cast<i64>(candidate.score);
+    }
+
+    return static_cast<i32>(result.candidates.size());
+}
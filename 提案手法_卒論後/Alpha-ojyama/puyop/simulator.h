@@ -0,0 +1,81 @@
+#pragma once
+
+#include "../core/core.h"
+
+// puyop_simulator と Python 連携用の共通処理
+// Python側の盤面は int8[14][6]（y=0が最下段）で、値は 0=空, 1=赤, 2=緑, 3=青, 4=黄, 6=おじゃま
+
+constexpr int BOARD_HEIGHT = 14;
+constexpr int BOARD_WIDTH = 6;
+constexpr int BOARD_SIZE = BOARD_HEIGHT * BOARD_WIDTH;
+
+inline int cell_type_to_int(cell::Type t) {
+    switch (t) {
+    case cell::Type::NONE:    return 0;
+    case cell::Type::RED:     return 1;
+    case cell::Type::GREEN:   return 2;
+    case cell::Type::BLUE:    return 3;
+    case cell::Type::YELLOW:  return 4;
+    case cell::Type::GARBAGE: return 6;
+    default:                  return 0;
+    }
+}
+
+inline cell::Type int_to_cell_type(int val) {
+    switch (val) {
+    case 0: return cell::Type::NONE;
+    case 1: return cell::Type::RED;
+    case 2: return cell::Type::GREEN;
+    case 3: return cell::Type::BLUE;
+    case 4: return cell::Type::YELLOW;
+    case 6: return cell::Type::GARBAGE;
+    default:   return cell::Type::NONE;
+    }
+}
+
+// 盤面配列（y=0が最下段）からFieldを作る（load_fieldと同じく下の行から落とす）
+inline Field field_from_array(const i8 board[BOARD_SIZE]) {
+    Field field;
+
+    for (int y = 0; y < BOARD_HEIGHT; ++y) {
+        for (int x = 0; x < BOARD_WIDTH; ++x) {
+            cell::Type type = int_to_cell_type(board[y * BOARD_WIDTH + x]);
+            if (type != cell::Type::NONE) {
+                field.drop_puyo(static_cast<i8>(x), type);
+            }
+        }
+    }
+    return field;
+}
+
+inline void field_to_array(const Field& field, i8 board[BOARD_SIZE]) {
+    for (int y = 0; y < BOARD_HEIGHT; ++y) {
+        for (int x = 0; x < BOARD_WIDTH; ++x) {
+            board[y * BOARD_WIDTH + x] = static_cast<i8>(cell_type_to_int(field.get_cell(static_cast<i8>(x), static_cast<i8>(y))));
+        }
+    }
+}
+
+// 子ぷよも盤面に収まる (x, rotation) か（x=0 の LEFT と x=5 の RIGHT は壁の外に出るので不可）
+inline bool placement_in_bounds(int x, int r) {
+    if (x < 0 || x >= BOARD_WIDTH || r < 0 || r >= static_cast<int>(direction::COUNT)) {
+        return false;
+    }
+    auto dir = static_cast<direction::Type>(r);
+    return !(x == 0 && dir == direction::Type::LEFT) && !(x == BOARD_WIDTH - 1 && dir == direction::Type::RIGHT);
+}
+
+// ペアを置いて連鎖まで進める（サーバーモード・共有ライブラリ共通）
+inline chain::Score simulate(Field& field, int x, int r, int c1, int c2, bool& game_over) {
+    auto dir = static_cast<direction::Type>(r);
+    cell::Pair pair = {int_to_cell_type(c1), int_to_cell_type(c2)};
+
+    field.drop_pair(static_cast<i8>(x), dir, pair);
+
+    auto mask = field.pop();
+    auto chain_result = chain::get_score(mask);
+
+    game_over = (field.get_height_max() > 12);
+
+    return chain_result;
+}
\ No newline at end of file
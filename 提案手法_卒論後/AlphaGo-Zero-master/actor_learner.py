@@ -0,0 +1,114 @@
+"""
+自己対戦と学習を止めずに並行して回す（非同期 actor-learner）
+
+自己対戦ワーカー（actor, selfplay_pool.SelfPlayPool）は公開された最新の重みでエピソードを打ち続け、
+メインプロセス（learner）は溜まった例からミニバッチを取って学習し続ける。
+num_steps ステップごとに新しい重みを公開し（＝1イテレーション）、以後に割り当てるエピソードはその重みで打つ。
+
+例にはそれを打った重みのバージョンを付けておき、今のバージョンより max_staleness 版を超えて古い例は学習に使わない。
+
+    learner = ActorLearner(solver, max_staleness=2)
+    for iteration in range(num_iterations):
+        results, examples, stats = learner.run_iteration(num_steps=500)   # 終わったエピソードと新しい例
+        torch.save(net.state_dict(), ...)
+    learner.close()
+"""
+import time
+
+import numpy as np
+
+
+class ActorLearner:
+    """
+    引数:
+        solver: Solver（自己対戦の設定・ネットワーク・ワーカーを使う。ワーカー数は num_selfplay_workers、最低1）
+        replay_size: バッファに持つ例の最大数（古いものから捨てる）
+        max_staleness: 学習に使う例の、今の重みとのバージョン差の上限
+        batch_size: ミニバッチの大きさ
+        min_examples: バッファにこれだけ溜まるまで学習を始めない
+    """
+    def __init__(self, solver, replay_size=50000, max_staleness=2, batch_size=32, min_examples=1000):
+        self.solver = solver
+        self.replay_size = replay_size
+        self.max_staleness = max_staleness
+        self.batch_size = batch_size
+        self.min_examples = min_examples
+        self.optimizer = solver.create_optimizer()
+        self.pool = solver.selfplay_pool()
+        self.version = self.pool.weights_version
+        self.examples = []          # 学習に使う例
+        self.versions = []          # examples と同じ順の、打った重みのバージョン
+        self.num_episodes = 0
+
+    def _on_start(self, episode, worker):
+        print(f"エピソード {episode + 1}（ワーカー{worker}、重み v{self.version}）", flush=True)
+
+    def _add(self, records, results, new_examples):
+        """終わったエピソードの例をバッファに足す（古すぎる重みで打ったものは捨てる）"""
+        for record in records:
+            self.num_episodes += 1
+            results.append(record['result'])
+            self.solver.add_eval_cache_stats(record['cache_stats'])
+            if self.version - record['version'] > self.max_staleness:
+                continue
+            new_examples.extend(record['examples'])
+            self.examples.extend(record['examples'])
+            self.versions.extend([record['version']] * len(record['examples']))
+        overflow = len(self.examples) - self.replay_size
+        if overflow > 0:
+            del self.examples[:overflow]
+            del self.versions[:overflow]
+
+    def _drop_stale(self):
+        """新しい重みを公開したあと、max_staleness より古い例を捨てる"""
+        keep = [i for i, version in enumerate(self.versions) if self.version - version <= self.max_staleness]
+        if len(keep) < len(self.versions):
+            self.examples = [self.examples[i] for i in keep]
+            self.versions = [self.versions[i] for i in keep]
+
+    def run_iteration(self, num_steps):
+        """
+        自己対戦を回しながら num_steps ステップ学習し、新しい重みを公開する
+        （少なくとも1エピソードは終わるまで待つ）
+
+        返り値:
+            results: この間に終わったエピソードの結果（execute_episode の result）
+            examples: この間に増えた例
+            stats: 学習の統計（steps, loss, buffer, mean_staleness, seconds）
+        """
+        results = []
+        new_examples = []
+        losses = []
+        staleness = []
+        start = time.perf_counter()
+        self.pool.submit(self._on_start)
+        while len(losses) < num_steps or not results:
+            ready = len(self.examples) >= self.min_examples and len(losses) < num_steps
+            self._add(self.pool.poll(timeout=0 if ready else None), results, new_examples)
+            self.pool.submit(self._on_start)
+            if len(self.examples) < self.min_examples or len(losses) >= num_steps:
+                continue
+            indices = np.random.randint(0, len(self.examples), size=self.batch_size)
+            losses.append(self.solver.train_batch(self.optimizer, [self.examples[i] for i in indices]))
+            staleness.append(self.version - np.mean([self.versions[i] for i in indices]))
+
+        # 新しい重みを公開（静的量子化のキャリブレーションにはバッファの盤面を使う）
+        calibration = [self.examples[i][0] for i in np.random.permutation(len(self.examples))[:256]]
+        self.solver.new_weights(calibration_boards=np.array(calibration))
+        self.pool = self.solver.selfplay_pool()
+        self.version = self.pool.weights_version
+        self._drop_stale()
+
+        stats = {
+            'steps': len(losses),
+            'loss': float(np.mean(losses)) if losses else 0.0,
+            'buffer': len(self.examples),
+            'mean_staleness': float(np.mean(staleness)) if staleness else 0.0,
+            'seconds': time.perf_counter() - start,
+        }
+        print(f"学習: {stats['steps']}ステップ, Loss: {stats['loss']:.4f}, バッファ{stats['buffer']}例 "
+              f"(重みの古さ 平均{stats['mean_staleness']:.2f}版), {stats['seconds']:.1f}s → 重み v{self.version} を公開", flush=True)
+        return results, new_examples, stats
+
+    def close(self):
+        self.solver.close()
@@ -0,0 +1,140 @@
+"""
+ビームサーチ（Alpha-ojyama の beam::search_multi）による MCTS の事前確率
+
+学習初期のネットワークの方策は弱いので、置くペアが分かっている盤面（根）では
+ama のビームサーチで初手の候補を評価し、そのスコアを24手の分布にしてネットワークの方策に混ぜる。
+
+    prior = BeamPrior(weight=0.5)
+    mcts = MCTS(game=game, net=net, prior_source=prior)
+    mcts.run_simulations(state, 120, pair=current_pair)   # 根の事前確率にビームサーチを混ぜる
+
+結果は (盤面ハッシュ, ペア列) ごとに LRUCache に持つ。
+共有ライブラリは puyo_capi（バージョン3以降）。ビルド: Alpha-ojyama で `make puyo_capi`
+"""
+import json
+import os
+
+import numpy as np
+
+import puyo_native
+from lru_cache import LRUCache
+
+
+DEFAULT_CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Alpha-ojyama', 'config.json'
+)
+
+_MISSING = object()
+
+# beam::eval::Weight のメンバの宣言順（puyo_beam_search に渡す順）
+WEIGHT_KEYS = (
+    'chain', 'y', 'key', 'chi',
+    'shape', 'well', 'bump', 'form', 'link_2', 'link_3', 'waste_14', 'side', 'nuisance',
+    'tear', 'waste',
+)
+
+
+def load_weights(config_path=None, name='build'):
+    """config.json の評価関数の重み（ビームサーチは "build"）を WEIGHT_KEYS の順の配列にする"""
+    if config_path is None:
+        config_path = DEFAULT_CONFIG_PATH
+    with open(config_path, encoding='utf-8') as f:
+        weights = json.load(f)[name]
+    return np.array([weights.get(key, 0) for key in WEIGHT_KEYS], dtype=np.int32)
+
+
+class BeamPrior:
+    """
+    引数:
+        weight: ネットワークの方策に混ぜる割合（0ならネットワークのみ、1ならビームサーチのみ）
+        width, depth: ビームの幅と深さ（ama の既定は 250, 16。自己対戦では軽めにする）
+        temperature: スコアを 最大スコア比 / temperature のsoftmaxで分布にする
+        cache_size: キャッシュする盤面数
+        library_path: puyo_capi のパス（Noneなら既定パス）
+        config_path: 重みを読む config.json（Noneなら Alpha-ojyama/config.json）
+    """
+    def __init__(self, weight=0.5, width=40, depth=8, temperature=0.2, cache_size=20000,
+                 library_path=None, config_path=None):
+        self.weight = weight
+        self.width = width
+        self.depth = depth
+        self.temperature = temperature
+        self.library_path = library_path
+        self.weights = load_weights(config_path)
+        self.cache = LRUCache(cache_size)
+        self.num_searches = 0
+        self._lib = None
+        self._scores = np.empty(puyo_native.BOARD_WIDTH * 4, dtype=np.int64)
+
+    # ワーカープロセスへ送るとき、ctypes のライブラリとキャッシュは送らない
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lib'] = None
+        state['cache'] = LRUCache(self.cache.max_entries)
+        return state
+
+    def _library(self):
+        if self._lib is None:
+            lib = puyo_native.load_library(self.library_path)
+            if not hasattr(lib, 'puyo_beam_search'):
+                raise RuntimeError(
+                    f"{lib._name} has no puyo_beam_search (CAPI version {lib.puyo_capi_version()}); "
+                    f"rebuild with `make puyo_capi`"
+                )
+            self._lib = lib
+        return self._lib
+
+    def search(self, board, queue):
+        """
+        ビームサーチで初手 queue[0] の置き方を評価する
+
+        返り値:
+            (24,) int64 のスコア（候補にない手は -1）。候補が無ければ None
+        """
+        board = np.ascontiguousarray(board, dtype=np.int8)
+        queue = np.asarray(queue, dtype=np.int32).reshape(-1, 2)
+        c1s = np.ascontiguousarray(queue[:, 0])
+        c2s = np.ascontiguousarray(queue[:, 1])
+        count = self._library().puyo_beam_search(
+            puyo_native._address(board), len(queue), puyo_native._address(c1s), puyo_native._address(c2s),
+            puyo_native._address(self.weights), self.width, max(self.depth, len(queue)),
+            puyo_native._address(self._scores),
+        )
+        self.num_searches += 1
+        if count < 0:
+            print(f"[ERROR] Beam search rejected: queue={queue.tolist()}", flush=True)
+            return None
+        if count == 0:
+            return None
+        return self._scores.copy()
+
+    def __call__(self, board, queue, key=None):
+        """
+        盤面と分かっているペア列から24手の事前確率を作る（候補が無ければ None）
+        key: 盤面ハッシュ（Noneなら board.tobytes()）
+        """
+        queue = tuple((int(c1), int(c2)) for c1, c2 in queue)
+        cache_key = (board.tobytes() if key is None else key, queue)
+        prior = self.cache.get(cache_key, _MISSING)
+        if prior is _MISSING:
+            scores = self.search(board, queue)
+            prior = None if scores is None else self.scores_to_prior(scores)
+            self.cache.put(cache_key, prior)
+        return prior
+
+    def scores_to_prior(self, scores):
+        """候補のスコアを、最大スコアとの比の softmax で分布にする（候補にない手は0）"""
+        candidates = scores >= 0
+        ratio = scores / max(scores.max(), 1)
+        logits = np.where(candidates, (ratio - 1) / self.temperature, -np.inf)
+        prior = np.exp(logits)
+        return prior / prior.sum()
+
+    def mix(self, priors, beam_prior, valid_moves):
+        """ネットワークの事前確率にビームサーチの分布を weight の割合で混ぜる（有効手で正規化）"""
+        mixed = ((1 - self.weight) * priors + self.weight * beam_prior) * valid_moves
+        total = mixed.sum()
+        return mixed / total if total > 0 else priors
+
+    def stats(self):
+        return dict(self.cache.stats(), searches=self.num_searches)
@@ -0,0 +1,93 @@
+"""
+PuyoNet の推論レイテンシの計測
+
+バッチサイズごとに、次の4通りで1バッチあたりの時間と盤面/s を出す:
+    train+grad  … 従来の MCTS（学習モードのまま、autograd あり）
+    eval+no_grad … eval モード + torch.no_grad()
+    folded      … InferenceNet（BatchNorm 吸収のみ）
+    folded+jit  … InferenceNet（BatchNorm 吸収 + TorchScript）
+eval+no_grad との出力の最大誤差も出す。
+
+使い方:
+    python bench_inference.py --batch-sizes 1 8 32 128
+"""
+import argparse
+import copy
+import time
+
+import numpy as np
+import torch
+
+from inference import InferenceNet
+from model import PuyoNet
+
+
+def time_call(fn, min_time):
+    """min_time 秒以上くり返して1回あたりの秒数を返す（最初の数回はウォームアップ）"""
+    for _ in range(3):
+        fn()
+    count = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default=None, help='学習済みモデル（.pth）。省略時はランダム初期化')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--min-time', type=float, default=1.0)
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    torch.manual_seed(0)
+    net = PuyoNet(board_height=14, board_width=6, num_actions=24)
+    if args.model is not None:
+        net.load_state_dict(torch.load(args.model, map_location='cpu'))
+
+    folded = InferenceNet(net, script=False)
+    scripted = InferenceNet(net)
+    print(f"TorchScript: {'ok' if scripted.scripted else 'failed (eager)'}")
+
+    def eager(model, grad):
+        def run(x):
+            with torch.set_grad_enabled(grad):
+                policy, value = model(torch.from_numpy(x).view(len(x), 1, 14, 6))
+            return policy.detach().numpy(), value.detach().numpy()[:, 0]
+        return run
+
+    # 学習モードは BatchNorm の移動平均を書き換えるので別のコピーで回す
+    methods = {
+        'train+grad': eager(copy.deepcopy(net).train(), True),
+        'eval+no_grad': eager(net.eval(), False),
+        'folded': folded.predict,
+        'folded+jit': scripted.predict,
+    }
+
+    print(f"{'batch':>6} {'method':>13} {'ms/batch':>9} {'boards/s':>10} {'speedup':>8} {'max err':>9}")
+    rng = np.random.default_rng(0)
+    for batch_size in args.batch_sizes:
+        boards = rng.integers(0, 5, size=(batch_size, 14, 6)).astype(np.float32)
+        reference = methods['eval+no_grad'](boards)
+        base = None
+        for name, fn in methods.items():
+            seconds = time_call(lambda: fn(boards), args.min_time)
+            base = base or seconds
+            if name == 'train+grad':
+                error = float('nan')   # Dropout と BatchNorm のバッチ統計で出力が違う
+            else:
+                policy, value = fn(boards)
+                error = max(np.abs(policy - reference[0]).max(), np.abs(value - reference[1]).max())
+            print(f"{batch_size:>6} {name:>13} {seconds * 1e3:>9.3f} {batch_size / seconds:>10.0f} "
+                  f"{base / seconds:>7.2f}x {error:>9.2e}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+MCTSのシミュレーション速度の計測
+
+同じ盤面から num_sims 回ずつ探索し、バッチサイズ（まとめて推論する葉の数）ごとの sims/s を出す。
+--selection をつけると、探索木の各ノードでの行動選択（PUCT）だけを
+1行動ずつ U を呼ぶ従来のループと _select_action で比べる（selections/s）。
+
+使い方:
+    python bench_mcts.py --backend native --sims 400 --batch-sizes 1 4 8 16
+    python bench_mcts.py --selection --sims 2000
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from mcts import MCTS
+from model import PuyoNet
+from puyopuyo_env_cpp import PuyoPuyoGame
+
+
+def bench_search(game, net, num_sims, batch_size, repeats):
+    """新しい木で repeats 回探索し、平均の sims/s を返す"""
+    state = game.reset()
+    elapsed = 0.0
+    for _ in range(repeats):
+        mcts = MCTS(game=game, net=net, num_sims=num_sims, batch_size=batch_size)
+        start = time.perf_counter()
+        mcts.run_simulations(state, num_sims)
+        elapsed += time.perf_counter() - start
+    return num_sims * repeats / elapsed, mcts.tree_stats()['nodes']
+
+
+def select_action_loop(mcts, idx, valid_moves):
+    """ベクトル化前の選択（有効手ごとに U を呼んで最大を探す）"""
+    best_action = None
+    best_ucb = -float('inf')
+    for action in range(mcts.num_actions):
+        if valid_moves[action]:
+            ucb = mcts.U(idx, action)
+            if ucb > best_ucb:
+                best_ucb = ucb
+                best_action = action
+    return best_action
+
+
+def bench_selection(game, net, num_sims, min_time=1.0):
+    """num_sims 回探索した木の全ノードで、選択だけを繰り返して selections/s を測る"""
+    state = game.reset()
+    mcts = MCTS(game=game, net=net, num_sims=num_sims)
+    mcts.run_simulations(state, num_sims)
+    nodes = mcts.nodes
+    # 有効手マスクは P > 0 の行動（展開時に有効手でマスクしている）
+    rows = [(idx, nodes.P[idx] > 0) for idx in range(nodes.size)]
+
+    mismatches = sum(
+        select_action_loop(mcts, idx, valid) != mcts._select_action(idx, valid) for idx, valid in rows
+    )
+
+    results = {}
+    for name, select in (('loop (U per action)', lambda idx, valid: select_action_loop(mcts, idx, valid)),
+                         ('vectorized', mcts._select_action)):
+        count = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < min_time:
+            for idx, valid in rows:
+                select(idx, valid)
+            count += len(rows)
+        results[name] = count / (time.perf_counter() - start)
+    return results, len(rows), mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='native')
+    parser.add_argument('--simulator-path', default=None)
+    parser.add_argument('--model', default=None, help='学習済みモデル（.pth）。省略時はランダム初期化')
+    parser.add_argument('--sims', type=int, default=400)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    parser.add_argument('--selection', action='store_true', help='行動選択（PUCT）だけを計測する')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    game = PuyoPuyoGame(backend=args.backend, simulator_path=args.simulator_path)
+    net = PuyoNet(board_height=14, board_width=6, num_actions=24)
+    if args.model is not None:
+        net.load_state_dict(torch.load(args.model, map_location='cpu'))
+
+    if args.selection:
+        np.random.seed(0)
+        results, num_nodes, mismatches = bench_selection(game, net, args.sims)
+        base = next(iter(results.values()))
+        print(f"{num_nodes} nodes, 選択の不一致 {mismatches}件")
+        print(f"{'method':>20} {'selections/s':>13} {'speedup':>8}")
+        for name, rate in results.items():
+            print(f"{name:>20} {rate:>13.0f} {rate / base:>7.2f}x")
+        return
+
+    print(f"{'batch':>6} {'sims/s':>10} {'speedup':>8} {'nodes':>7}")
+    base = None
+    for batch_size in args.batch_sizes:
+        np.random.seed(0)
+        rate, nodes = bench_search(game, net, args.sims, batch_size, args.repeats)
+        base = base or rate
+        print(f"{batch_size:>6} {rate:>10.1f} {rate / base:>7.2f}x {nodes:>7}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+ネットワークのアーキテクチャ（model.ARCHITECTURES）ごとの大きさと速度の比較
+
+各アーキテクチャについて次を出す:
+    params    … パラメータ数
+    MFLOPs    … 1盤面あたりの積和演算（Conv2d / Linear）×2
+    b1 / b64  … InferenceNet.predict の1バッチあたりの時間（ms）
+    sims/s    … 初期盤面からの MCTS のシミュレーション速度（推論込み）
+
+使い方:
+    python bench_models.py --sims 200
+    python bench_models.py --archs puyonet resnet_small --quantize static
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from bench_inference import time_call
+from inference import InferenceNet
+from mcts import MCTS
+from model import ARCHITECTURES, create_model
+from puyopuyo_env_cpp import PuyoPuyoGame
+
+
+def count_flops(net, board_height=14, board_width=6):
+    """1盤面の順伝播の FLOPs（Conv2d と Linear の積和 ×2。活性化・BN は数えない）"""
+    macs = []
+
+    def conv_hook(module, inputs, output):
+        kernel = module.kernel_size[0] * module.kernel_size[1] * module.in_channels // module.groups
+        macs.append(output.numel() * kernel)
+
+    def linear_hook(module, inputs, output):
+        macs.append(output.numel() * module.in_features)
+
+    hooks = []
+    for module in net.modules():
+        if isinstance(module, nn.Conv2d):
+            hooks.append(module.register_forward_hook(conv_hook))
+        elif isinstance(module, nn.Linear):
+            hooks.append(module.register_forward_hook(linear_hook))
+    was_training = net.training
+    net.eval()
+    with torch.no_grad():
+        net(torch.zeros(1, 1, board_height, board_width))
+    net.train(was_training)
+    for hook in hooks:
+        hook.remove()
+    return 2 * sum(macs)
+
+
+def bench_sims(game, inference, num_sims, repeats):
+    """新しい木で num_sims 回ずつ探索したときの sims/s"""
+    state = game.reset()
+    elapsed = 0.0
+    for _ in range(repeats):
+        mcts = MCTS(game=game, net=inference, num_sims=num_sims)
+        start = time.perf_counter()
+        mcts.run_simulations(state, num_sims)
+        elapsed += time.perf_counter() - start
+    return num_sims * repeats / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='native')
+    parser.add_argument('--archs', nargs='+', default=list(ARCHITECTURES))
+    parser.add_argument('--sims', type=int, default=200)
+    parser.add_argument('--repeats', type=int, default=2)
+    parser.add_argument('--min-time', type=float, default=1.0)
+    parser.add_argument('--quantize', default=None, choices=['dynamic', 'static'])
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    game = PuyoPuyoGame(backend=args.backend)
+    rng = np.random.default_rng(0)
+    boards = rng.integers(0, 5, size=(64, 14, 6)).astype(np.int8)
+
+    print(f"{'arch':>13} {'params':>9} {'MFLOPs':>8} {'b1 ms':>7} {'b64 ms':>8} {'sims/s':>8}")
+    for name in args.archs:
+        torch.manual_seed(0)
+        np.random.seed(0)
+        net = create_model(name)
+        inference = InferenceNet(net, quantize=args.quantize, calibration=boards)
+        params = sum(p.numel() for p in net.parameters())
+        flops = count_flops(net)
+        batch1 = time_call(lambda: inference.predict(boards[:1]), args.min_time)
+        batch64 = time_call(lambda: inference.predict(boards), args.min_time)
+        sims = bench_sims(game, inference, args.sims, args.repeats)
+        print(f"{name:>13} {params:>9} {flops / 1e6:>8.2f} {batch1 * 1e3:>7.3f} {batch64 * 1e3:>8.2f} {sims:>8.1f}",
+              flush=True)
+
+
+if __name__ == "__main__":
+    main()
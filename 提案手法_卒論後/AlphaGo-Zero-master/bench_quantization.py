@@ -0,0 +1,99 @@
+"""
+int8 量子化した推論の精度と速度の確認
+
+自己対戦で盤面を集め、半分で静的量子化のキャリブレーション、残り半分で fp32 と比べる:
+    KL(policy)  … fp32 の方策に対する KL ダイバージェンスの平均
+    value MSE   … fp32 の価値との二乗誤差の平均
+    top-1       … 方策の最大の手が fp32 と一致した割合
+続けてバッチサイズごとの盤面/s を出す。
+
+使い方:
+    python bench_quantization.py --model models_mc_reward/puyo_alphazero_final.pth --episodes 4
+"""
+import argparse
+
+import numpy as np
+import torch
+
+from bench_inference import time_call
+from inference import InferenceNet
+from model import PuyoNet
+from puyopuyo_env_cpp import PuyoPuyoGame
+from solver import Solver
+
+
+def collect_boards(game, net, episodes, num_sims):
+    """自己対戦の盤面（examples の state）を集める"""
+    solver = Solver(game=game, net=net, num_sims=num_sims)
+    boards = []
+    for _ in range(episodes):
+        examples, _ = solver.execute_episode(net)
+        boards.extend(state for state, _, _ in examples)
+    solver.close()
+    return np.array(boards, dtype=np.int8)
+
+
+def compare(reference, candidate, boards):
+    """fp32 との KL・価値のMSE・top-1一致率"""
+    ref_pi, ref_v = reference.predict(boards)
+    pi, v = candidate.predict(boards)
+    kl = np.sum(ref_pi * (np.log(ref_pi + 1e-12) - np.log(pi + 1e-12)), axis=1)
+    return {
+        'kl': float(kl.mean()),
+        'value_mse': float(np.mean((ref_v - v) ** 2)),
+        'top1': float(np.mean(ref_pi.argmax(axis=1) == pi.argmax(axis=1))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', default='native')
+    parser.add_argument('--model', default=None, help='学習済みモデル（.pth）。省略時はランダム初期化')
+    parser.add_argument('--episodes', type=int, default=4, help='盤面を集める自己対戦の数')
+    parser.add_argument('--sims', type=int, default=30)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--min-time', type=float, default=1.0)
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    np.random.seed(0)
+    torch.manual_seed(0)
+    game = PuyoPuyoGame(backend=args.backend)
+    net = PuyoNet(board_height=14, board_width=6, num_actions=24)
+    if args.model is not None:
+        net.load_state_dict(torch.load(args.model, map_location='cpu'))
+
+    boards = collect_boards(game, net, args.episodes, args.sims)
+    np.random.shuffle(boards)
+    calibration, test = boards[:len(boards) // 2], boards[len(boards) // 2:]
+    print(f"盤面: キャリブレーション {len(calibration)}, 比較 {len(test)}")
+
+    variants = {
+        'fp32': InferenceNet(net),
+        'dynamic': InferenceNet(net, quantize='dynamic'),
+        'static': InferenceNet(net, quantize='static', calibration=calibration),
+    }
+    reference = variants['fp32']
+
+    print(f"{'mode':>8} {'KL(policy)':>11} {'value MSE':>10} {'top-1':>7}")
+    for name, variant in variants.items():
+        stats = compare(reference, variant, test)
+        print(f"{name:>8} {stats['kl']:>11.2e} {stats['value_mse']:>10.2e} {stats['top1']:>7.1%}")
+
+    print(f"\n{'batch':>6} {'mode':>8} {'ms/batch':>9} {'boards/s':>10} {'speedup':>8}")
+    rng = np.random.default_rng(0)
+    for batch_size in args.batch_sizes:
+        batch = test[rng.integers(0, len(test), size=batch_size)]
+        base = None
+        for name, variant in variants.items():
+            seconds = time_call(lambda: variant.predict(batch), args.min_time)
+            base = base or seconds
+            print(f"{batch_size:>6} {name:>8} {seconds * 1e3:>9.3f} {batch_size / seconds:>10.0f} "
+                  f"{base / seconds:>7.2f}x", flush=True)
+
+
+if __name__ == "__main__":
+    main()
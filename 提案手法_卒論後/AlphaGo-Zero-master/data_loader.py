@@ -0,0 +1,116 @@
+"""
+学習データのローダー（Solver.train 用）
+
+例 [(盤面, 方策, 価値), ...] を最初に1回だけ連続したテンソルにまとめ、
+エポックごとに添字の並べ替え（permutation）だけでシャッフルする。
+ミニバッチは index_select 1回で切り出す（バッチごとに Python のリストや np.array を作らない）。
+prefetch=True なら次のバッチを別スレッドで切り出しておく（index_select の間は GIL を離す）。
+
+    loader = TensorDataLoader.from_examples(examples, batch_size=32)
+    for epoch in range(epochs):
+        for states, target_pis, target_vs in loader:   # (n, 1, 14, 6), (n, 24), (n, 1)
+            ...
+"""
+import queue
+import threading
+
+import numpy as np
+import torch
+
+
+class TensorDataLoader:
+    """
+    引数:
+        states: (n, 1, H, W) float32 の盤面
+        policies: (n, num_actions) float32 の方策
+        values: (n, 1) float32 の価値
+        batch_size: ミニバッチの大きさ（最後のバッチは端数）
+        shuffle: エポックごとに並べ替える（np.random の乱数を使う）
+        prefetch: 次のバッチを別スレッドで用意する
+    """
+    def __init__(self, states, policies, values, batch_size=32, shuffle=True, prefetch=True):
+        self.states = states
+        self.policies = policies
+        self.values = values
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.prefetch = prefetch
+
+    @classmethod
+    def from_examples(cls, examples, device=None, **kwargs):
+        """例のリストから、あらかじめ確保したテンソルに1回だけ書き込んで作る（device に置く）"""
+        n = len(examples)
+        board_shape = np.shape(examples[0][0])
+        num_actions = len(examples[0][1])
+        states = np.empty((n, 1) + board_shape, dtype=np.float32)
+        policies = np.empty((n, num_actions), dtype=np.float32)
+        values = np.empty((n, 1), dtype=np.float32)
+        for i, (board, pi, z) in enumerate(examples):
+            states[i, 0] = board
+            policies[i] = pi
+            values[i, 0] = z
+        return cls(
+            torch.from_numpy(states).to(device), torch.from_numpy(policies).to(device),
+            torch.from_numpy(values).to(device), **kwargs,
+        )
+
+    def __len__(self):
+        """1エポックのバッチ数"""
+        return (len(self.states) + self.batch_size - 1) // self.batch_size
+
+    @property
+    def num_samples(self):
+        return len(self.states)
+
+    def _batches(self):
+        n = len(self.states)
+        order = np.random.permutation(n) if self.shuffle else np.arange(n)
+        order = torch.from_numpy(order).to(self.states.device)
+        for start in range(0, n, self.batch_size):
+            index = order[start:start + self.batch_size]
+            yield (
+                self.states.index_select(0, index),
+                self.policies.index_select(0, index),
+                self.values.index_select(0, index),
+            )
+
+    def __iter__(self):
+        if not self.prefetch:
+            yield from self._batches()
+            return
+
+        # 1つ先のバッチまでスレッドで切り出しておく
+        batches = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        done = object()
+
+        def produce():
+            try:
+                for batch in self._batches():
+                    if stop.is_set():
+                        return
+                    batches.put(batch)
+            finally:
+                batches.put(done)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is done:
+                    break
+                yield batch
+        finally:
+            stop.set()
+            while thread.is_alive():   # 途中でやめたとき、put で止まっているスレッドを流す
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            thread.join()
+
+    def random_boards(self, count):
+        """ランダムに count 個の盤面 (count, H, W) int8（静的量子化のキャリブレーション用）"""
+        index = np.random.permutation(len(self.states))[:count]
+        return self.states[torch.from_numpy(index).to(self.states.device), 0].cpu().numpy().astype(np.int8)
@@ -2,11 +2,13 @@
 連鎖詳細付き評価関数
 """
 import numpy as np
+from inference import InferenceNet
 from mcts import MCTS
 
-def evaluate_model(net, game, num_games=10, iteration=0):
+def evaluate_model(net, game, num_games=10, iteration=0, quantize=None, calibration=None):
     """
     連鎖詳細を記録しながらモデル評価
+    quantize: 推論を int8 にする（None / 'dynamic' / 'static'。'static' は calibration の盤面が必要）
     """
     from datetime import datetime
     import os
@@ -15,7 +17,7 @@ def evaluate_model(net, game, num_games=10, iteration=0):
     print(f"[EVAL] Iteration {iteration} 評価開始 ({num_games}ゲーム)", flush=True)
     print(f"{'='*60}", flush=True)
     
-    mcts = MCTS(game=game, net=net, num_sims=100)
+    mcts = MCTS(game=game, net=InferenceNet(net, quantize=quantize, calibration=calibration), num_sims=100)
     
     results = []
     total_score = 0
@@ -36,8 +38,7 @@ def evaluate_model(net, game, num_games=10, iteration=0):
             if game.reward(state) != -999 or num_moves >= 100:
                 break
             
-            for _ in range(100):
-                mcts.search(state.copy())
+            mcts.run_simulations(state, 100)
             
             pi = mcts.get_action_probabilities(state, t=0)
             action = np.argmax(pi)
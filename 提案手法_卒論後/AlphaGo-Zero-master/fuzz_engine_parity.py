@@ -0,0 +1,127 @@
+"""
+Python版エンジン（puyo_engine）とC++エンジン（puyo_capi）の差分ファズテスト
+
+ランダムな設置（＋ときどきランダムなおじゃま・宙に浮いた盤面）を大量に流し、
+盤面・スコア・連鎖数・ゲームオーバー判定がビット単位で一致することを確認する。
+PackedBoard（puyo_state）の差分更新したZobristハッシュが、盤面から計算し直した値と一致することも確認する。
+
+使い方:
+    python fuzz_engine_parity.py --steps 1000000 --seed 0
+"""
+import argparse
+import ctypes
+import sys
+import time
+
+import numpy as np
+
+import puyo_engine
+from puyo_state import PackedBoard
+from puyo_native import load_library
+
+
+def random_board(rng):
+    """C++のload_fieldの詰め処理も試すため、隙間や不正値を含む盤面を作る"""
+    board = np.zeros((14, 6), dtype=np.int8)
+    heights = rng.integers(0, 14, size=6)
+    for x in range(6):
+        board[:heights[x], x] = rng.choice([0, 1, 2, 3, 4, 5, 6], size=heights[x],
+                                           p=[0.05, 0.2, 0.2, 0.2, 0.2, 0.05, 0.1])
+    return board
+
+
+def run_fuzz(lib, steps, seed, report_every=0, max_mismatches=10):
+    """
+    ランダムな手を steps 手流して Python版とC++版を比べる
+
+    引数:
+        lib: load_library() で読み込んだ puyo_capi
+        report_every: この手数ごとに途中経過を表示（0なら表示しない）
+        max_mismatches: この数だけ不一致が出たら打ち切る
+
+    返り値:
+        {'steps', 'mismatches', 'chains', 'max_chain'} の dict
+    """
+    rng = np.random.default_rng(seed)
+
+    native_out = np.empty((14, 6), dtype=np.int8)
+    score = ctypes.c_int32()
+    chain = ctypes.c_int32()
+
+    board = np.zeros((14, 6), dtype=np.int8)
+    mismatches = 0
+    chains_seen = 0
+    max_chain = 0
+    done = 0
+    start = time.time()
+
+    for i in range(steps):
+        # 10%の確率でおじゃまを降らせ、1%の確率で崩れた盤面から始める
+        if rng.random() < 0.01:
+            board = random_board(rng)
+        elif rng.random() < 0.1:
+            for col in rng.choice(6, size=rng.integers(1, 7), replace=False):
+                height = np.count_nonzero(board[:, col])
+                if height < 13:
+                    board[height, col] = 6
+
+        x = int(rng.integers(0, 6))
+        r = int(rng.integers(0, 4))
+        if (x == 0 and r == 3) or (x == 5 and r == 1):
+            r = 0
+        pair = (int(rng.integers(1, 5)), int(rng.integers(1, 5)))
+
+        board = np.ascontiguousarray(board)
+        native_over = lib.puyo_step(
+            board.ctypes.data, native_out.ctypes.data, x, r, pair[0], pair[1],
+            ctypes.byref(score), ctypes.byref(chain)
+        )
+        py_board, py_score, py_chain, py_over = puyo_engine.step(board, x, r, pair)
+        packed, _, _, _ = PackedBoard.from_array(board).step(x, r, pair)
+        done = i + 1
+
+        if (not np.array_equal(py_board, native_out) or py_score != score.value
+                or py_chain != chain.value or int(py_over) != native_over
+                or packed.zobrist != PackedBoard.from_array(native_out).zobrist):
+            mismatches += 1
+            print(f"[MISMATCH] step={i} x={x} r={r} pair={pair}", flush=True)
+            print(f"  native: score={score.value} chain={chain.value} game_over={native_over}")
+            print(f"  python: score={py_score} chain={py_chain} game_over={int(py_over)}")
+            print(f"  board (y=0が最下段):\n{board}")
+            if mismatches >= max_mismatches:
+                break
+
+        if chain.value > 0:
+            chains_seen += 1
+            max_chain = max(max_chain, chain.value)
+
+        board = native_out.copy()
+        if native_over or board[11, 2] != 0:
+            board = np.zeros((14, 6), dtype=np.int8)
+
+        if report_every and done % report_every == 0:
+            elapsed = time.time() - start
+            print(f"{done} steps, mismatches={mismatches}, chains={chains_seen}, "
+                  f"max_chain={max_chain}, {done / elapsed:.0f} steps/s", flush=True)
+
+    return {'steps': done, 'mismatches': mismatches, 'chains': chains_seen, 'max_chain': max_chain}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--library', default=None, help='puyo_capi.dll / .so のパス')
+    parser.add_argument('--report-every', type=int, default=100000)
+    args = parser.parse_args()
+
+    lib = load_library(args.library)
+    result = run_fuzz(lib, args.steps, args.seed, report_every=args.report_every)
+
+    print(f"完了: {result['steps']} steps, mismatches={result['mismatches']}, "
+          f"chains={result['chains']}, max_chain={result['max_chain']}")
+    sys.exit(1 if result['mismatches'] else 0)
+
+
+if __name__ == "__main__":
+    main()
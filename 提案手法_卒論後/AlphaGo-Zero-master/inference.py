@@ -0,0 +1,164 @@
+"""
+PuyoNet の推論専用ラッパー（CPU）
+
+学習用のネットワークから次の手順で推論用のモジュールを作る:
+    1. CPUにコピーして eval モード（Dropout なし、BatchNorm は移動平均）
+    2. Conv2d の直後の BatchNorm2d を畳み込みの重み・バイアスに畳み込む
+    3. （quantize を指定したら）int8 に量子化する
+         'dynamic' … 全結合層（fc1 が 10752x256 でパラメータの大半）を動的量子化
+         'static'  … さらに畳み込み（net.main）を自己対戦の盤面でキャリブレーションして静的量子化
+    4. TorchScript（trace + freeze）で固める
+推論は torch.inference_mode() の中で行い、autograd のグラフは作らない。
+量子化するのは推論用のコピーだけで、学習は fp32 のまま。
+
+    inference = InferenceNet(net)
+    policy, value = inference.predict(boards)   # boards: (n, 14, 6) → (n, 24), (n,)
+    inference.refresh(net)                      # 学習で重みが変わったら作り直す
+    InferenceNet(net, quantize='static', calibration=boards)   # int8（boards: (n, 14, 6)）
+
+学習中の net 自体は変更しない（モードも重みもそのまま）。
+"""
+import copy
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+
+QUANTIZE_MODES = (None, 'dynamic', 'static')
+
+
+def fold_batchnorm(module):
+    """
+    nn.Sequential の中で Conv2d の直後にある BatchNorm2d を畳み込みに吸収する（入れ子もたどる）
+    module は eval モードのコピーを渡すこと（その場で書き換える）
+    """
+    for child in module.children():
+        fold_batchnorm(child)
+    if not isinstance(module, nn.Sequential):
+        return module
+
+    names = list(module._modules.keys())
+    for prev_name, name in zip(names, names[1:]):
+        prev, layer = module._modules[prev_name], module._modules[name]
+        if isinstance(prev, nn.Conv2d) and isinstance(layer, nn.BatchNorm2d):
+            module._modules[prev_name] = fuse_conv_bn_eval(prev, layer)
+            module._modules[name] = nn.Identity()
+    return module
+
+
+class _Contiguous(nn.Module):
+    """量子化した畳み込みの出力は channels_last なので、view の前に連続にする"""
+    def forward(self, x):
+        return x.contiguous()
+
+
+def _quantize_conv_stack(conv_stack, calibration, board_height, board_width, batch_size=64):
+    """畳み込み部分（nn.Sequential）を FX で静的量子化する（calibration の盤面で値域を測る）"""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    calibration = torch.from_numpy(np.asarray(calibration, dtype=np.float32)).view(-1, 1, board_height, board_width)
+    qconfig_mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(conv_stack, qconfig_mapping, (calibration[:1],))
+    with torch.no_grad():
+        for i in range(0, len(calibration), batch_size):
+            prepared(calibration[i:i + batch_size])
+    return nn.Sequential(convert_fx(prepared), _Contiguous())
+
+
+def quantize_module(module, mode, calibration=None):
+    """
+    推論用のコピー（eval・BatchNorm 吸収済み）を int8 にする
+    mode: 'dynamic'（全結合のみ）/ 'static'（畳み込み module.main も。calibration が必要）
+    """
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantize mode: {mode} (expected one of {QUANTIZE_MODES})")
+    if mode is None:
+        return module
+    if mode == 'static' and (calibration is None or len(calibration) == 0):
+        raise ValueError("Static quantization needs calibration boards")
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)   # 量子化テンソル API の非推奨警告
+        if mode == 'static':
+            module.main = _quantize_conv_stack(module.main, calibration, module.board_height, module.board_width)
+        return torch.ao.quantization.quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8)
+
+
+class InferenceNet:
+    """
+    引数:
+        net: PuyoNet（board_height / board_width / num_actions を持つネットワーク）
+        fold_bn: BatchNorm を畳み込みに吸収する
+        script: TorchScript で固める（失敗したら eager のまま使う）
+        quantize: None（fp32）/ 'dynamic' / 'static'（quantize_module を参照）
+        calibration: 静的量子化のキャリブレーション用の盤面 (n, 14, 6)
+    """
+    def __init__(self, net, fold_bn=True, script=True, quantize=None, calibration=None):
+        self.fold_bn = fold_bn
+        self.script = script
+        self.quantize = quantize
+        self.calibration = calibration
+        self.refresh(net)
+
+    @classmethod
+    def wrap(cls, net, **kwargs):
+        """
+        すでに predict を持つもの（InferenceNet・推論サーバーのクライアント）ならそのまま、
+        ネットワークならラップして返す（None は None）
+        """
+        if net is None or hasattr(net, 'predict'):
+            return net
+        return cls(net, **kwargs)
+
+    def refresh(self, net, calibration=None):
+        """net の今の重みから推論用モジュールを作り直す（calibration を渡したら差し替える）"""
+        if calibration is not None:
+            self.calibration = calibration
+        self.board_height = net.board_height
+        self.board_width = net.board_width
+        self.num_actions = net.num_actions
+
+        module = copy.deepcopy(net).cpu().eval()
+        if self.fold_bn or self.quantize is not None:
+            module = fold_batchnorm(module)
+        module = quantize_module(module, self.quantize, self.calibration)
+        for param in module.parameters():
+            param.requires_grad_(False)
+
+        self.scripted = False
+        if self.script:
+            try:
+                example = torch.zeros(1, 1, self.board_height, self.board_width)
+                with torch.no_grad(), warnings.catch_warnings():
+                    warnings.simplefilter('ignore', FutureWarning)   # jit は非推奨の警告が出るが CPU では一番速い
+                    module = torch.jit.freeze(torch.jit.trace(module, example))
+                self.scripted = True
+            except Exception as e:
+                print(f"[WARN] TorchScript failed, using eager module: {e}", flush=True)
+        self.module = module
+
+    def predict(self, boards):
+        """
+        盤面のバッチを推論する
+
+        引数:
+            boards: (n, 14, 6) または (n, 1, 14, 6) の盤面（dtype は何でもよい）
+
+        返り値:
+            policy: (n, num_actions) float32
+            value:  (n,) float32
+        """
+        boards = np.asarray(boards, dtype=np.float32)
+        n = boards.shape[0]
+        x = torch.from_numpy(np.ascontiguousarray(boards)).view(n, 1, self.board_height, self.board_width)
+        with torch.inference_mode():
+            policy, value = self.module(x)
+        return policy.numpy(), value.numpy()[:, 0]
+
+    def __call__(self, inputs):
+        """ネットワークと同じ呼び方（テンソル入力・テンソル出力）"""
+        with torch.inference_mode():
+            return self.module(inputs)
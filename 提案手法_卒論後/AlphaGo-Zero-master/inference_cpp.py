@@ -17,6 +17,7 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
 from model import PuyoNet
+from inference import InferenceNet
 
 def infer(state_file, output_file):
     """
@@ -34,7 +35,7 @@ def infer(state_file, output_file):
         
         model = PuyoNet(board_height=14, board_width=6, num_actions=24)
         model.load_state_dict(torch.load(model_path, map_location='cpu'))
-        model.eval()
+        model = InferenceNet(model)  # eval + BatchNorm吸収 + TorchScript
         print("[DEBUG] Model loaded successfully", file=sys.stderr)
     except Exception as e:
         print(f"[WARN] Model load failed: {e}", file=sys.stderr)
@@ -53,16 +54,12 @@ def infer(state_file, output_file):
             f.write("2,0\n")
         return
     
-    # テンソルに変換
-    state_tensor = torch.FloatTensor(board).unsqueeze(0).unsqueeze(0)  # (1, 1, 14, 6)
-    
-    # 推論
-    with torch.no_grad():
-        policy, value = model(state_tensor)
-        policy = policy.cpu().numpy()[0]
+    # 推論（(1, 14, 6) のバッチとして渡す）
+    policy, value = model.predict(board[np.newaxis])
+    policy = policy[0]
     
     print(f"[DEBUG] Policy shape: {policy.shape}", file=sys.stderr)
-    print(f"[DEBUG] Value:  {value.item():.4f}", file=sys.stderr)
+    print(f"[DEBUG] Value:  {value[0]:.4f}", file=sys.stderr)
     
     # 有効な手のマスク
     valid = get_valid_moves(board)
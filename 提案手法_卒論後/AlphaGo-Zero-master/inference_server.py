@@ -0,0 +1,309 @@
+"""
+推論サーバー（ネットワークを1プロセスに集め、複数ワーカーの盤面をまとめて推論する）
+
+ワーカーごとに共有メモリ（multiprocessing.RawArray）のリングバッファを持ち、
+ワーカーは盤面を書いてセマフォで知らせ、サーバーは集まった盤面を1バッチにして推論し、
+方策・価値を同じリングに書き戻す。盤面も結果も pickle しない。
+
+    server = InferenceServer(net, num_clients=4, max_batch=64, max_wait_ms=2.0)
+    client = server.client(0)               # ワーカープロセスに渡す（Process の引数として）
+    policy, value = client.predict(boards)  # ワーカー側（InferenceNet.predict と同じ形）
+    server.update_weights(net)              # 学習後に重みだけ差し替える（ワーカーはそのまま）
+    server.close()
+
+バッチの作り方（動的バッチ）:
+    最初の要求が来てから max_wait_ms 待つ間に来た要求をまとめる。
+    max_batch 盤面に達するか、全クライアントの要求がそろったらすぐ推論する。
+
+サーバーが落ちたとき:
+    サーバーは自分の pid・動作中フラグ・最後に動いた時刻を共有メモリに書き続ける。
+    クライアントは結果を待つ間に定期的にこれを見て、止まっていれば RuntimeError を出す（待ち続けない）。
+"""
+import copy
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+
+from inference import InferenceNet
+
+
+# 統計（共有メモリの int64 配列の添字）
+_STAT_REQUESTS = 0
+_STAT_BOARDS = 1
+_STAT_BATCHES = 2
+_STAT_WEIGHT_SWAPS = 3
+
+# サーバーの状態（共有メモリの double 配列の添字）
+_STATE_PID = 0
+_STATE_RUNNING = 1
+_STATE_HEARTBEAT = 2
+
+
+def _cpu_state_dict(net):
+    return {key: value.detach().cpu() for key, value in net.state_dict().items()}
+
+
+class InferenceClient:
+    """
+    ワーカー側の薄いクライアント（ネットワークを持たない）
+    server.client(i) で作り、ワーカープロセスの起動時に引数として渡す。
+    結果を待つ間にサーバーが server_timeout 秒以上動いていなければ RuntimeError を出す。
+    """
+    def __init__(self, index, ring, counts, boards, policy, value, request_sem, done_sem,
+                 depth, capacity, board_height, board_width, num_actions, server_state, server_timeout=30.0):
+        self.index = index
+        self.depth = depth
+        self.capacity = capacity
+        self.board_height = board_height
+        self.board_width = board_width
+        self.num_actions = num_actions
+        self._ring = ring
+        self._counts = counts
+        self._boards = boards
+        self._policy = policy
+        self._value = value
+        self._request_sem = request_sem
+        self._done_sem = done_sem
+        self._server_state = server_state
+        self.server_timeout = server_timeout
+        self._views = None
+
+    def views(self):
+        """共有メモリの numpy ビュー (ring, counts, boards, policy, value)"""
+        if self._views is None:
+            shape = (self.depth, self.capacity)
+            self._views = (
+                np.frombuffer(self._ring, dtype=np.int64),
+                np.frombuffer(self._counts, dtype=np.int32),
+                np.frombuffer(self._boards, dtype=np.int8).reshape(shape + (self.board_height, self.board_width)),
+                np.frombuffer(self._policy, dtype=np.float32).reshape(shape + (self.num_actions,)),
+                np.frombuffer(self._value, dtype=np.float32).reshape(shape),
+            )
+        return self._views
+
+    def predict(self, boards):
+        """
+        盤面のバッチをサーバーに推論してもらう（InferenceNet.predict と同じ形）
+        capacity を超える分は分けて、最大 depth 個までリングに並べて送る
+
+        返り値:
+            policy: (n, num_actions) float32
+            value:  (n,) float32
+        """
+        ring, counts, slots, policy_slots, value_slots = self.views()
+        boards = np.asarray(boards).reshape(-1, self.board_height, self.board_width)
+        n = len(boards)
+        policy = np.empty((n, self.num_actions), dtype=np.float32)
+        value = np.empty(n, dtype=np.float32)
+
+        chunks = [(start, min(start + self.capacity, n)) for start in range(0, n, self.capacity)]
+        in_flight = []
+        for start, end in chunks:
+            if len(in_flight) == self.depth:
+                self._receive(in_flight.pop(0), policy, value)
+            head = int(ring[0])
+            slot = head % self.depth
+            slots[slot, :end - start] = boards[start:end]
+            counts[slot] = end - start
+            ring[0] = head + 1          # 盤面を書いてから head を進める
+            self._request_sem.release()
+            in_flight.append((slot, start, end))
+        for request in in_flight:
+            self._receive(request, policy, value)
+        return policy, value
+
+    def _receive(self, request, policy, value):
+        """一番古い要求の結果を待って取り出す（サーバーは要求の順に返す）"""
+        slot, start, end = request
+        while not self._done_sem.acquire(timeout=1.0):
+            self._check_server()
+        _, _, _, policy_slots, value_slots = self.views()
+        policy[start:end] = policy_slots[slot, :end - start]
+        value[start:end] = value_slots[slot, :end - start]
+
+    def _check_server(self):
+        """サーバーが止まっていたら RuntimeError"""
+        pid, running, heartbeat = self._server_state[:]
+        if not running:
+            raise RuntimeError(f"Inference server (pid {int(pid)}) has exited; client {self.index} cannot get results")
+        silent = time.time() - heartbeat
+        if silent > self.server_timeout:
+            raise RuntimeError(f"Inference server (pid {int(pid)}) has not responded for {silent:.0f}s; "
+                               f"client {self.index} gives up waiting")
+
+
+def _server_loop(net, inference_kwargs, clients, request_sem, control, ack, stats, state, max_batch, max_wait):
+    """サーバープロセス本体（終わるとき・例外で落ちたときは動作中フラグを下ろす）"""
+    state[_STATE_PID] = os.getpid()
+    state[_STATE_HEARTBEAT] = time.time()
+    try:
+        _serve(net, inference_kwargs, clients, request_sem, control, ack, stats, state, max_batch, max_wait)
+    finally:
+        state[_STATE_RUNNING] = 0
+
+
+def _serve(net, inference_kwargs, clients, request_sem, control, ack, stats, state, max_batch, max_wait):
+    """要求を集めて推論し、結果をリングに書き戻す"""
+    inference = InferenceNet(net, **(inference_kwargs or {}))
+    views = [client.views() for client in clients]
+    served = [0] * len(clients)     # クライアントごとに返し終えた要求の数
+    stats = np.frombuffer(stats, dtype=np.int64)
+
+    def collect(pending):
+        """まだ読んでいない要求をリングから拾う"""
+        for i, (ring, counts, _, _, _) in enumerate(views):
+            head = int(ring[0])
+            queued = served[i] + sum(1 for j, _, _ in pending if j == i)
+            while queued < head:
+                slot = queued % clients[i].depth
+                pending.append((i, slot, int(counts[slot])))
+                queued += 1
+
+    while True:
+        state[_STATE_HEARTBEAT] = time.time()
+        woke = request_sem.acquire(timeout=0.05)
+
+        # 重みの差し替え・停止（要求の合間に処理する）
+        while True:
+            try:
+                command, args = control.get_nowait()
+            except queue.Empty:
+                break
+            if command == 'stop':
+                return
+            if command == 'weights':
+                state_dict, kwargs = args
+                net.load_state_dict(state_dict)
+                inference = InferenceNet(net, **(kwargs or {}))
+                state[_STATE_HEARTBEAT] = time.time()
+                stats[_STAT_WEIGHT_SWAPS] += 1
+                ack.put('ok')
+
+        if not woke:
+            continue
+
+        pending = []
+        collect(pending)
+        deadline = time.perf_counter() + max_wait
+        while sum(n for _, _, n in pending) < max_batch and len({i for i, _, _ in pending}) < len(clients):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            if request_sem.acquire(timeout=remaining):
+                collect(pending)
+        if not pending:
+            continue
+
+        boards = np.concatenate([views[i][2][slot, :n] for i, slot, n in pending])
+        policy = np.empty((len(boards), inference.num_actions), dtype=np.float32)
+        value = np.empty(len(boards), dtype=np.float32)
+        for start in range(0, len(boards), max_batch):
+            policy[start:start + max_batch], value[start:start + max_batch] = inference.predict(boards[start:start + max_batch])
+            stats[_STAT_BATCHES] += 1
+
+        # 統計を数えてから結果を返す（返事を受け取ったクライアントが stats() を見ても数え漏れがない）
+        stats[_STAT_REQUESTS] += len(pending)
+        stats[_STAT_BOARDS] += len(boards)
+
+        offset = 0
+        for i, slot, n in pending:
+            ring, _, _, policy_slots, value_slots = views[i]
+            policy_slots[slot, :n] = policy[offset:offset + n]
+            value_slots[slot, :n] = value[offset:offset + n]
+            offset += n
+            served[i] += 1
+            ring[1] = served[i]
+            clients[i]._done_sem.release()
+
+
+class InferenceServer:
+    """
+    引数:
+        net: ネットワーク（CPUにコピーしてサーバープロセスへ送る）
+        num_clients: クライアント（ワーカー）の数
+        max_batch: 1回の推論の最大盤面数
+        max_wait_ms: 最初の要求が来てから他の要求を待つ時間
+        capacity: 1要求あたりの最大盤面数（超えたらクライアント側で分ける）
+        depth: クライアントごとのリングの段数（同時に出せる要求の数）
+        inference_kwargs: サーバーの InferenceNet に渡す引数（quantize など）
+        server_timeout: クライアントが、サーバーが動いていないとみなすまでの秒数
+    """
+    def __init__(self, net, num_clients, max_batch=64, max_wait_ms=2.0, capacity=64, depth=2,
+                 inference_kwargs=None, server_timeout=30.0):
+        self.num_clients = num_clients
+        self.max_batch = max_batch
+        self.board_height = net.board_height
+        self.board_width = net.board_width
+        self.num_actions = net.num_actions
+
+        ctx = mp.get_context('spawn')
+        self._request_sem = ctx.Semaphore(0)
+        self._control = ctx.Queue()
+        self._ack = ctx.Queue()
+        self._stats = ctx.RawArray('q', 4)
+        # サーバーの起動（torch の読み込み）中も待てるよう、今の時刻から数え始める
+        self._state = ctx.RawArray('d', [0, 1, time.time()])
+        board_size = self.board_height * self.board_width
+        self._clients = [
+            InferenceClient(
+                i,
+                ring=ctx.RawArray('q', 2),
+                counts=ctx.RawArray('i', depth),
+                boards=ctx.RawArray('b', depth * capacity * board_size),
+                policy=ctx.RawArray('f', depth * capacity * self.num_actions),
+                value=ctx.RawArray('f', depth * capacity),
+                request_sem=self._request_sem,
+                done_sem=ctx.Semaphore(0),
+                depth=depth, capacity=capacity,
+                board_height=self.board_height, board_width=self.board_width, num_actions=self.num_actions,
+                server_state=self._state, server_timeout=server_timeout,
+            )
+            for i in range(num_clients)
+        ]
+
+        self._proc = ctx.Process(
+            target=_server_loop,
+            args=(copy.deepcopy(net).cpu(), inference_kwargs, self._clients, self._request_sem, self._control, self._ack,
+                  self._stats, self._state, max_batch, max_wait_ms / 1000.0),
+            daemon=True,
+        )
+        self._proc.start()
+
+    def client(self, index):
+        """index 番目のクライアント（ワーカープロセスの起動時に引数として渡す）"""
+        return self._clients[index]
+
+    def update_weights(self, net, inference_kwargs=None, timeout=120):
+        """新しい重みをサーバーに送り、差し替えが終わるまで待つ（クライアントはそのまま使える）"""
+        self._control.put(('weights', (_cpu_state_dict(net), inference_kwargs)))
+        self._ack.get(timeout=timeout)
+
+    def stats(self):
+        requests, boards, batches, swaps = np.frombuffer(self._stats, dtype=np.int64).tolist()
+        return {
+            'requests': requests,
+            'boards': boards,
+            'batches': batches,
+            'mean_batch': boards / batches if batches else 0.0,
+            'weight_swaps': swaps,
+        }
+
+    def close(self):
+        if self._proc is None:
+            return
+        if self._proc.is_alive():
+            self._control.put(('stop', None))
+        self._proc.join(timeout=5)
+        if self._proc.is_alive():
+            self._proc.terminate()
+        self._proc = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
@@ -0,0 +1,67 @@
+"""
+上限つきLRUキャッシュ（ヒット・ミス数つき）
+"""
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    最大エントリ数を超えたら、最も長く使われていないものから捨てる辞書
+
+    get() / put() のたびにヒット・ミスを数える。
+    stats() でエピソードやイテレーション単位のログに出せる。
+    """
+    def __init__(self, max_entries):
+        self.max_entries = max(0, int(max_entries))
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        value = self._data.get(key, self)
+        if value is self:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_entries == 0:
+            return
+        data = self._data
+        if key in data:
+            data.move_to_end(key)
+        data[key] = value
+        while len(data) > self.max_entries:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """中身を全部捨てる（カウンタはそのまま）"""
+        self._data.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'evictions': self.evictions,
+            'entries': len(self._data),
+        }
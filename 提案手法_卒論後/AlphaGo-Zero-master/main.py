@@ -2,9 +2,12 @@
 AlphaGo Zero 自動評価付き学習スクリプト（評価指標修正版）
 """
 import torch
-from model import PuyoNet
+from model import create_model
 from puyopuyo_env_cpp import PuyoPuyoGame
 from solver import Solver
+from beam_prior import BeamPrior
+from actor_learner import ActorLearner
+from replay_buffer import ReplayBuffer
 import os
 import numpy as np
 from datetime import datetime
@@ -15,13 +18,29 @@ def train_alphazero(
     num_iterations=200,
     num_episodes=30,
     num_sims=50,
-    model_dir='./models_mc_reward/'
+    model_dir='./models_mc_reward/',
+    num_search_workers=1,
+    beam_prior_weight=0.0,
+    inference_quantize=None,
+    inference_server=False,
+    num_selfplay_workers=1,
+    async_selfplay=False,
+    steps_per_iteration=500,
+    max_staleness=2,
+    replay_capacity=0,
+    replay_window=20,
+    architecture='puyonet',
+    simulator_backend='subprocess'
 ):
+    # async_selfplay の学習は ActorLearner の中のバッファで回すので、リプレイバッファは使えない
+    if async_selfplay and replay_capacity > 0:
+        raise ValueError("async_selfplay=True does not use the replay buffer; set replay_capacity=0")
     os.makedirs(model_dir, exist_ok=True)
     summary_file = os.path.join(model_dir, 'training_progress.csv')  # 出力先
     
-    game = PuyoPuyoGame()
-    net = PuyoNet(board_height=14, board_width=6, num_actions=24)
+    # 'server' は --server 対応に作り直した puyop_simulator が要る（起動時の挨拶で確かめる）
+    game = PuyoPuyoGame(backend=simulator_backend)
+    net = create_model(architecture, board_height=14, board_width=6, num_actions=24)  # model.ARCHITECTURES の名前
     
     resume_iter = 50  # ← 再開したいイテレーション番号
     if resume_iter > 0:
@@ -37,7 +56,25 @@ def train_alphazero(
     else:
         print("CPU学習モード", flush=True)
     
-    solver = Solver(game=game, net=net, num_sims=num_sims)
+    # beam_prior_weight > 0 なら、根の事前確率に ama のビームサーチを混ぜる（要 `make puyo_capi`）
+    beam_prior = BeamPrior(weight=beam_prior_weight) if beam_prior_weight > 0 else None
+    solver = Solver(game=game, net=net, num_sims=num_sims, num_search_workers=num_search_workers,
+                    beam_prior=beam_prior, inference_quantize=inference_quantize,
+                    inference_server=inference_server,  # num_search_workers > 1 か num_selfplay_workers > 1 のときだけ効く
+                    num_selfplay_workers=num_selfplay_workers)  # >1 ならエピソードをワーカープロセスで同時に回す
+    
+    # async_selfplay なら自己対戦ワーカーは止まらずに打ち続け、メインプロセスは学習し続ける
+    # （steps_per_iteration ステップごとに重みを公開して1イテレーションとする）
+    learner = ActorLearner(solver, max_staleness=max_staleness) if async_selfplay else None
+    
+    # replay_capacity > 0 なら、学習データを model_dir/replay の memmap に溜めて
+    # 直近 replay_window イテレーション分（最大 replay_capacity 行）から学習する（再起動しても続きから使う）
+    replay_buffer = None
+    if replay_capacity > 0:
+        replay_buffer = ReplayBuffer(os.path.join(model_dir, 'replay'), capacity=replay_capacity,
+                                     window_iterations=replay_window)
+        # バッファのイテレーション番号は減らせないので、古いモデルから再開したらバッファの続きの番号を使う
+        replay_iteration = replay_buffer.last_iteration or 0
     
     print("=" * 60, flush=True)
     print("AlphaGo Zero ぷよぷよ学習開始（おじゃまぷよあり）", flush=True)
@@ -50,14 +87,16 @@ def train_alphazero(
         print(f"Iteration {iteration + 1}/{num_iterations}", flush=True)
         print(f"{'='*60}", flush=True)
         
-        print(f"ステップ1: 自己対戦（{num_episodes}エピソード）", flush=True)
-        examples = []
-        results = []  # ← 各episodeのスコア、連鎖などを貯める
-        for ep in range(num_episodes):
-            print(f"エピソード {ep + 1}/{num_episodes}", flush=True)
-            episode_examples, episode_result = solver.execute_episode(net)
-            examples.extend(episode_examples)
-            results.append(episode_result)
+        if learner is None:
+            print(f"ステップ1: 自己対戦（{num_episodes}エピソード）", flush=True)
+            examples = []
+            results = []  # ← 各episodeのスコア、連鎖などを貯める
+            for episode_examples, episode_result in solver.execute_episodes(net, num_episodes):
+                examples.extend(episode_examples)
+                results.append(episode_result)
+        else:
+            print(f"ステップ1+2: 自己対戦と学習を並行（{steps_per_iteration}ステップ）", flush=True)
+            results, examples, _ = learner.run_iteration(steps_per_iteration)
 
         # --- 統計出力 ----
         scores = [r['score'] for r in results]
@@ -89,6 +128,9 @@ def train_alphazero(
         print(f"最大連鎖: {max_chain_overall}")
         print(f"連鎖なし率: {no_chain_rate:.2%}")
         print(f"平均手数: {avg_moves:.2f}")
+        cache_stats = solver.eval_cache_stats()
+        print(f"評価キャッシュ: hit率 {cache_stats['hit_rate']:.1%} "
+              f"(hit={cache_stats['hits']}, 推論={cache_stats['evaluations']}, entries={cache_stats['entries']})")
         print("="*60)
         # -----------------
         
@@ -125,8 +167,15 @@ def train_alphazero(
             ])
         # ----------------
 
-        print(f"ステップ2: ニューラルネットワーク学習", flush=True)
-        solver.train(examples, epochs=10)
+        if learner is None:
+            print(f"ステップ2: ニューラルネットワーク学習", flush=True)
+            if replay_buffer is None:
+                solver.train(examples, epochs=10)
+            else:
+                # version はこのデータを打った重みのバージョン（学習すると new_weights で進む）
+                replay_iteration = max(iteration + 1, replay_iteration + 1)
+                replay_buffer.add(examples, iteration=replay_iteration, version=solver.weights_version)
+                solver.train_replay(replay_buffer, epochs=10)
         
         if (iteration + 1) % 1 == 0:
             model_path = os.path.join(model_dir, f'puyo_alphazero_iter{iteration+1:03d}.pth')
@@ -136,6 +185,7 @@ def train_alphazero(
             if torch.cuda.is_available():
                 net = net.cuda()
     
+    solver.close()
     final_path = os.path.join(model_dir, 'puyo_alphazero_final.pth')
     torch.save(net.state_dict(), final_path)
     print(f"\n{'='*60}", flush=True)
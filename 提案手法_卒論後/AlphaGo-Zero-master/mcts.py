@@ -1,57 +1,143 @@
-from collections import defaultdict
+import math
+import time
 
 import numpy as np
-import torch
+
+from inference import InferenceNet
+from node_store import NodeStore
+
+
+def action_probabilities(counts, t=0):
+	"""根の訪問回数から行動確率を作る（t=0 なら最多訪問の手に1）"""
+	num_actions = len(counts)
+	if t == 0:
+		move_probs = np.zeros(num_actions)
+		if sum(counts) > 0:
+			move_probs[np.argmax(counts)] = 1.0
+		else:
+			move_probs = np.ones(num_actions) / num_actions
+	else:
+		counts_arr = np.array(counts, dtype=np.float64)
+		if np.sum(counts_arr) > 0:
+			powered = counts_arr ** (1.0 / t)
+			sum_powered = np.sum(powered)
+			if sum_powered > 0:
+				move_probs = powered / sum_powered
+			else:
+				move_probs = np.ones(num_actions) / num_actions
+		else:
+			move_probs = np.ones(num_actions) / num_actions
+	
+	if np.any(np.isnan(move_probs)) or np.sum(move_probs) == 0:
+		print(f"[WARNING] Invalid move_probs, using uniform distribution")
+		move_probs = np.ones(num_actions) / num_actions
+
+	return move_probs
+
+
+def merge_search_stats(stats_list):
+	"""複数の MCTS.search_stats() を1つにまとめる（時間はシミュレーション数で重み付け平均）"""
+	sims = sum(stats['sims'] for stats in stats_list)
+	depth_counts = sum(stats['depth_counts'] for stats in stats_list)
+	depths = np.arange(len(depth_counts))
+	weight = max(sims, 1)
+	return {
+		'sims': sims,
+		'evaluations': sum(stats['evaluations'] for stats in stats_list),
+		'cache_hits': sum(stats['cache_hits'] for stats in stats_list),
+		'cutoffs': sum(stats['cutoffs'] for stats in stats_list),
+		'us_per_sim': sum(stats['us_per_sim'] * stats['sims'] for stats in stats_list) / weight,
+		'overhead_us_per_sim': sum(stats['overhead_us_per_sim'] * stats['sims'] for stats in stats_list) / weight,
+		'mean_depth': float((depth_counts * depths).sum() / weight),
+		'max_depth': max(stats['max_depth'] for stats in stats_list),
+		'depth_counts': depth_counts,
+	}
+
+
+def run_anytime(search, state, num_sims=None, time_budget=None, pair=None,
+		stop_when_decided=True, stability_threshold=None, check_every=8):
+	"""
+	途中で打ち切れる探索（MCTS / RootParallelMCTS 共通）
+	check_every 回ごとに根の訪問回数を見て、次のどれかで止める:
+		- num_sims 回に達した
+		- time_budget 秒を過ぎた
+		- stop_when_decided: 残りの予算を全部2位に回しても1位が変わらない（t=0 の方策は最後まで回したときと同じ）
+		- stability_threshold: 前回チェックからの訪問割合の変化が全行動でこれ未満
+	
+	返り値:
+		実際に回したシミュレーション数
+	"""
+	if num_sims is None and time_budget is None:
+		num_sims = search.num_sims
+	deadline = time.perf_counter() + time_budget if time_budget is not None else None
+	done = 0
+	previous_share = None
+	while num_sims is None or done < num_sims:
+		counts = search.root_counts(state)
+		total = counts.sum()
+		if stop_when_decided and num_sims is not None and total > 0:
+			runner_up, leader = np.partition(counts, -2)[-2:]
+			if leader - runner_up > num_sims - done:
+				break
+		if stability_threshold is not None and total > 0:
+			share = counts / total
+			if previous_share is not None and np.abs(share - previous_share).max() < stability_threshold:
+				break
+			previous_share = share
+		
+		k = check_every if num_sims is None else min(check_every, num_sims - done)
+		search.run_simulations(state, k, pair=pair)
+		done += k
+		if deadline is not None and time.perf_counter() >= deadline:
+			break
+	return done
 
 
 class MCTS():
 
-	def __init__(self, game=None, net=None, num_actions=None, num_sims=25, c_puct=1):
+	def __init__(self, game=None, net=None, num_actions=None, num_sims=25, c_puct=1, batch_size=1, virtual_loss=1.0, chance_nodes=True, prior_source=None,
+			eval_cache=None, inference_kwargs=None):
 		self.game = game
 		self.num_actions = self.game.num_actions
-		self.N = defaultdict(lambda: defaultdict(int))
-		self.Q = defaultdict(lambda: defaultdict(int))
-		self.P = defaultdict(np.array)
-		self.tree = []
+		# chance_nodes=True なら、次のペアを game.pair_outcomes から層化して選ぶ（False なら毎回ランダム）
+		self.chance_nodes = chance_nodes
+		self.nodes = NodeStore(self.num_actions, num_outcomes=len(self.game.pair_outcomes),
+			board_shape=(self.game.board_height, self.game.board_width))
+		self._outcome_index = {pair: i for i, pair in enumerate(self.game.pair_outcomes)}
 		self.terminal_states = {}
 		self.c_puct = c_puct
 		self.num_sims = num_sims
 		self.nnet = net
+		# 推論は eval モード・BatchNorm 吸収・TorchScript の InferenceNet で行う（net 自体のモードは変えない）
+		# inference_kwargs は InferenceNet に渡す（quantize など。net がすでに InferenceNet なら使わない）
+		self.inference = InferenceNet.wrap(net, **(inference_kwargs or {}))
 		self.max_depth = 50
+		# batch_size > 1 なら、仮想損失をかけて batch_size 本の経路を降り、葉をまとめて1回で評価する
+		self.batch_size = batch_size
+		self.virtual_loss = virtual_loss
+		# prior_source（BeamPrior など）: 根のペアが分かっているとき、根の事前確率にその分布を混ぜる
+		self.prior_source = prior_source
+		self._prior_root = None
+		self._mixed_root = None
+		# eval_cache（LRUCache）: 盤面ハッシュ → (有効手でマスクした方策, 価値)。同じ重みの間は MCTS をまたいで共有する
+		self.eval_cache = eval_cache
+		# 探索経路のスタック（search のたびに使い回す）
+		self._path_idx = [0] * self.max_depth
+		self._path_action = [0] * self.max_depth
+		self._path_chance = [-1] * self.max_depth
+		self._path_outcome = [0] * self.max_depth
+		self._path = (self._path_idx, self._path_action, self._path_chance, self._path_outcome)
+		self.reset_search_stats()
 
 
 	def get_action_probabilities(self, state, t=0):
-		state_id = self.game.hash(state)
-		counts = [self.N[state_id][action] for action in range(self.num_actions)]
-		
-		if t == 0:
-			move_probs = np.zeros(self.num_actions)
-			if sum(counts) > 0:
-				move_probs[np.argmax(counts)] = 1.0
-			else:
-				move_probs = np.ones(self.num_actions) / self.num_actions
-		else:
-			counts_arr = np.array(counts, dtype=np.float64)
-			if np.sum(counts_arr) > 0:
-				powered = counts_arr ** (1.0 / t)
-				sum_powered = np.sum(powered)
-				if sum_powered > 0:
-					move_probs = powered / sum_powered
-				else:
-					move_probs = np.ones(self.num_actions) / self.num_actions
-			else:
-				move_probs = np.ones(self.num_actions) / self.num_actions
-		
-		if np.any(np.isnan(move_probs)) or np.sum(move_probs) == 0:
-			print(f"[WARNING] Invalid move_probs, using uniform distribution")
-			move_probs = np.ones(self.num_actions) / self.num_actions
-
-		return move_probs
+		idx = self.nodes.lookup(self.game.hash(state))
+		counts = self.nodes.N[idx].tolist() if idx >= 0 else [0] * self.num_actions
+		return action_probabilities(counts, t)
 
 	
 	def choose_action(self, state):
-		for _ in range(self.num_sims):
-			self.search(state.copy())
+		self.run_simulations(state, self.num_sims)
 		
 		pi = self.get_action_probabilities(state)
 		action = np.random.choice(self.num_actions, p=pi)
@@ -59,94 +145,390 @@ class MCTS():
 		return action
 
 
-	def U(self, state_id, action):
-		n_factor = np.sqrt(sum((b + 1e-8) for k, b in self.N[state_id].items())) / (self.N[state_id][action] + 1)
-		return self.Q[state_id][action] + self.c_puct * self.P[state_id][action]*(n_factor)
+	def U(self, idx, action):
+		"""1行動ぶんのPUCT（選択には _select_action を使う。bench_mcts.py の比較用）"""
+		nodes = self.nodes
+		n = nodes.N[idx, action]
+		w = nodes.W[idx, action]
+		total = nodes.N[idx].sum()
+		# 仮想損失: 評価待ちの経路を「負けた訪問」として数える
+		pending = nodes.V[idx, action]
+		if pending:
+			n += pending
+			w -= pending * self.virtual_loss
+		if self.batch_size > 1:
+			total += nodes.V[idx].sum()
+		q = w / n if n > 0 else 0.0
+		n_factor = np.sqrt(total + self.num_actions * 1e-8) / (n + 1)
+		return q + self.c_puct * nodes.P[idx, action] * n_factor
+
+
+	def _select_action(self, idx, valid_moves):
+		"""U が最大の有効手（全行動ぶんを配列でまとめて計算）"""
+		nodes = self.nodes
+		n = nodes.N[idx]
+		w = nodes.W[idx]
+		sqrt_total = nodes.sqrt_total[idx]
+		if self.batch_size > 1:
+			# 仮想損失: 評価待ちの経路を「負けた訪問」として数える
+			pending = nodes.V[idx]
+			if pending.any():
+				n = n + pending
+				w = w - pending * self.virtual_loss
+				sqrt_total = math.sqrt(nodes.total[idx] + pending.sum() + nodes.sqrt_eps)
+		q = np.divide(w, n, out=np.zeros(self.num_actions), where=n > 0)
+		ucb = q + self.c_puct * nodes.P[idx] * (sqrt_total / (n + 1))
+		return int(np.argmax(np.where(valid_moves, ucb, -np.inf)))
+
+
+	def run_simulations(self, state, num_sims, pair=None):
+		"""
+		num_sims 回シミュレーションする（batch_size > 1 なら search_batch でまとめて）
+		pair: 根で置くペアが分かっていれば渡す（根の手だけはそのペアで進める）
+		"""
+		self._set_prior_root(state, pair)
+		if self.batch_size <= 1:
+			for _ in range(num_sims):
+				self.search(state, pair)
+			return
+		remaining = num_sims
+		while remaining > 0:
+			k = min(self.batch_size, remaining)
+			self.search_batch(state, k, pair)
+			remaining -= k
+
+
+	def _set_prior_root(self, state, pair):
+		"""
+		prior_source を混ぜる根を決める（盤面とペアごとに1回だけ）
+		根が展開済み（木の再利用で引き継いだ）ならここで混ぜ、未展開なら _expand で混ぜる
+		"""
+		self._prior_root = None
+		if self.prior_source is None or pair is None:
+			return
+		key = (self.game.hash(state), (int(pair[0]), int(pair[1])))
+		if key == self._mixed_root:
+			return
+		self._prior_root = (key, state)
+		idx = self.nodes.lookup(key[0])
+		if idx >= 0:
+			self._mix_prior(idx, self.game.board_info(state).valid_moves)
+
+
+	def _mix_prior(self, idx, valid_moves):
+		key, state = self._prior_root
+		prior = self.prior_source(state, [key[1]], key=key[0])
+		if prior is not None:
+			self.nodes.P[idx] = self.prior_source.mix(self.nodes.P[idx], prior, valid_moves)
+		self._prior_root = None
+		self._mixed_root = key
+
+
+	def run_anytime(self, state, num_sims=None, time_budget=None, pair=None,
+			stop_when_decided=True, stability_threshold=None, check_every=None):
+		"""早期終了つきの探索（run_anytime を参照）。返り値は実際に回したシミュレーション数"""
+		if check_every is None:
+			check_every = max(8, self.batch_size)
+		return run_anytime(self, state, num_sims, time_budget, pair,
+			stop_when_decided, stability_threshold, check_every)
+
+
+	def root_counts(self, state):
+		"""state を根とした行動ごとの訪問回数（未展開なら全部0）"""
+		idx = self.nodes.lookup(self.game.hash(state))
+		if idx < 0:
+			return np.zeros(self.num_actions, dtype=np.int32)
+		return self.nodes.N[idx].copy()
+
+
+	def advance_root(self, state):
+		"""
+		実際の手を進めたあとに呼ぶ: state の盤面を新しい根にして、その下の部分木だけを残す
+		（置いたペアとおじゃまで実際に決まった盤面なので、子の統計はそのまま使える）
+		
+		根の訪問回数・価値はどのペアを置くかを区別せずに貯まったものなので0に戻す。
+		次の手の探索回数と方策の教師は、実際のペアで回した訪問だけになる。
+		
+		返り値:
+			引き継いだノード数
+		"""
+		root = self.nodes.lookup(self.game.hash(state))
+		self.nodes.retain_subtree(root)
+		# 終局の表も手ごとに作り直す（残すとエピソードの間ずっと増え続ける）
+		self.terminal_states.clear()
+		if root < 0:
+			return 0
+		self.nodes.clear_visits(self.nodes.lookup(self.game.hash(state)))
+		return len(self.nodes)
+
+
+	def tree_stats(self):
+		"""探索木のノード数とメモリ量（NodeStore.stats）"""
+		return self.nodes.stats()
+
+
+	def reset_search_stats(self):
+		self.num_searches = 0
+		self.num_evaluations = 0
+		self.num_cache_hits = 0
+		self.num_cutoffs = 0
+		self.search_time = 0.0
+		self.eval_time = 0.0
+		self.depth_counts = np.zeros(self.max_depth + 1, dtype=np.int64)
+
+
+	def search_stats(self):
+		"""
+		シミュレーションの統計
+		us_per_sim は1回あたりの時間、overhead_us_per_sim はそこから推論を除いた分
+		depth_counts[d] は葉（または打ち切り・終局）が深さ d だった回数
+		"""
+		sims = max(self.num_searches, 1)
+		depths = np.arange(len(self.depth_counts))
+		return {
+			'sims': self.num_searches,
+			'evaluations': self.num_evaluations,
+			'cache_hits': self.num_cache_hits,
+			'cutoffs': self.num_cutoffs,
+			'us_per_sim': self.search_time / sims * 1e6,
+			'overhead_us_per_sim': (self.search_time - self.eval_time) / sims * 1e6,
+			'mean_depth': float((self.depth_counts * depths).sum() / sims),
+			'max_depth': int(depths[self.depth_counts > 0].max()) if self.num_searches else 0,
+			'depth_counts': self.depth_counts.copy(),
+		}
+
+
+	def search(self, state, pair=None):
+		"""
+		1回のシミュレーション: 根から葉まで降り、葉を評価して、通った辺を葉側から更新する
+		state は書き換えない。pair は根で置くペア（None なら根でもペアを抽選する）
+		"""
+		start = time.perf_counter()
+		depth, leaf, leaf_id, value = self._select_leaf(state, pair)
+		parent = self._path_idx[depth - 1] if depth > 0 else -1
 		
+		if leaf_id is not None:
+			valid_moves = self.game.board_info(leaf).valid_moves
+			evaluation = self._cached_evaluation(leaf_id)
+			if evaluation is None:
+				eval_start = time.perf_counter()
+				pi, v = self._evaluate(leaf)
+				self.eval_time += time.perf_counter() - eval_start
+				self.num_evaluations += 1
+				evaluation = self._store_evaluation(leaf_id, pi, v, valid_moves)
+			priors, v = evaluation
+			leaf_idx = self._expand(leaf_id, leaf, priors, valid_moves, parent, v)
+			value = -v
+		else:
+			leaf_idx = value[1]
+			value = value[0]
+		
+		self._backup(self._path, depth, value, leaf_idx)
+		self.num_searches += 1
+		self.depth_counts[depth] += 1
+		self.search_time += time.perf_counter() - start
+
 
+	def _cached_evaluation(self, state_id):
+		"""評価キャッシュにあれば (マスク済みの方策, 価値)、無ければ None"""
+		if self.eval_cache is None:
+			return None
+		evaluation = self.eval_cache.get(state_id)
+		if evaluation is not None:
+			self.num_cache_hits += 1
+		return evaluation
 
-	def search(self, state, depth=0):
-		state_id = self.game.hash(state)
 
-		if depth > self.max_depth:
-			return 0.0
-    
-		##################
-		# Terminal nodes #
-		##################
+	def _store_evaluation(self, state_id, pi, v, valid_moves):
+		"""ネットワークの出力を有効手でマスク・正規化し、評価キャッシュに入れて返す"""
+		priors = pi * valid_moves
 		
-		if state_id in self.terminal_states:
-			return self.terminal_states[state_id]
+		if priors.sum() > 0:
+			priors = priors / priors.sum()
+		else:
+			priors = valid_moves.astype(float) / valid_moves.sum()
 		
-		reward = self.game.reward_scalar(state)
-		if reward != -999:
-			self.terminal_states[state_id] = -reward
-			return -reward
+		evaluation = (priors, float(v))
+		if self.eval_cache is not None:
+			self.eval_cache.put(state_id, evaluation)
+		return evaluation
+
+
+	def _expand(self, state_id, state, priors, valid_moves, parent=-1, value=0.0):
+		idx = self.nodes.add(state_id, priors, parent, value, board=state, valid=valid_moves)
+		if self._prior_root is not None and self._prior_root[0][0] == state_id:
+			self._mix_prior(idx, valid_moves)
+		return idx
+
+
+	def search_batch(self, state, k, pair=None):
+		"""
+		k 本の経路を仮想損失つきで降り、見つけた葉を1回の順伝播で評価してから全経路を更新する
+		同じ葉に複数の経路が着いた場合は評価を共有する
+		"""
+		start = time.perf_counter()
+		nodes = self.nodes
+		paths = []
+		pending = {}
+		for _ in range(k):
+			depth, leaf, leaf_id, value = self._select_leaf(state, pair)
+			path = tuple(stack[:depth] for stack in self._path)
+			path_idx, path_action = path[0], path[1]
+			# 仮想損失は降り切ってからかける（全消しで根に戻る経路が自分の損失を見ないように）
+			for idx, action in zip(path_idx, path_action):
+				nodes.V[idx, action] += 1
+			if leaf_id is not None and leaf_id not in pending:
+				pending[leaf_id] = (leaf, path_idx[-1] if depth > 0 else -1)
+			paths.append((path, leaf_id, value))
+			self.depth_counts[depth] += 1
 		
-		##############
-		# leaf nodes #
-		##############
+		leaf_results = {}
+		evaluations = {leaf_id: self._cached_evaluation(leaf_id) for leaf_id in pending}
+		missing = [leaf_id for leaf_id, evaluation in evaluations.items() if evaluation is None]
+		if missing:
+			eval_start = time.perf_counter()
+			pis, vs = self._evaluate_batch([pending[leaf_id][0] for leaf_id in missing])
+			self.eval_time += time.perf_counter() - eval_start
+			self.num_evaluations += len(missing)
+			for leaf_id, pi, v in zip(missing, pis, vs):
+				valid_moves = self.game.board_info(pending[leaf_id][0]).valid_moves
+				evaluations[leaf_id] = self._store_evaluation(leaf_id, pi, v, valid_moves)
+		for leaf_id, (leaf, parent) in pending.items():
+			priors, v = evaluations[leaf_id]
+			leaf_idx = self._expand(leaf_id, leaf, priors, self.game.board_info(leaf).valid_moves, parent, v)
+			leaf_results[leaf_id] = (-v, leaf_idx)
 		
-		if state_id not in self.tree:
-			self.tree.append(state_id)
-			{self.Q[state_id][action]:  0 for action in range(self.num_actions)}
-			{self.N[state_id][action]: 0 for action in range(self.num_actions)}
+		for path, leaf_id, value in paths:
+			for idx, action in zip(path[0], path[1]):
+				nodes.V[idx, action] -= 1
+			value, leaf_idx = leaf_results[leaf_id] if leaf_id is not None else value
+			self._backup(path, len(path[0]), value, leaf_idx)
+		
+		self.num_searches += k
+		self.search_time += time.perf_counter() - start
+
+
+	def _select_leaf(self, state, root_pair=None):
+		"""
+		未展開の盤面まで降りる（通った (ノード, 行動, チャンスノード, ペア) は self._path に積む）
+		
+		返り値:
+			(depth, leaf, leaf_id, value)
+			葉を評価する必要があれば value は None
+			終局・打ち切りで値が決まれば leaf / leaf_id は None、value は (値, 葉のノード行)
+		"""
+		nodes = self.nodes
+		path_idx, path_action, path_chance, path_outcome = self._path
+		depth = 0
+		idx = -1	# 既に分かっている state の行（チャンスノードからたどったとき）
+		while True:
+			if idx < 0:
+				state_id = self.game.hash(state)
+				
+				if state_id in self.terminal_states:
+					return depth, None, None, (self.terminal_states[state_id], -1)
+				
+				info = self.game.board_info(state)
+				if info.game_over:
+					# reward_scalar のゲームオーバー(-1)を手番側から見た値に反転
+					self.terminal_states[state_id] = 1
+					return depth, None, None, (1, -1)
+				
+				valid_moves = info.valid_moves
+				if not valid_moves.any():
+					self.terminal_states[state_id] = -1.0
+					return depth, None, None, (-1.0, -1)
+				
+				idx = nodes.lookup(state_id)
+				if idx < 0:
+					return depth, state, state_id, None
+			else:
+				# 展開済みのノードは終局ではなく、有効手も展開したときに持っている
+				state_id = None
+				valid_moves = nodes.valid[idx]
 			
-			pi, v = self.nnet(torch.FloatTensor(state).view(1, 1, self.game.board_height, self.game.board_width))
-			pi, v = pi.data.numpy()[0], v.data.numpy()[0][0]
+			if depth >= self.max_depth:
+				# 打ち切り: 展開したときのネットワークの価値で代用する
+				self.num_cutoffs += 1
+				return depth, None, None, (-nodes.value[idx], idx)
 			
-			valid_moves = self.game.get_valid_moves(state)
+			best_action = self._select_action(idx, valid_moves)
 			
-			if not valid_moves.any():
-				self.terminal_states[state_id] = -1.0
-				return -1.0
+			# 根のペアが分かっていればそれを使い、それ以外はチャンスノードで選ぶ
+			pair = root_pair if depth == 0 else None
+			if self.chance_nodes:
+				chance, outcome = self._choose_outcome(idx, best_action, pair)
+				pair = self.game.pair_outcomes[outcome]
+			else:
+				chance, outcome = -1, 0
 			
-			self.P[state_id] = pi * valid_moves
+			path_idx[depth] = idx
+			path_action[depth] = best_action
+			path_chance[depth] = chance
+			path_outcome[depth] = outcome
 			
-			if self.P[state_id].sum() > 0:
-				self.P[state_id] = self.P[state_id] / self.P[state_id].sum()
-			else:
-				self.P[state_id] = valid_moves.astype(float) / valid_moves.sum()
+			# このペアの子を展開済みなら、保存した盤面でそのまま降りる
+			child = nodes.chance_child[chance, outcome] if chance >= 0 else -1
+			if child >= 0:
+				depth += 1
+				idx = child
+				state = nodes.board[child]
+				continue
 			
-			return -v
-		
-		##################
-		# explored nodes #
-		##################
-		
-		valid_moves = self.game.get_valid_moves(state)
-		
-		if not valid_moves.any():
-			self.terminal_states[state_id] = -1.0
-			return -1.0
-		
-		best_action = None
-		best_ucb = -float('inf')
-		
-		for action in range(self.num_actions):
-			if valid_moves[action]: 
-				ucb = self.U(state_id, action)
-				if ucb > best_ucb:
-					best_ucb = ucb
-					best_action = action
-		
-		if best_action is None:
-			self.terminal_states[state_id] = -1.0
-			return -1.0
-		
-		# ⭐ シミュレーションモードでnext_stateを呼ぶ
-		next_state, _, _, _, _ = self.game.next_state(state.copy(), action=best_action, is_simulation=True)
-		
-		next_state_id = self.game.hash(next_state)
-		if next_state_id == state_id:
-			self.terminal_states[state_id] = -1.0
-			return -1.0
-		
-		v = self.search(next_state, depth=depth+1)
-		
-		self.Q[state_id][best_action] = (
-			self.N[state_id][best_action] * self.Q[state_id][best_action] + v
-		) / (self.N[state_id][best_action] + 1)
-		self.N[state_id][best_action] += 1
-		
-		return -v
\ No newline at end of file
+			# ⭐ シミュレーションモードでnext_stateを呼ぶ（盤面は新しい配列で返る）
+			next_state, _, _, _, _ = self.game.next_state(state, action=best_action, current_pair=pair, is_simulation=True)
+			
+			if state_id is None:
+				state_id = self.game.hash(state)
+			if self.game.hash(next_state) == state_id:
+				self.terminal_states[state_id] = -1.0
+				return depth, None, None, (-1.0, -1)
+			
+			depth += 1
+			idx = -1
+			state = next_state
+
+
+	def _choose_outcome(self, idx, action, pair=None):
+		"""
+		チャンスノードで次のペアを選ぶ（層化抽出）
+		確率に比べて選ばれた回数が一番足りないペアを選ぶので、訪問がペアごとに偏らない
+		pair を渡したら（根の実際のペア）それに決める
+		"""
+		row = self.nodes.chance_row(idx, action)
+		counts = self.nodes.chance_count[row]
+		if pair is not None:
+			outcome = self._outcome_index[(int(pair[0]), int(pair[1]))]
+			counts[outcome] += 1
+			return row, outcome
+		deficit = self.game.pair_probs * (counts.sum() + 1) - counts
+		best = np.flatnonzero(deficit >= deficit.max() - 1e-9)
+		outcome = best[np.random.randint(len(best))] if len(best) > 1 else best[0]
+		counts[outcome] += 1
+		return row, outcome
+
+
+	def _backup(self, path, depth, value, leaf_idx):
+		"""葉側から順に価値を足す（1段ごとに符号反転）。チャンスノードの子の行もここで記録する"""
+		path_idx, path_action, path_chance, path_outcome = path
+		nodes = self.nodes
+		chance_child = nodes.chance_child
+		for d in range(depth - 1, -1, -1):
+			idx = path_idx[d]
+			action = path_action[d]
+			if path_chance[d] >= 0:
+				chance_child[path_chance[d], path_outcome[d]] = leaf_idx
+			nodes.update(idx, action, value)
+			value = -value
+			leaf_idx = idx
+
+
+	def _evaluate(self, state):
+		"""1盤面の推論"""
+		pi, v = self.inference.predict(state[np.newaxis])
+		return pi[0], v[0]
+
+
+	def _evaluate_batch(self, states):
+		"""盤面をまとめて1回で推論する（eval モードなので葉どうしの統計は混ざらない）"""
+		return self.inference.predict(np.stack(states))
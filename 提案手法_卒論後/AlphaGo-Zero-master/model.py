@@ -194,3 +194,95 @@ class PuyoNet(nn. Module):
         value = torch.tanh(self.value_output(x))
         
         return policy, value
+
+
+# ========== 小さいぷよぷよ用ネットワーク（残差ブロック） ==========
+
+class ResidualBlock(nn.Module):
+    """conv3x3-BN-ReLU-conv3x3-BN に入力を足して ReLU（BN は Sequential の中なので推論時に畳み込める）"""
+    def __init__(self, channels):
+        super(ResidualBlock, self).__init__()
+        self.body = nn.Sequential(
+            nn.Conv2d(channels, channels, 3, stride=1, padding=1, bias=False),
+            nn.BatchNorm2d(channels),
+            nn.ReLU(),
+            nn.Conv2d(channels, channels, 3, stride=1, padding=1, bias=False),
+            nn.BatchNorm2d(channels),
+        )
+
+    def forward(self, x):
+        return F.relu(self.body(x) + x)
+
+
+class PuyoResNet(nn.Module):
+    """
+    残差ブロックを積んだ小さいネットワーク
+    入力・出力は PuyoNet と同じ（(batch, 1, 14, 6) → policy (batch, 24), value (batch, 1)）
+
+    PuyoNet の fc1（14*6*128 → 256）のような盤面全体の全結合を持たず、
+    ヘッドは 1x1 畳み込みで数チャンネルに落としてから小さい全結合に渡す:
+      - policy: 1x1 conv → 2ch → 全結合（2*14*6 → 24）
+      - value:  1x1 conv → value_channels → グローバル平均プーリング → 全結合 → tanh
+    """
+    def __init__(self, board_height=14, board_width=6, num_actions=24, channels=32, blocks=4, value_channels=32):
+        super(PuyoResNet, self).__init__()
+
+        self.board_height = board_height
+        self.board_width = board_width
+        self.num_actions = num_actions
+
+        # 畳み込み部分（InferenceNet の静的量子化は self.main を対象にする）
+        self.main = nn.Sequential()
+        self.main.add_module('Conv_stem', nn.Conv2d(1, channels, 3, stride=1, padding=1, bias=False))
+        self.main.add_module('bn_stem', nn.BatchNorm2d(channels))
+        self.main.add_module('relu_stem', nn.ReLU())
+        for i in range(blocks):
+            self.main.add_module(f'res_{i + 1}', ResidualBlock(channels))
+
+        # Policy Head
+        self.policy_conv = nn.Sequential(
+            nn.Conv2d(channels, 2, 1, bias=False),
+            nn.BatchNorm2d(2),
+            nn.ReLU(),
+        )
+        self.policy_output = nn.Linear(2 * board_height * board_width, num_actions)
+
+        # Value Head
+        self.value_conv = nn.Sequential(
+            nn.Conv2d(channels, value_channels, 1, bias=False),
+            nn.BatchNorm2d(value_channels),
+            nn.ReLU(),
+        )
+        self.value_output = nn.Linear(value_channels, 1)
+
+    def forward(self, inputs):
+        x = self.main(inputs)
+
+        p = self.policy_conv(x)
+        policy = F.softmax(self.policy_output(p.reshape(p.size(0), -1)), dim=1)
+
+        v = self.value_conv(x).mean(dim=(2, 3))
+        value = torch.tanh(self.value_output(v))
+
+        return policy, value
+
+
+# ========== アーキテクチャの登録 ==========
+
+# 名前 → (クラス, 追加の引数)。main.py などから名前で選ぶ
+ARCHITECTURES = {
+    'puyonet': (PuyoNet, {}),
+    'resnet_tiny': (PuyoResNet, {'channels': 16, 'blocks': 2, 'value_channels': 16}),
+    'resnet_small': (PuyoResNet, {'channels': 32, 'blocks': 4, 'value_channels': 32}),
+    'resnet': (PuyoResNet, {'channels': 64, 'blocks': 6, 'value_channels': 32}),
+}
+
+
+def create_model(architecture='puyonet', board_height=14, board_width=6, num_actions=24):
+    """登録名からネットワークを作る（net.architecture に名前を残す）"""
+    if architecture not in ARCHITECTURES:
+        raise ValueError(f"Unknown architecture: {architecture} (available: {', '.join(ARCHITECTURES)})")
+    cls, kwargs = ARCHITECTURES[architecture]
+    net = cls(board_height=board_height, board_width=board_width, num_actions=num_actions, **kwargs)
+    net.architecture = architecture
+    return net
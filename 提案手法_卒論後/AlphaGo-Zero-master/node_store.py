@@ -0,0 +1,247 @@
+"""
+MCTSの探索木を配列で持つノード表
+
+ノード（展開済みの盤面）ごとに1行を割り当て、行動ごとの値を [容量, 行動数] の配列で持つ:
+    N     … 訪問回数
+    W     … 価値の合計（Q = W / N）
+    P     … 事前確率（有効手でマスク・正規化済み）
+    V     … 評価待ちの経路が通っている数（バッチ探索の仮想損失）
+    chance … その行動のチャンスノード（次のペアの抽選）の行（まだ無ければ -1）
+    valid … 有効手
+ノードごとの値:
+    board      … 盤面（[容量, 高さ, 幅] int8。チャンスノードから子へ降りるときに next_state を呼ばずに使う）
+    parent     … 最初にそのノードを展開したときの親の行（根は -1）
+    value      … 展開したときのネットワークの価値（深さ打ち切りの代用値）
+    total      … 全行動の訪問回数の合計
+    sqrt_total … sqrt(total + 行動数 * 1e-8)（PUCTの分子。訪問を足すたびに更新する）
+
+チャンスノードは別の表に [容量, 結果数] で持つ（最初に通ったときに割り当てる）:
+    chance_count … 結果（ペア）ごとに選んだ回数
+    chance_child … 結果ごとの子ノードの行（未展開・終局は -1）。探索はここから子へ直接降りる
+
+盤面ハッシュ → 行番号 は dict で引き、容量が足りなくなったら倍に伸ばす。
+実際の手を進めたら retain_subtree で新しい根の下だけを残し、行を前に詰める。
+"""
+import math
+
+import numpy as np
+
+
+# ノードごと・チャンスノードごとに1行ずつ持つ配列
+_NODE_ARRAYS = ('N', 'W', 'P', 'V', 'chance', 'valid', 'board', 'parent', 'value', 'total', 'sqrt_total')
+_CHANCE_ARRAYS = ('chance_count', 'chance_child')
+
+
+class NodeStore:
+    def __init__(self, num_actions, capacity=1024, num_outcomes=16, board_shape=(14, 6)):
+        self.num_actions = num_actions
+        self.num_outcomes = num_outcomes
+        self.capacity = 0
+        self.size = 0
+        self.index = {}
+        self.chance_capacity = 0
+        self.chance_size = 0
+        self.chance_count = np.zeros((0, num_outcomes), dtype=np.int32)
+        self.chance_child = np.zeros((0, num_outcomes), dtype=np.int32)
+        self.N = np.zeros((0, num_actions), dtype=np.int32)
+        self.W = np.zeros((0, num_actions), dtype=np.float32)
+        self.P = np.zeros((0, num_actions), dtype=np.float32)
+        self.V = np.zeros((0, num_actions), dtype=np.int32)
+        self.chance = np.zeros((0, num_actions), dtype=np.int32)
+        self.valid = np.zeros((0, num_actions), dtype=bool)
+        self.board = np.zeros((0,) + tuple(board_shape), dtype=np.int8)
+        self.parent = np.zeros(0, dtype=np.int32)
+        self.value = np.zeros(0, dtype=np.float32)
+        self.total = np.zeros(0, dtype=np.int32)
+        self.sqrt_total = np.zeros(0, dtype=np.float64)
+        self.sqrt_eps = num_actions * 1e-8
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def _grow(self, capacity):
+        """配列を capacity 行に伸ばす（既存の行はそのままコピー）"""
+        def extend(array, fill):
+            grown = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self.N = extend(self.N, 0)
+        self.W = extend(self.W, 0)
+        self.P = extend(self.P, 0)
+        self.V = extend(self.V, 0)
+        self.chance = extend(self.chance, -1)
+        self.valid = extend(self.valid, False)
+        self.board = extend(self.board, 0)
+        self.parent = extend(self.parent, -1)
+        self.value = extend(self.value, 0)
+        self.total = extend(self.total, 0)
+        self.sqrt_total = extend(self.sqrt_total, 0)
+        self.capacity = capacity
+
+    def _grow_chance(self, capacity):
+        count = np.zeros((capacity, self.num_outcomes), dtype=np.int32)
+        count[:self.chance_size] = self.chance_count[:self.chance_size]
+        child = np.full((capacity, self.num_outcomes), -1, dtype=np.int32)
+        child[:self.chance_size] = self.chance_child[:self.chance_size]
+        self.chance_count = count
+        self.chance_child = child
+        self.chance_capacity = capacity
+
+    def chance_row(self, idx, action):
+        """(ノード, 行動) のチャンスノードの行（無ければ割り当てる）"""
+        row = self.chance[idx, action]
+        if row >= 0:
+            return row
+        if self.chance_size == self.chance_capacity:
+            self._grow_chance(max(self.chance_capacity * 2, 256))
+        row = self.chance_size
+        self.chance_size += 1
+        self.chance[idx, action] = row
+        return row
+
+    def lookup(self, key):
+        """ハッシュに対応する行（未展開なら -1）"""
+        return self.index.get(key, -1)
+
+    def add(self, key, priors, parent=-1, value=0.0, board=None, valid=None):
+        """新しいノードを追加して行番号を返す（board / valid は盤面と有効手。None なら持たない）"""
+        if self.size == self.capacity:
+            self._grow(self.capacity * 2)
+        idx = self.size
+        self.size += 1
+        self.index[key] = idx
+        self.P[idx] = priors
+        self.parent[idx] = parent
+        self.value[idx] = value
+        self.valid[idx] = priors > 0 if valid is None else valid
+        if board is not None:
+            self.board[idx] = board
+        self.total[idx] = 0
+        self.sqrt_total[idx] = math.sqrt(self.sqrt_eps)
+        return idx
+
+    def retain_subtree(self, root):
+        """
+        root の子孫（parent をたどると root に着くノード）だけを残して行を前に詰める
+        root が -1 なら全部捨てる。返り値は捨てたノード数
+
+        別の親から合流した盤面は、最初の親が root の下になければ捨てる。
+        """
+        size = self.size
+        if root < 0:
+            self.clear()
+            return size
+
+        parent = self.parent[:size]
+        keep = np.zeros(size, dtype=bool)
+        keep[root] = True
+        ancestor = parent.copy()
+        # 1段ずつ親をたどる（木の深さぶんのループ、各段はベクトル演算）
+        while True:
+            alive = ancestor >= 0
+            if not alive.any():
+                break
+            keep |= ancestor == root
+            ancestor = np.where(alive & ~keep, parent[np.maximum(ancestor, 0)], -1)
+
+        kept = np.flatnonzero(keep)
+        remap = np.full(size + 1, -1, dtype=np.int32)   # remap[-1] == -1 のため1つ余分に持つ
+        remap[kept] = np.arange(len(kept), dtype=np.int32)
+
+        new_size = len(kept)
+        for name in ('N', 'W', 'P', 'V', 'valid', 'board', 'value', 'total', 'sqrt_total'):
+            array = getattr(self, name)
+            array[:new_size] = array[kept]
+            array[new_size:size] = 0
+        self.parent[:new_size] = remap[parent[kept]]
+        self.parent[new_size:size] = -1
+        self.parent[remap[root]] = -1
+
+        # 残ったノードが持つチャンスノードだけを残す
+        chance_size = self.chance_size
+        chance = self.chance[kept]
+        keep_chance = np.zeros(chance_size, dtype=bool)
+        keep_chance[chance[chance >= 0]] = True
+        kept_chance = np.flatnonzero(keep_chance)
+        chance_remap = np.full(chance_size + 1, -1, dtype=np.int32)
+        chance_remap[kept_chance] = np.arange(len(kept_chance), dtype=np.int32)
+        self.chance[:new_size] = chance_remap[chance]
+        self.chance[new_size:size] = -1
+
+        new_chance_size = len(kept_chance)
+        self.chance_count[:new_chance_size] = self.chance_count[kept_chance]
+        self.chance_count[new_chance_size:chance_size] = 0
+        self.chance_child[:new_chance_size] = remap[self.chance_child[kept_chance]]
+        self.chance_child[new_chance_size:chance_size] = -1
+        self.chance_size = new_chance_size
+
+        self.index = {key: int(remap[idx]) for key, idx in self.index.items() if keep[idx]}
+        self.size = new_size
+        return size - new_size
+
+    def q_values(self, idx):
+        """行動ごとの平均価値（未訪問は0）"""
+        n = self.N[idx]
+        return np.divide(self.W[idx], n, out=np.zeros(self.num_actions, dtype=np.float32), where=n > 0)
+
+    def update(self, idx, action, value):
+        self.N[idx, action] += 1
+        self.W[idx, action] += value
+        total = self.total[idx] + 1
+        self.total[idx] = total
+        self.sqrt_total[idx] = math.sqrt(total + self.sqrt_eps)
+
+    def clear_visits(self, idx):
+        """idx の行の訪問回数・価値の合計を0に戻す（事前確率・子への行はそのまま）"""
+        self.N[idx] = 0
+        self.W[idx] = 0
+        self.total[idx] = 0
+        self.sqrt_total[idx] = math.sqrt(self.sqrt_eps)
+
+    def clear(self):
+        self.index.clear()
+        self.size = 0
+        self.N[:] = 0
+        self.W[:] = 0
+        self.P[:] = 0
+        self.V[:] = 0
+        self.valid[:] = False
+        self.board[:] = 0
+        self.parent[:] = -1
+        self.value[:] = 0
+        self.total[:] = 0
+        self.sqrt_total[:] = 0
+        self.chance[:] = -1
+        self.chance_size = 0
+        self.chance_count[:] = 0
+        self.chance_child[:] = -1
+
+    def _row_nbytes(self, names):
+        """配列の1行ぶんのバイト数の合計"""
+        return sum(getattr(self, name).itemsize * math.prod(getattr(self, name).shape[1:]) for name in names)
+
+    def nbytes(self):
+        """配列（確保済みの容量ぶん）と索引dictのおおよそのメモリ量"""
+        arrays = sum(getattr(self, name).nbytes for name in _NODE_ARRAYS + _CHANCE_ARRAYS)
+        # dictの1エントリ（ハッシュ・キー・値のスロット + int2個）くらい
+        return arrays + len(self.index) * 100
+
+    def stats(self):
+        """
+        bytes_per_row / bytes_per_chance_row は1行ぶんの配列のバイト数（容量によらない）、
+        allocated_bytes は確保済みの容量ぶんの配列と索引の合計
+        """
+        return {
+            'nodes': self.size,
+            'capacity': self.capacity,
+            'chance_nodes': self.chance_size,
+            'chance_capacity': self.chance_capacity,
+            'bytes_per_row': self._row_nbytes(_NODE_ARRAYS),
+            'bytes_per_chance_row': self._row_nbytes(_CHANCE_ARRAYS),
+            'allocated_bytes': self.nbytes(),
+        }
@@ -0,0 +1,256 @@
+"""
+ルート並列MCTS（複数プロセス）
+
+M個のワーカープロセスがそれぞれ独立した探索木を持ち、同じ根から
+シミュレーション数を分け合って探索する。根の訪問回数と価値の合計を足し合わせてから
+行動確率を作る（MCTS と同じインターフェース）。
+
+ワーカーはエピソード・手をまたいで起動したままにし、パイプで
+新しい根の盤面・ペア・シミュレーション数を受け取る。
+inference_server=True なら、ネットワークは推論サーバー（inference_server.py）の1プロセスだけが持ち、
+ワーカーは共有メモリ越しに葉を送る（複数ワーカーの葉が1バッチにまとまる）。
+
+    pool = RootParallelMCTS(game, net, num_workers=8, num_sims=120)
+    pool.reset(net)                          # エピソード開始（重みを送って木を作り直す）
+    pool.advance_root(state)
+    pool.run_simulations(state, 120, pair=current_pair)
+    pi = pool.get_action_probabilities(state, t=1)
+    pool.close()
+"""
+import copy
+import multiprocessing as mp
+import shutil
+import tempfile
+import traceback
+
+import numpy as np
+import torch
+
+from inference_server import InferenceServer
+from lru_cache import LRUCache
+from mcts import MCTS, action_probabilities, merge_search_stats, run_anytime
+
+
+def _cpu_state_dict(net):
+    return {key: value.detach().cpu() for key, value in net.state_dict().items()}
+
+
+def _worker_loop(conn, seed, backend, simulator_path, net, eval_cache_size, mcts_kwargs):
+    """
+    ワーカープロセス本体: コマンドを1つ受け取って1つ返す
+    net は推論サーバーのクライアントでもよい（そのときは reset で重みを受け取らない）
+    """
+    from puyopuyo_env_cpp import PuyoPuyoGame
+
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.set_num_threads(1)   # プロセス数ぶん並列にするので推論は1スレッド
+
+    # 'subprocess' バックエンドは一時ディレクトリを作り直すので、ワーカーごとに分ける
+    temp_dir = tempfile.mkdtemp(prefix='puyo_search_')
+    simulator_kwargs = {'temp_dir': temp_dir} if backend == 'subprocess' else None
+    game = PuyoPuyoGame(backend=backend, simulator_path=simulator_path, simulator_kwargs=simulator_kwargs)
+    mcts = None
+    # 評価キャッシュはワーカーごとに持ち、重みのバージョンが変わったら捨てる
+    eval_cache = LRUCache(eval_cache_size) if eval_cache_size > 0 else None
+    weights_version = None
+
+    while True:
+        try:
+            command, args = conn.recv()
+        except EOFError:
+            break
+        try:
+            if command == 'reset':
+                state_dict, training, version, inference_kwargs = args
+                if state_dict is not None:
+                    net.load_state_dict(state_dict)
+                    net.train(training)
+                if eval_cache is not None and (version is None or version != weights_version):
+                    eval_cache.clear()
+                weights_version = version
+                mcts = MCTS(game=game, net=net, eval_cache=eval_cache, inference_kwargs=inference_kwargs, **mcts_kwargs)
+                conn.send(('ok', None))
+            elif command == 'advance':
+                conn.send(('ok', mcts.advance_root(args)))
+            elif command == 'search':
+                board, pair, num_sims = args
+                mcts.run_simulations(board, num_sims, pair=pair)
+                idx = mcts.nodes.lookup(game.hash(board))
+                if idx >= 0:
+                    root = (mcts.nodes.N[idx].copy(), mcts.nodes.W[idx].copy())
+                else:
+                    root = (np.zeros(game.num_actions, dtype=np.int32), np.zeros(game.num_actions, dtype=np.float32))
+                conn.send(('ok', root + (mcts.tree_stats(),)))
+            elif command == 'stats':
+                conn.send(('ok', mcts.search_stats()))
+            elif command == 'close':
+                conn.send(('ok', None))
+                break
+            else:
+                conn.send(('error', f"Unknown command: {command}"))
+        except Exception:
+            conn.send(('error', traceback.format_exc()))
+    game.simulator.close()
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class RootParallelMCTS:
+    """
+    ルート並列の探索（MCTS の代わりに Solver から使う）
+
+    引数:
+        game: PuyoPuyoGame（ワーカーは同じ backend / simulator_path で自分用に作り直す）
+        net: ネットワーク（CPUにコピーしてワーカーへ送る）
+        num_workers: ワーカープロセス数
+        seed: ワーカー i の乱数シードは seed + i（Noneなら毎回ランダム）
+        eval_cache_size: ワーカーごとの評価キャッシュの最大エントリ数（0なら使わない）
+        inference_server: 推論サーバーを立ててワーカーの推論をまとめる（重みはサーバーだけが持つ）
+        server_kwargs: InferenceServer に渡す引数（max_batch / max_wait_ms など）
+        mcts_kwargs: 各ワーカーの MCTS に渡す引数（batch_size など）
+    """
+    def __init__(self, game, net, num_workers, num_sims=25, seed=None, eval_cache_size=0,
+                 inference_server=False, server_kwargs=None, **mcts_kwargs):
+        self.game = game
+        self.num_actions = game.num_actions
+        self.num_workers = num_workers
+        self.num_sims = num_sims
+        self.N = np.zeros(self.num_actions, dtype=np.int64)
+        self.W = np.zeros(self.num_actions, dtype=np.float64)
+        self._root_id = None
+        self._tree_stats = []
+        self._server = None
+        self._server_version = None
+
+        if seed is None:
+            seed = np.random.randint(0, 2 ** 31 - num_workers)
+        if inference_server:
+            self._server = InferenceServer(net, num_workers, **(server_kwargs or {}))
+            worker_nets = [self._server.client(i) for i in range(num_workers)]
+        else:
+            worker_nets = [copy.deepcopy(net).cpu()] * num_workers
+        mcts_kwargs = dict(mcts_kwargs, num_sims=num_sims)
+
+        ctx = mp.get_context('spawn')
+        self._conns = []
+        self._procs = []
+        for i in range(num_workers):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker_loop,
+                args=(child_conn, seed + i, game.backend, game.simulator_path, worker_nets[i], eval_cache_size, mcts_kwargs),
+                daemon=True,
+            )
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+
+    def _broadcast(self, command, args_list):
+        """全ワーカーにコマンドを送り、全員の返事を集める"""
+        for conn, args in zip(self._conns, args_list):
+            conn.send((command, args))
+        results = []
+        for i, conn in enumerate(self._conns):
+            status, result = conn.recv()
+            if status != 'ok':
+                raise RuntimeError(f"Search worker {i} failed:\n{result}")
+            results.append(result)
+        return results
+
+    def reset(self, net, weights_version=None, inference_kwargs=None):
+        """
+        エピソード開始: 最新の重みを送り、各ワーカーの探索木を作り直す
+        weights_version が前回と同じなら評価キャッシュを残す（None なら毎回捨てる）
+        inference_kwargs: ワーカーの InferenceNet に渡す引数（quantize / calibration）
+        推論サーバーを使うときは、重みが変わったときだけサーバーの重みを差し替える（ワーカーは再起動しない）
+        """
+        if self._server is not None:
+            if weights_version is None or weights_version != self._server_version:
+                self._server.update_weights(net, inference_kwargs)
+                self._server_version = weights_version
+            args = (None, False, weights_version, None)
+        else:
+            args = (_cpu_state_dict(net), net.training, weights_version, inference_kwargs)
+        self._broadcast('reset', [args] * self.num_workers)
+        self.N[:] = 0
+        self.W[:] = 0
+        self._root_id = None
+
+    def advance_root(self, state):
+        """各ワーカーで部分木を引き継ぎ、引き継いだノード数の合計を返す"""
+        return sum(self._broadcast('advance', [state] * self.num_workers))
+
+    def run_simulations(self, state, num_sims, pair=None):
+        """num_sims を各ワーカーに分けて探索し、根の訪問回数と価値の合計を足し合わせる"""
+        shares = [num_sims // self.num_workers + (i < num_sims % self.num_workers)
+                  for i in range(self.num_workers)]
+        results = self._broadcast('search', [(state, pair, share) for share in shares])
+        self.N = sum(N.astype(np.int64) for N, _, _ in results)
+        self.W = sum(W.astype(np.float64) for _, W, _ in results)
+        self._tree_stats = [stats for _, _, stats in results]
+        self._root_id = self.game.hash(state)
+
+    def run_anytime(self, state, num_sims=None, time_budget=None, pair=None,
+                    stop_when_decided=True, stability_threshold=None, check_every=None):
+        """早期終了つきの探索（mcts.run_anytime）。1回のチェックで全ワーカーに分けて回す"""
+        if check_every is None:
+            check_every = 8 * self.num_workers
+        return run_anytime(self, state, num_sims, time_budget, pair,
+                           stop_when_decided, stability_threshold, check_every)
+
+    def root_counts(self, state):
+        """足し合わせた根の訪問回数（別の盤面の結果しかなければ全部0）"""
+        if self.game.hash(state) != self._root_id:
+            return np.zeros(self.num_actions, dtype=np.int64)
+        return self.N.copy()
+
+    def q_values(self):
+        """足し合わせた根の行動ごとの平均価値（未訪問は0）"""
+        return np.divide(self.W, self.N, out=np.zeros(self.num_actions), where=self.N > 0)
+
+    def get_action_probabilities(self, state, t=0):
+        if self.game.hash(state) != self._root_id:
+            counts = [0] * self.num_actions
+        else:
+            counts = self.N.tolist()
+        return action_probabilities(counts, t)
+
+    def tree_stats(self):
+        """全ワーカーの探索木を合計したノード数・メモリ量（1行のバイト数はワーカー共通）"""
+        stats_list = self._tree_stats
+        merged = {key: sum(stats[key] for stats in stats_list)
+                  for key in ('nodes', 'capacity', 'chance_nodes', 'chance_capacity', 'allocated_bytes')}
+        merged['bytes_per_row'] = stats_list[0]['bytes_per_row'] if stats_list else 0
+        merged['bytes_per_chance_row'] = stats_list[0]['bytes_per_chance_row'] if stats_list else 0
+        return merged
+
+    def server_stats(self):
+        """推論サーバーの統計（使っていなければ None）"""
+        return self._server.stats() if self._server is not None else None
+
+    def search_stats(self):
+        return merge_search_stats(self._broadcast('stats', [None] * self.num_workers))
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(('close', None))
+                conn.recv()
+            except (OSError, EOFError, BrokenPipeError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._conns = []
+        self._procs = []
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,327 @@
+"""
+ぷよぷよの1手シミュレーション（Python版）
+
+Alpha-ojyama の core（FieldBit / Field / chain.h）と同じ処理をPythonで行う。
+C++のシミュレータが使えない環境（Linuxワーカー等）でも、
+設置・グループ判定・消去・落下・連鎖倍率・色数ボーナス・連結ボーナスまで計算できる。
+
+盤面は色ごとのビットプレーンで持つ（FieldBitと同じ配置）:
+    列xが bit [16x, 16x+16) の16bitレーン、その中のbit yが段y（y=0が最下段）
+    Pythonのintで6列 × 16bit = 96bit
+
+numpy盤面（puyopuyo_env_cpp と同じ (14, 6), y=0が最下段）の値:
+    0=空, 1=赤, 2=緑, 3=青, 4=黄, 6=おじゃま（それ以外は空として扱う）
+"""
+import numpy as np
+
+
+BOARD_HEIGHT = 14
+BOARD_WIDTH = 6
+FIELD_HEIGHT = 13          # FieldBitが持つ段数（14段目はC++側でも盤面に残らない）
+
+# プレーン番号 → numpy盤面の値（最後がおじゃま）
+CELL_VALUES = (1, 2, 3, 4, 6)
+NUM_COLORS = 4
+GARBAGE = 4
+_VALUE_TO_PLANE = {value: i for i, value in enumerate(CELL_VALUES)}
+
+# chain.h と同じ表
+COLOR_BONUS = (0, 0, 3, 6, 12, 24)
+GROUP_BONUS = (0, 0, 0, 0, 0, 2, 3, 4, 5, 6, 7, 10)
+POWER = (0, 8, 16, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448, 480, 512)
+MAX_CHAIN = 19
+
+
+def _lanes(value):
+    """16bit値を6列すべてのレーンに並べたマスク"""
+    result = 0
+    for x in range(BOARD_WIDTH):
+        result |= value << (16 * x)
+    return result
+
+
+FULL = _lanes(0xFFFF)
+MASK_12 = _lanes(0x0FFF)
+MASK_13 = _lanes(0x1FFF)
+_LOW_15 = _lanes(0x7FFF)    # 段方向に1つ下げたとき隣の列へ漏れるbitを落とす
+_HIGH_15 = _lanes(0xFFFE)   # 段方向に1つ上げたとき隣の列へ漏れるbitを落とす
+
+
+# ========== FieldBit 相当のビット演算 ==========
+
+def _shift_right(m):
+    """_mm_srli_si128(m, 2): 列x+1 → 列x"""
+    return m >> 16
+
+
+def _shift_left(m):
+    """_mm_slli_si128(m, 2): 列x → 列x+1"""
+    return (m << 16) & FULL
+
+
+def _shift_up(m):
+    """_mm_srli_epi16(m, 1): 段y+1 → 段y"""
+    return (m >> 1) & _LOW_15
+
+
+def _shift_down(m):
+    """_mm_slli_epi16(m, 1): 段y → 段y+1"""
+    return (m << 1) & _HIGH_15
+
+
+def expand(m):
+    """FieldBit::get_expand"""
+    return m | _shift_right(m) | _shift_left(m) | _shift_up(m) | _shift_down(m)
+
+
+def get_mask_pop(m):
+    """
+    FieldBit::get_mask_pop
+    4個以上つながったグループのマスク（12段目より下のみ）
+    """
+    m12 = m & MASK_12
+
+    r = _shift_right(m12) & m12
+    l = _shift_left(m12) & m12
+    u = _shift_up(m12) & m12
+    d = _shift_down(m12) & m12
+
+    ud_and = u & d
+    lr_and = l & r
+    ud_or = u | d
+    lr_or = l | r
+
+    m3 = (ud_and & lr_or) | (lr_and & ud_or)
+    m2 = ud_and | lr_and | (ud_or & lr_or)
+
+    m2_r = _shift_right(m2) & m2
+    m2_l = _shift_left(m2) & m2
+    m2_u = _shift_up(m2) & m2
+    m2_d = _shift_down(m2) & m2
+
+    result = m3 | m2_r | m2_l | m2_u | m2_d
+    return expand(result) & m12
+
+
+def get_mask_group_lsb(m):
+    """FieldBit::get_mask_group_lsb: 最下位bitから塗りつぶしたグループ"""
+    m12 = m & MASK_12
+    group = m12 & -m12
+    while True:
+        grown = expand(group) & m12
+        if grown == group:
+            return group
+        group = grown
+
+
+def _pext_column(column, removed):
+    """pext16(column, ~removed): removedのbitを抜いて下に詰める"""
+    while removed:
+        top = removed.bit_length() - 1
+        column = (column & ((1 << top) - 1)) | ((column >> (top + 1)) << top)
+        removed &= ~(1 << top)
+    return column
+
+
+def _pop_plane(plane, mask):
+    """FieldBit::pop"""
+    for x in range(BOARD_WIDTH):
+        shift = 16 * x
+        removed = (mask >> shift) & 0xFFFF
+        if not removed:
+            continue
+        column = (plane >> shift) & 0xFFFF
+        if not column:
+            continue
+        plane = (plane & ~(0xFFFF << shift)) | (_pext_column(column, removed) << shift)
+    return plane
+
+
+# ========== Field 相当 ==========
+
+def column_heights(planes):
+    """Field::get_heights"""
+    occupied = 0
+    for plane in planes:
+        occupied |= plane
+    return [((occupied >> (16 * x)) & 0xFFFF).bit_length() for x in range(BOARD_WIDTH)]
+
+
+def drop_puyo(planes, x, plane_index):
+    """Field::drop_puyo（13段目まで。14段目はC++でも盤面に残らないので捨てる）"""
+    shift = 16 * x
+    occupied = 0
+    for plane in planes:
+        occupied |= plane
+    height = ((occupied >> shift) & 0xFFFF).bit_length()
+    if height < FIELD_HEIGHT:
+        planes[plane_index] |= 1 << (shift + height)
+
+
+def drop_pair(planes, x, r, pair):
+    """Field::drop_pair（r: 0=UP, 1=RIGHT, 2=DOWN, 3=LEFT）"""
+    x = int(x)
+    r = int(r)
+    first = _VALUE_TO_PLANE.get(int(pair[0]))
+    second = _VALUE_TO_PLANE.get(int(pair[1]))
+
+    def drop(col, plane_index):
+        if plane_index is not None and 0 <= col < BOARD_WIDTH:
+            drop_puyo(planes, col, plane_index)
+
+    if r == 0:
+        drop(x, first)
+        drop(x, second)
+    elif r == 1:
+        drop(x, first)
+        drop(x + 1, second)
+    elif r == 2:
+        drop(x, second)
+        drop(x, first)
+    elif r == 3:
+        drop(x, first)
+        drop(x - 1, second)
+
+
+def pop(planes):
+    """
+    Field::pop: 連鎖が止まるまで消去と落下を繰り返す
+
+    返り値:
+        各連鎖で消えた色ごとのマスクのリスト（[[赤, 緑, 青, 黄], ...]）
+    """
+    result = []
+    for _ in range(MAX_CHAIN):
+        popped = [get_mask_pop(planes[i]) for i in range(NUM_COLORS)]
+        mask_pop = popped[0] | popped[1] | popped[2] | popped[3]
+        if not mask_pop:
+            break
+
+        result.append(popped)
+
+        mask_pop |= expand(mask_pop) & planes[GARBAGE]
+        for i in range(len(planes)):
+            planes[i] = _pop_plane(planes[i], mask_pop)
+    return result
+
+
+def get_score(masks):
+    """
+    chain::get_score
+
+    返り値:
+        (連鎖数, スコア)
+    """
+    score = 0
+    for index, popped in enumerate(masks):
+        pop_count = 0
+        color = 0
+        group_bonus = 0
+        for mask in popped:
+            if not mask:
+                continue
+            pop_count += mask.bit_count()
+            color += 1
+            while mask:
+                group = get_mask_group_lsb(mask)
+                mask &= ~group
+                group_bonus += GROUP_BONUS[min(11, group.bit_count())]
+
+        bonus = POWER[index] + COLOR_BONUS[color] + group_bonus
+        score += pop_count * 10 * min(max(bonus, 1), 999)
+    return len(masks), score
+
+
+# ========== numpy盤面との変換 ==========
+
+_PLANE_VALUES = np.array(CELL_VALUES, dtype=np.int8).reshape(-1, 1, 1)
+
+
+def from_array(board):
+    """
+    (14, 6) の盤面をビットプレーンに変換
+    C++の load_field と同じく、下の段から順に落とす（宙に浮いたぷよは詰める）
+    """
+    board = np.asarray(board)
+    cells = board[None, :, :] == _PLANE_VALUES              # (5, 14, 6)
+    filled = cells.any(axis=0)                              # (14, 6)
+
+    # 下から隙間なく積まれていて13段以内なら、そのままビットに詰める
+    if not filled[FIELD_HEIGHT:].any() and not (filled[1:] & ~filled[:-1]).any():
+        lanes = np.zeros((len(CELL_VALUES), BOARD_WIDTH, 16), dtype=np.uint8)
+        lanes[:, :, :BOARD_HEIGHT] = cells.transpose(0, 2, 1)
+        packed = np.packbits(lanes, axis=-1, bitorder='little').reshape(len(CELL_VALUES), -1)
+        return [int.from_bytes(row.tobytes(), 'little') for row in packed]
+
+    planes = [0] * len(CELL_VALUES)
+    for x in range(BOARD_WIDTH):
+        y = 0
+        for value in board[:, x]:
+            plane_index = _VALUE_TO_PLANE.get(int(value))
+            if plane_index is None:
+                continue
+            if y < FIELD_HEIGHT:
+                planes[plane_index] |= 1 << (16 * x + y)
+            y += 1
+    return planes
+
+
+def to_array(planes):
+    """ビットプレーンを (14, 6) int8 の盤面に戻す"""
+    board = np.zeros((BOARD_HEIGHT, BOARD_WIDTH), dtype=np.int8)
+    for value, plane in zip(CELL_VALUES, planes):
+        if not plane:
+            continue
+        bits = np.unpackbits(
+            np.frombuffer(plane.to_bytes(2 * BOARD_WIDTH, 'little'), dtype=np.uint8),
+            bitorder='little'
+        ).reshape(BOARD_WIDTH, 16)[:, :BOARD_HEIGHT]
+        board[bits.T.astype(bool)] = value
+    return board
+
+
+# ========== 1手分 ==========
+
+def placement_in_bounds(x, r):
+    """子ぷよも盤面に収まる (x, r) か（simulator.h の placement_in_bounds と同じ。x=0 の LEFT と x=5 の RIGHT は不可）"""
+    if not (0 <= x < BOARD_WIDTH and 0 <= r < 4):
+        return False
+    return not (x == 0 and r == 3) and not (x == BOARD_WIDTH - 1 and r == 1)
+
+
+def step(board, x, r, pair):
+    """
+    main_simulator.cpp の1手（設置 → 連鎖 → ゲームオーバー判定）と同じ処理
+
+    返り値:
+        (next_board, score, chain_count, game_over)
+    """
+    planes = from_array(board)
+    drop_pair(planes, x, r, pair)
+    chain_count, score = get_score(pop(planes))
+    game_over = max(column_heights(planes)) > 12
+    return to_array(planes), score, chain_count, game_over
+
+
+def resolve(board):
+    """設置なしで、今の盤面の連鎖だけを最後まで進める"""
+    planes = from_array(board)
+    chain_count, score = get_score(pop(planes))
+    return to_array(planes), score, chain_count
+
+
+class PythonSimulator:
+    """Python版エンジンを使うシミュレータバックエンド（simulator_backend の step と同じ形）"""
+    def __init__(self, simulator_path=None):
+        self.simulator_path = __file__
+
+    def step(self, board, x, r, pair):
+        # puyo_capi の puyo_step と同じく、壁の外に出る置き方は引数エラー
+        if not placement_in_bounds(x, r):
+            print(f"[ERROR] Python step rejected: x={x}, r={r}, pair={pair}", flush=True)
+            return None
+        next_board, score, chain_count, _ = step(board, x, r, pair)
+        return next_board, score, chain_count
+
+    def close(self):
+        pass
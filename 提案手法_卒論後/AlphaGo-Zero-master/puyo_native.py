@@ -0,0 +1,142 @@
+"""
+C++エンジン（puyo_capi.dll / puyo_capi.so）の ctypes ラッパー
+
+Alpha-ojyama の Field::drop_pair / Field::pop / chain::get_score をプロセス内で直接呼ぶ。
+ビルド: Alpha-ojyama で `make puyo_capi`
+
+盤面は (14, 6) の連続した int8 配列をそのままポインタで渡す（コピーしない）。
+"""
+import ctypes
+import os
+import sys
+
+import numpy as np
+
+
+_LIB_NAME = 'puyo_capi.dll' if sys.platform == 'win32' else 'puyo_capi.so'
+DEFAULT_LIBRARY_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'Alpha-ojyama', 'bin', 'puyop', _LIB_NAME
+)
+
+BOARD_HEIGHT = 14
+BOARD_WIDTH = 6
+
+_I32_PTR = ctypes.POINTER(ctypes.c_int32)
+
+
+def _address(array):
+    """配列のデータ先頭アドレス（ndpointerの型チェックより速い）"""
+    return array.__array_interface__['data'][0]
+
+
+def load_library(library_path=None):
+    """共有ライブラリを読み込み、関数シグネチャを設定して返す"""
+    if library_path is None:
+        library_path = DEFAULT_LIBRARY_PATH
+    library_path = os.path.abspath(library_path)
+    if not os.path.exists(library_path):
+        raise FileNotFoundError(f"Native library not found:   {library_path}")
+
+    lib = ctypes.CDLL(library_path)
+
+    lib.puyo_capi_version.argtypes = []
+    lib.puyo_capi_version.restype = ctypes.c_int32
+
+    lib.puyo_step.argtypes = [
+        ctypes.c_void_p, ctypes.c_void_p,
+        ctypes.c_int32, ctypes.c_int32, ctypes.c_int32, ctypes.c_int32,
+        _I32_PTR, _I32_PTR,
+    ]
+    lib.puyo_step.restype = ctypes.c_int32
+
+    lib.puyo_step_batch.argtypes = [ctypes.c_int32] + [ctypes.c_void_p] * 9
+    lib.puyo_step_batch.restype = ctypes.c_int32
+
+    # ビームサーチは CAPI バージョン3から（古いビルドには無い）
+    if hasattr(lib, 'puyo_beam_search'):
+        lib.puyo_beam_search.argtypes = [ctypes.c_void_p, ctypes.c_int32] + [ctypes.c_void_p] * 3 + \
+            [ctypes.c_int32, ctypes.c_int32, ctypes.c_void_p]
+        lib.puyo_beam_search.restype = ctypes.c_int32
+
+    return lib
+
+
+class NativeSimulator:
+    """
+    共有ライブラリを使うシミュレータバックエンド（simulator_backend の step と同じ形）
+    1手あたり関数呼び出し1回で済み、ファイルもプロセス間通信も使わない。
+    """
+    def __init__(self, library_path=None):
+        self.lib = load_library(library_path)
+        self.simulator_path = self.lib._name
+        self._score = ctypes.c_int32()
+        self._chain = ctypes.c_int32()
+        self._score_ref = ctypes.byref(self._score)
+        self._chain_ref = ctypes.byref(self._chain)
+        # 出力用バッファ（アドレス取得のコストを毎回払わないよう使い回す）
+        self._out = np.empty((BOARD_HEIGHT, BOARD_WIDTH), dtype=np.int8)
+        self._out_addr = _address(self._out)
+
+    def step(self, board, x, r, pair, out=None):
+        """
+        1手進める
+
+        引数:
+            board: (14, 6) int8 の盤面（C連続ならそのまま渡す。そうでなければここで1回だけ変換）
+            out: 結果を書き込む (14, 6) int8 のC連続配列（Noneなら新しい配列で返す）
+
+        返り値:
+            (next_board, score, chain_count)、引数エラー時は None
+        """
+        if board.dtype != np.int8 or not board.flags.c_contiguous:
+            board = np.ascontiguousarray(board, dtype=np.int8)
+
+        ret = self.lib.puyo_step(
+            _address(board), self._out_addr, x, r, pair[0], pair[1],
+            self._score_ref, self._chain_ref
+        )
+        if ret < 0:
+            print(f"[ERROR] Native step rejected: x={x}, r={r}, pair={pair}", flush=True)
+            return None
+
+        if out is None:
+            out = self._out.copy()
+        else:
+            out[...] = self._out
+        return out, self._score.value, self._chain.value
+
+    def step_batch(self, boards, xs, rs, pairs, out=None):
+        """
+        n盤面をまとめて1手ずつ進める（C++側でループするので呼び出しは1回）
+
+        引数:
+            boards: (n, 14, 6) int8
+            xs, rs: (n,) の列・回転
+            pairs: (n, 2) のぷよペア
+            out: 結果を書き込む (n, 14, 6) int8 のC連続配列（Noneなら新規確保）
+
+        返り値:
+            (next_boards, scores, chains, game_overs) すべて配列
+            game_overs は 1=ゲームオーバー, 0=継続, -1=引数エラー（盤面はそのまま）
+        """
+        boards = np.ascontiguousarray(boards, dtype=np.int8)
+        n = boards.shape[0]
+        xs = np.ascontiguousarray(xs, dtype=np.int32)
+        rs = np.ascontiguousarray(rs, dtype=np.int32)
+        pairs = np.asarray(pairs, dtype=np.int32)
+        c1s = np.ascontiguousarray(pairs[:, 0])
+        c2s = np.ascontiguousarray(pairs[:, 1])
+        if out is None:
+            out = np.empty_like(boards)
+        scores = np.empty(n, dtype=np.int32)
+        chains = np.empty(n, dtype=np.int32)
+        game_overs = np.empty(n, dtype=np.int32)
+
+        self.lib.puyo_step_batch(
+            n, _address(boards), _address(out), _address(xs), _address(rs),
+            _address(c1s), _address(c2s), _address(scores), _address(chains), _address(game_overs)
+        )
+        return out, scores, chains, game_overs
+
+    def close(self):
+        pass
@@ -0,0 +1,148 @@
+"""
+ビットプレーンで持つ軽量な盤面（Zobristハッシュつき）
+
+puyo_engine と同じく FieldBit の配置（列xが bit [16x, 16x+16)、段yがその中のbit y）で、
+色ごと（赤・緑・青・黄・おじゃま）に96bitのintを1つずつ持つ。
+ndarray の (14, 6) 盤面と違い、ハッシュは盤面を作るときに差分だけ更新するので O(1) で取れる。
+
+    board = PackedBoard.from_array(ndarray_board)
+    next_board, score, chain, game_over = board.step(x, r, pair)
+    hash(next_board)            # Zobristハッシュ（再計算なし）
+    next_board.to_array()       # (14, 6) int8 に戻す
+    next_board.to_bytes()       # 60バイト（リプレイ保存用）
+    zobrist_of_array(ndarray_board) == board.zobrist   # ndarray のままでも同じハッシュ
+
+14段目は C++ の Field と同じく持たない（設置でもおじゃまでも14段目には積まれない）。
+"""
+import numpy as np
+
+import puyo_engine
+
+
+NUM_PLANES = len(puyo_engine.CELL_VALUES)
+_PLANE_BYTES = 2 * puyo_engine.BOARD_WIDTH
+PACKED_BYTES = NUM_PLANES * _PLANE_BYTES
+
+# (プレーン, bit) → 64bit乱数（シード固定なのでプロセス間でも同じハッシュになる）
+ZOBRIST_SEED = 20240206
+ZOBRIST = [
+    [int(v) for v in row]
+    for row in np.random.default_rng(ZOBRIST_SEED).integers(
+        0, 2 ** 63, size=(NUM_PLANES, 16 * puyo_engine.BOARD_WIDTH), dtype=np.uint64
+    )
+]
+
+
+# (盤面の値, 段, 列) → 64bit乱数（ZOBRIST と同じ値。ぷよでない値と14段目は0）
+_ZOBRIST_CELLS = np.zeros((256, puyo_engine.BOARD_HEIGHT, puyo_engine.BOARD_WIDTH), dtype=np.uint64)
+for _plane, _value in enumerate(puyo_engine.CELL_VALUES):
+    for _x in range(puyo_engine.BOARD_WIDTH):
+        for _y in range(puyo_engine.FIELD_HEIGHT):
+            _ZOBRIST_CELLS[_value, _y, _x] = ZOBRIST[_plane][16 * _x + _y]
+_ZOBRIST_CELLS = _ZOBRIST_CELLS.reshape(256, -1)
+_IS_PUYO = np.zeros(256, dtype=bool)
+_IS_PUYO[list(puyo_engine.CELL_VALUES)] = True
+_CELL_INDEX = np.arange(puyo_engine.BOARD_HEIGHT * puyo_engine.BOARD_WIDTH)
+
+
+def zobrist_of(planes):
+    """ビットプレーン全体のZobristハッシュ（from_array 等で1回だけ使う）"""
+    return _zobrist_diff(0, [0] * NUM_PLANES, planes)
+
+
+def zobrist_of_array(board):
+    """
+    (14, 6) の盤面のZobristハッシュ（PackedBoard.from_array(board).zobrist と同じ値）
+    下から隙間なく積まれた盤面は表引きのXORだけで求め、宙に浮いたぷよや14段目があれば詰めてから求める
+    """
+    cells = np.asarray(board).astype(np.uint8, copy=False).ravel()
+    filled = _IS_PUYO[cells].reshape(puyo_engine.BOARD_HEIGHT, puyo_engine.BOARD_WIDTH)
+    if filled[puyo_engine.FIELD_HEIGHT:].any() or (filled[1:] > filled[:-1]).any():
+        return zobrist_of(puyo_engine.from_array(board))
+    return int(np.bitwise_xor.reduce(_ZOBRIST_CELLS[cells, _CELL_INDEX]))
+
+
+def _zobrist_diff(h, old_planes, new_planes):
+    """変化したbitのぶんだけハッシュを更新する"""
+    for table, old, new in zip(ZOBRIST, old_planes, new_planes):
+        changed = old ^ new
+        while changed:
+            lsb = changed & -changed
+            h ^= table[lsb.bit_length() - 1]
+            changed ^= lsb
+    return h
+
+
+class PackedBoard:
+    """
+    1盤面 = 5個のint（ビットプレーン）＋ Zobristハッシュ
+
+    イミュータブル。step() / add_garbage() は新しい PackedBoard を返す。
+    同じ盤面なら同じハッシュになり、dictのキーやMCTSのノードIDにそのまま使える。
+    """
+    __slots__ = ('planes', 'zobrist')
+
+    def __init__(self, planes, zobrist=None):
+        self.planes = tuple(planes)
+        self.zobrist = zobrist_of(self.planes) if zobrist is None else zobrist
+
+    # ========== 変換 ==========
+
+    @classmethod
+    def from_array(cls, board):
+        """(14, 6) の盤面から作る（宙に浮いたぷよは puyo_engine.from_array と同じく詰める）"""
+        return cls(puyo_engine.from_array(board))
+
+    def to_array(self):
+        """(14, 6) int8 の盤面に戻す"""
+        return puyo_engine.to_array(self.planes)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """to_bytes() の逆"""
+        return cls(
+            int.from_bytes(data[i:i + _PLANE_BYTES], 'little')
+            for i in range(0, PACKED_BYTES, _PLANE_BYTES)
+        )
+
+    def to_bytes(self):
+        """プレーンを並べた固定長（60バイト）のバイト列"""
+        return b''.join(plane.to_bytes(_PLANE_BYTES, 'little') for plane in self.planes)
+
+    # ========== 盤面操作 ==========
+
+    def heights(self):
+        """各列の高さ（_get_column_height と同じ定義）"""
+        return puyo_engine.column_heights(self.planes)
+
+    def step(self, x, r, pair):
+        """
+        ペアを置いて連鎖を最後まで進める（puyo_engine.step と同じ処理）
+
+        返り値:
+            (next_board, score, chain_count, game_over)
+        """
+        planes = list(self.planes)
+        puyo_engine.drop_pair(planes, x, r, pair)
+        chain_count, score = puyo_engine.get_score(puyo_engine.pop(planes))
+        game_over = max(puyo_engine.column_heights(planes)) > 12
+        next_board = PackedBoard(planes, _zobrist_diff(self.zobrist, self.planes, planes))
+        return next_board, score, chain_count, game_over
+
+    def add_garbage(self, columns):
+        """指定した列におじゃまを1個ずつ落とす（13段目まで埋まっている列には落ちない）"""
+        planes = list(self.planes)
+        for col in columns:
+            puyo_engine.drop_puyo(planes, int(col), puyo_engine.GARBAGE)
+        return PackedBoard(planes, _zobrist_diff(self.zobrist, self.planes, planes))
+
+    # ========== ハッシュ・比較 ==========
+
+    def __hash__(self):
+        return self.zobrist
+
+    def __eq__(self, other):
+        return isinstance(other, PackedBoard) and self.planes == other.planes
+
+    def __repr__(self):
+        return f"PackedBoard(zobrist={self.zobrist:#018x})"
@@ -7,6 +7,8 @@ import subprocess
 import json
 import os
 
+import puyo_engine
+
 class PuyoPuyoGame:
     def __init__(self):
         self.board_height = 14
@@ -170,12 +172,11 @@ class PuyoPuyoGame:
     
     def _simple_chain(self, board):
         """
-        簡易連鎖処理
-        4つ以上つながったぷよを消す
+        連鎖処理
+        4つ以上つながったぷよを消し、落下させて連鎖が止まるまで繰り返す
         
-        ⚠️ 注意:  実際のC++実装（field.cpp）とは異なる簡易版
-        正確な連鎖計算はC++側で行う
+        計算は puyo_engine（C++の field.cpp / chain.h と同じ処理）で行う。
+        この盤面は y=0 が最上段なので、上下を反転して渡す。
         """
-        # TODO: 本格的な連鎖処理（後で実装）
-        # 現状は簡易版のまま学習を進める
-        return board
\ No newline at end of file
+        next_board, _, _ = puyo_engine.resolve(np.flipud(board))
+        return np.flipud(next_board).astype(board.dtype)
\ No newline at end of file
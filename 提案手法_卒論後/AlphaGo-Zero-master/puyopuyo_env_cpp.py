@@ -2,30 +2,114 @@
 ぷよぷよ環境（シンプルなおじゃまスケジュール）
 """
 import numpy as np
-import subprocess
 import os
-import time 
+
+from lru_cache import LRUCache
+from puyo_state import PackedBoard, zobrist_of_array
+from simulator_backend import create_simulator
+
+
+def column_heights(boards):
+    """
+    (..., 14, 6) の盤面から各列の高さ（一番上のぷよの段+1）を返す
+    _get_column_height と同じ定義をnumpyでまとめて計算する
+    """
+    filled = boards != 0
+    height = boards.shape[-2]
+    top = height - np.argmax(filled[..., ::-1, :], axis=-2)
+    return np.where(filled.any(axis=-2), top, 0)
+
+
+def valid_moves_from_heights(heights):
+    """(..., 6) の列の高さから (..., 24) の有効手マスクを作る（get_valid_moves と同じ条件）"""
+    ok = heights <= 11
+    valid = np.zeros(heights.shape[:-1] + (24,), dtype=bool)
+    valid[..., 0:6] = ok                           # rotation=0
+    valid[..., 12:18] = ok                         # rotation=2
+    valid[..., 6:11] = ok[..., :5] & ok[..., 1:]   # rotation=1 (x=0..4)
+    valid[..., 19:24] = ok[..., 1:] & ok[..., :5]  # rotation=3 (x=1..5)
+    return valid
+
+
+# 各列が「高さ11以下か」の6bit → 有効手マスク (64, 24)
+VALID_MOVES_TABLE = valid_moves_from_heights(
+    np.where((np.arange(64)[:, None] >> np.arange(6)) & 1, 0, 12)
+)
+VALID_MOVES_TABLE.flags.writeable = False
+_COLUMN_BITS = 1 << np.arange(6)
+
+# 次に来るペアの全パターン（色1..4の順序つき16通り。next_state の乱数と同じく等確率）
+PAIR_OUTCOMES = tuple((c1, c2) for c1 in range(1, 5) for c2 in range(1, 5))
+PAIR_PROBS = np.full(len(PAIR_OUTCOMES), 1.0 / len(PAIR_OUTCOMES))
+PAIR_PROBS.flags.writeable = False
+
+
+class BoardInfo:
+    """
+    盤面から導出する情報（列の高さ・有効手マスク・ゲームオーバー）
+    1盤面につき1回だけnumpyで計算し、PuyoPuyoGame.board_info がハッシュでメモ化する。
+    配列は共有されるので読み取り専用。
+    """
+    __slots__ = ('heights', 'valid_moves', 'game_over')
+
+    def __init__(self, board):
+        heights = column_heights(board)
+        heights.flags.writeable = False
+        self.heights = heights
+        self.valid_moves = VALID_MOVES_TABLE[int(_COLUMN_BITS[heights <= 11].sum())]
+        self.game_over = bool(heights[2] >= 12)
+
+
+class TransitionCache(LRUCache):
+    """
+    シミュレータ1手分の結果キャッシュ
+    (盤面のハッシュ, 行動, ペア) → (次の盤面, スコア, 連鎖数)
+
+    おじゃま処理の前の結果だけを入れるので、実際の手でも読み書きしてよい。
+    上限はメモリ量（MB）で指定し、1エントリあたりの概算サイズからエントリ数に直す。
+    """
+    ENTRY_BYTES = 640   # キー(bytes+tuple) + 盤面ndarray + OrderedDictのノードの実測値くらい
+
+    def __init__(self, max_mb=64):
+        super().__init__(int(max_mb * 1024 * 1024) // self.ENTRY_BYTES)
+
+    @staticmethod
+    def make_key(board_hash, action, pair):
+        """board_hash は PuyoPuyoGame.hash（ndarray でも PackedBoard でも同じ盤面なら同じ値）"""
+        return (board_hash, int(action), int(pair[0]), int(pair[1]))
+
 
 class PuyoPuyoGame: 
-    def __init__(self):
+    def __init__(self, backend='subprocess', simulator_path=None, transition_cache_mb=64, board_info_cache_size=100000,
+                 simulator_kwargs=None):
+        """
+        引数:
+            backend: シミュレータの呼び出し方式
+                'subprocess' … 1手ごとにexeを起動（従来方式）
+                'server'     … exeを常駐させてバイナリでやり取り（ワーカーごとに1プロセス）
+                'native'     … 共有ライブラリ puyo_capi を ctypes で直接呼ぶ（プロセス内）
+                'python'     … Python版エンジン puyo_engine（C++不要）
+            simulator_path: puyop_simulator.exe（'native'なら puyo_capi）のパス（Noneなら既定パス）
+            transition_cache_mb: 1手分の結果キャッシュの上限（MB）。0なら使わない
+            board_info_cache_size: BoardInfo（高さ・有効手・ゲームオーバー）をメモ化する盤面数
+            simulator_kwargs: バックエンドに渡す追加の引数（'subprocess' の temp_dir など）
+        """
         self.board_height = 14
         self.board_width = 6
         self.num_actions = 24
         self.starting_board = np.zeros((self.board_height, self.board_width), dtype=np.int8)
+        self.pair_outcomes = PAIR_OUTCOMES
+        self.pair_probs = PAIR_PROBS
         
-        self.simulator_path = r"C:\Users\h.okada\OneDrive - NITech\ドキュメント\研究室\ama\提案手法\Alpha-ojyama\bin\puyop\puyop_simulator.exe"
-        self.temp_dir = "C:/temp/puyo_sim"
-        
-        if os.path.exists(self.temp_dir):
-            import shutil
-            shutil.rmtree(self.temp_dir)
-        os.makedirs(self.temp_dir, exist_ok=True)
-        
-        if not os.path.exists(self.simulator_path):
-            raise FileNotFoundError(f"Simulator not found:   {self.simulator_path}")
+        self.backend = backend
+        self.simulator = create_simulator(backend, simulator_path, **(simulator_kwargs or {}))
+        self.simulator_path = self.simulator.simulator_path
+        self.transition_cache = TransitionCache(transition_cache_mb) if transition_cache_mb > 0 else None
+        self.board_info_cache = LRUCache(board_info_cache_size)
+        self.hash_cache = LRUCache(board_info_cache_size)   # ndarray の盤面のバイト列 → Zobristハッシュ
         
         print(f"[INFO] C++ Simulator:   {self.simulator_path}")
-        print(f"[INFO] Simulator found")
+        print(f"[INFO] Simulator found (backend={self.backend})")
         
         self.garbage_schedule = []
         self.move_count = 0
@@ -70,150 +154,134 @@ class PuyoPuyoGame:
         return False, 0
     
     def hash(self, board):
-        return hash(board.tobytes())
+        """
+        盤面のZobristハッシュ（PackedBoard ならそのまま、ndarray なら表引きで求める）
+        同じ盤面なら ndarray でも PackedBoard でも同じ値になる
+        """
+        if isinstance(board, PackedBoard):
+            return board.zobrist
+        key = board.tobytes()
+        h = self.hash_cache.get(key)
+        if h is None:
+            h = zobrist_of_array(board)
+            self.hash_cache.put(key, h)
+        return h
     
     def reset(self):
         """エピソード開始"""
         self.reset_garbage_schedule()
         return self.starting_board.copy()
     
+    def board_info(self, board):
+        """
+        盤面の BoardInfo（盤面のバイト列でメモ化。PackedBoard も渡せる）
+
+        Zobristハッシュは宙に浮いたぷよを詰め、14段目を無視するので、キーには使わない。
+        """
+        if isinstance(board, PackedBoard):
+            board = board.to_array()
+        key = board.tobytes()
+        info = self.board_info_cache.get(key)
+        if info is None:
+            info = BoardInfo(board)
+            self.board_info_cache.put(key, info)
+        return info
+    
     def get_valid_moves(self, board):
-        valid = np.zeros(self.num_actions, dtype=bool)
-        for x in range(6):
-            height = self._get_column_height(board, x)
-            # タテ置き
-            if height <= 11: 
-                valid[x + 0 * 6] = True     # rotation=0
-                valid[x + 2 * 6] = True     # rotation=2
-            # ヨコ置き（右回転：左側が下）
-            if x < 5:
-                right_height = self._get_column_height(board, x + 1)
-                if height <= 11 and right_height <= 11:
-                    valid[x + 1 * 6] = True  # rotation=1 (右回転)
-            # ヨコ置き（左回転：右側が下）
-            if x > 0:
-                left_height = self._get_column_height(board, x - 1)
-                if height <= 11 and left_height <= 11:
-                    valid[x + 3 * 6] = True  # rotation=3 (左回転)
-        # 物理的にはみ出す手を「絶対無効」に
-        valid[0 + 3 * 6] = False  # x=0, rotation=3（左端＋左回転）
-        valid[5 + 1 * 6] = False  # x=5, rotation=1（右端＋右回転）
-        return valid
+        """有効手マスク（読み取り専用。書き換えるならコピーする）"""
+        return self.board_info(board).valid_moves
     
     def next_state(self, board, action, player=1, current_pair=None, is_simulation=False):
         """
         次の状態を計算
         
+        board は ndarray でも PackedBoard でもよい（返す盤面は ndarray）
+        
         Returns:
             next_board, player, score, chains, garbage_columns
         """
-        x = action % 6
-        r = action // 6
-        
+        if isinstance(board, PackedBoard):
+            board = board.to_array()
         if current_pair is None:
             current_pair = (np.random.randint(1, 5), np.random.randint(1, 5))
         
-        pid = os.getpid()
-        timestamp = int(time.time() * 1000000) + np.random.randint(0, 99999)
-        
-        input_file = os.path.join(self.temp_dir, f"input_{pid}_{timestamp}.txt")
-        output_field_file = os.path.join(self.temp_dir, f"output_field_{pid}_{timestamp}.txt")
-        output_result_file = os.path.join(self.temp_dir, f"output_result_{pid}_{timestamp}.txt")
-        
-        for f in [input_file, output_field_file, output_result_file]:
-            if os.path.exists(f):
-                os.remove(f)
-        
-        np.savetxt(input_file, board, fmt='%d', delimiter=',')
-        
-        cmd = [
-            self.simulator_path,
-            input_file,
-            str(x),
-            str(r),
-            str(current_pair[0]),
-            str(current_pair[1]),
-            output_field_file,
-            output_result_file
-        ]
-        
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, timeout=5)
-        except Exception as e:
-            print(f"[ERROR] Simulator failed: {e}", flush=True)
+        result = self._step(board, action, current_pair)
+        if result is None:
             return board, 1, 0, 0, []
+        next_board, score, chain_count = result
         
-        max_wait = 100
-        wait_count = 0
-        while not os.path.exists(output_result_file) and wait_count < max_wait:
-            time.sleep(0.01)
-            wait_count += 1
+        # 1. ぷよ設置後に即ゲームオーバーかチェック
+        info = self.board_info(next_board)
+        if info.game_over:
+            # ゲームオーバーならおじゃまぷよ処理せず、即return
+            # garbage_columnsは空で返す
+            return next_board, 1, score, chain_count, []
         
-        if not os.path.exists(output_result_file):
-            print(f"[ERROR] Result file not created", flush=True)
-            return board, 1, 0, 0, []
+        # 2. ゲームオーバーでなければ、おじゃまぷよ処理を通常通り行う
+        garbage_columns = []
         
-        try:
-            next_board = np.loadtxt(output_field_file, delimiter=',', dtype=np.int8)
-            
-            with open(output_result_file, 'r') as f:
-                lines = f.readlines()
-                score = int(lines[0].strip())
-                chain_count = int(lines[1].strip())
-
-            # 1. ぷよ設置後に即ゲームオーバーかチェック
-            center_height = self._get_column_height(next_board, 2)
-            if center_height >= 12:
-                # ゲームオーバーならおじゃまぷよ処理せず、即return
-                try:
-                    os.remove(input_file)
-                    os.remove(output_field_file)
-                    os.remove(output_result_file)
-                except:
-                    pass
-                # garbage_columnsは空で返す
-                return next_board, 1, score, chain_count, []
-            
-            # 2. ゲームオーバーでなければ、おじゃまぷよ処理を通常通り行う
-            garbage_columns = []
+        if not is_simulation:
+            # "設置またはおじゃま降下"ごとにmove_count++にする必要あり
+            self.move_count += 1
             
-            if not is_simulation:
-                # "設置またはおじゃま降下"ごとにmove_count++にする必要あり
-                self.move_count += 1
+            should_drop, garbage_count = self.should_drop_garbage()
+            if should_drop:
+                # 異なる列をランダムに選択
+                # garbageをここで降下させる
+                available_cols = list(range(6))
+                np.random.shuffle(available_cols)
                 
-                should_drop, garbage_count = self.should_drop_garbage()
-                if should_drop:
-                    # 異なる列をランダムに選択
-                    # garbageをここで降下させる
-                    available_cols = list(range(6))
-                    np.random.shuffle(available_cols)
-                    
-                    selected_cols = available_cols[:min(garbage_count, 6)]
-                    
-                    for col in selected_cols:
-                        height = self._get_column_height(next_board, col)
-                        if height < 13:
-                            next_board[height, col] = 6
-                            garbage_columns.append(col)
-                    
-                    # ⭐ move_count管理を全て「加算後」に
-                    self.move_count += 1  # 「おじゃまが降りる」ごとにも +1
-                    # 最新のmove_countでdue_move==move_countなら削除
-                    self.garbage_schedule = [s for s in self.garbage_schedule if s['due_move'] != self.move_count]
-                    # スケジューリングも今進んだmove_count基準に
-                    self.schedule_next_garbage()
-            
-            try:
-                os.remove(input_file)
-                os.remove(output_field_file)
-                os.remove(output_result_file)
-            except:
-                pass
-
-            return next_board, 1, score, chain_count, garbage_columns
-        except Exception as e:
-            print(f"[ERROR] Failed to read result:  {e}", flush=True)
-            return board, 1, 0, 0, []
+                selected_cols = available_cols[:min(garbage_count, 6)]
+                
+                # 列はすべて異なるので、降らせる前の高さをそのまま使える
+                for col in selected_cols:
+                    height = info.heights[col]
+                    if height < 13:
+                        next_board[height, col] = 6
+                        garbage_columns.append(col)
+                
+                # ⭐ move_count管理を全て「加算後」に
+                self.move_count += 1  # 「おじゃまが降りる」ごとにも +1
+                # 最新のmove_countでdue_move==move_countなら削除
+                self.garbage_schedule = [s for s in self.garbage_schedule if s['due_move'] != self.move_count]
+                # スケジューリングも今進んだmove_count基準に
+                self.schedule_next_garbage()
+        
+        return next_board, 1, score, chain_count, garbage_columns
+
+    def _step(self, board, action, pair):
+        """
+        おじゃま処理前の1手（シミュレータ呼び出し）
+        キャッシュがあればそこから返す。返す盤面は毎回新しい配列（書き換えてよい）
+        """
+        cache = self.transition_cache
+        if cache is not None:
+            key = TransitionCache.make_key(self.hash(board), action, pair)
+            cached = cache.get(key)
+            if cached is not None:
+                next_board, score, chain_count = cached
+                return next_board.copy(), score, chain_count
+
+        result = self.simulator.step(board, action % 6, action // 6, pair)
+        if result is None:
+            return None
+
+        if cache is not None:
+            next_board, score, chain_count = result
+            stored = next_board.copy()
+            stored.flags.writeable = False
+            cache.put(key, (stored, score, chain_count))
+        return result
+    
+    def cache_stats(self):
+        """遷移キャッシュのヒット・ミス数（キャッシュなしならNone）"""
+        if self.transition_cache is None:
+            return None
+        return self.transition_cache.stats()
+    
+    def reset_cache_stats(self):
+        if self.transition_cache is not None:
+            self.transition_cache.reset_stats()
     
     def reward(self, board, last_garbage_cols=None, placed_positions=None):
         """
@@ -221,8 +289,7 @@ class PuyoPuyoGame:
         Returns:
             - Tuple: (終局か, 自爆か, おじゃまか, 手数)
         """
-        center_height = self._get_column_height(board, 2)
-        if center_height >= 12:
+        if self.board_info(board).game_over:
             # おじゃま原因
             garbage_place = bool(last_garbage_cols and 2 in last_garbage_cols)
             # そのターンx=2, y>=11に設置した場合、自分設置扱い
@@ -242,8 +309,7 @@ class PuyoPuyoGame:
         """
         MCTS用：数値だけ返す（従来通りゲームオーバーで-1/継続で-999）
         """
-        center_height = self._get_column_height(board, 2)
-        if center_height >= 12:
+        if self.board_info(board).game_over:
             return -1
         return -999
     
@@ -274,7 +340,126 @@ class PuyoPuyoGame:
     
     def _get_column_height(self, board, x):
         """列の高さを計算"""
-        for y in range(self.board_height - 1, -1, -1):
-            if board[y, x] != 0:
-                return y + 1
-        return 0
\ No newline at end of file
+        return int(self.board_info(board).heights[x])
+
+# ========== 複数盤面の一括版 ==========
+
+class VecPuyoGame:
+    """
+    N個のぷよぷよ盤面をまとめて進める環境
+
+    盤面は (N, 14, 6) int8 の1つの配列で持ち、
+    おじゃまスケジュールと手数カウントは盤面ごとに持つ（ルールは PuyoPuyoGame と同じ）。
+    step() に N個の行動とペアを渡すと、全盤面を1回で進めて結果を配列で返す。
+    backend は PuyoPuyoGame と同じ名前（'native' なら C++ 側で一括、それ以外は盤面ごとに step）。
+    """
+    def __init__(self, num_envs, backend='python', simulator_path=None):
+        self.num_envs = num_envs
+        self.board_height = 14
+        self.board_width = 6
+        self.num_actions = 24
+
+        self.backend = backend
+        self.simulator = create_simulator(backend, simulator_path)
+
+        self.boards = np.zeros((num_envs, self.board_height, self.board_width), dtype=np.int8)
+        self.move_counts = np.zeros(num_envs, dtype=np.int64)
+        self.garbage_schedules = [[] for _ in range(num_envs)]
+        self.last_garbage = np.zeros((num_envs, self.board_width), dtype=bool)
+
+    def reset(self, env_ids=None):
+        """指定した盤面（Noneなら全部）を空にしておじゃまスケジュールを初期化"""
+        if env_ids is None:
+            env_ids = range(self.num_envs)
+        for i in env_ids:
+            self.boards[i] = 0
+            self.move_counts[i] = 0
+            self.last_garbage[i] = False
+            self.garbage_schedules[i] = [{
+                'due_move': np.random.randint(3, 6),
+                'count': np.random.randint(1, 4)
+            }]
+        return self.boards
+
+    def get_valid_moves(self, boards=None):
+        """(N, 24) の有効手マスク"""
+        if boards is None:
+            boards = self.boards
+        return valid_moves_from_heights(column_heights(boards))
+
+    def random_pairs(self, n=None):
+        """(n, 2) のランダムなぷよペア"""
+        if n is None:
+            n = self.num_envs
+        return np.random.randint(1, 5, size=(n, 2))
+
+    def step(self, actions, pairs=None, is_simulation=False):
+        """
+        全盤面を1手ずつ進める
+
+        引数:
+            actions: (N,) 行動ID
+            pairs: (N, 2) ぷよペア（Noneならランダム）
+            is_simulation: Trueならおじゃま処理と手数カウントをしない
+
+        返り値:
+            next_boards (N, 14, 6), scores (N,), chains (N,), game_over (N,), valid_moves (N, 24)
+            （おじゃまが降った列は self.last_garbage (N, 6) に入る）
+        """
+        actions = np.asarray(actions)
+        if pairs is None:
+            pairs = self.random_pairs(len(actions))
+        xs = actions % 6
+        rs = actions // 6
+
+        if hasattr(self.simulator, 'step_batch'):
+            next_boards, scores, chains, _ = self.simulator.step_batch(self.boards, xs, rs, pairs)
+        else:
+            next_boards = np.empty_like(self.boards)
+            scores = np.zeros(self.num_envs, dtype=np.int32)
+            chains = np.zeros(self.num_envs, dtype=np.int32)
+            for i, (x, r, pair) in enumerate(zip(xs.tolist(), rs.tolist(), np.asarray(pairs).tolist())):
+                result = self.simulator.step(self.boards[i], x, r, pair)
+                if result is None:
+                    next_boards[i] = self.boards[i]
+                else:
+                    next_boards[i], scores[i], chains[i] = result
+
+        self.last_garbage[:] = False
+        if not is_simulation:
+            heights = column_heights(next_boards)
+            alive = np.flatnonzero(heights[:, 2] < 12)
+            self.move_counts[alive] += 1
+            for i in alive:
+                self._drop_scheduled_garbage(i, next_boards[i], heights[i])
+
+        self.boards = next_boards
+        heights = column_heights(next_boards)
+        game_over = heights[:, 2] >= 12
+        return next_boards, scores, chains, game_over, valid_moves_from_heights(heights)
+
+    def _drop_scheduled_garbage(self, i, board, heights):
+        """PuyoPuyoGame.next_state のおじゃま処理を盤面iについて行う"""
+        schedule = self.garbage_schedules[i]
+        due = [s['count'] for s in schedule if s['due_move'] == self.move_counts[i]]
+        if not due:
+            return
+
+        available_cols = list(range(6))
+        np.random.shuffle(available_cols)
+        for col in available_cols[:min(due[0], 6)]:
+            if heights[col] < 13:
+                board[heights[col], col] = 6
+                self.last_garbage[i, col] = True
+
+        self.move_counts[i] += 1
+        move_count = self.move_counts[i]
+        schedule = [s for s in schedule if s['due_move'] != move_count]
+
+        next_due = move_count + np.random.randint(3, 6)
+        if next_due < 100 and all(s['due_move'] != next_due for s in schedule):
+            schedule.append({
+                'due_move': next_due,
+                'count': np.random.randint(1, 4)
+            })
+        self.garbage_schedules[i] = schedule
@@ -0,0 +1,173 @@
+"""
+イテレーションをまたいで学習データを持つリプレイバッファ（NumPy の memmap ファイル）
+
+列ごとに .npy ファイルを1つずつ持ち、capacity 行のリングバッファとして古い行から上書きする:
+    boards.npy      (capacity, 14, 6) int8
+    policies.npy    (capacity, 24)    float16
+    values.npy      (capacity,)       float32
+    iterations.npy  (capacity,)       int32   そのデータを作ったイテレーション
+    versions.npy    (capacity,)       int32   そのデータを作ったモデルのバージョン
+    meta.json       書き込み位置と行数（追加のたびに更新）
+
+同じディレクトリを開き直せば続きから使える（main.py を再起動しても消えない）。
+学習に使うのは直近 window_iterations イテレーション分（かつ最大 capacity 行）だけ。
+窓は行がイテレーション順に並んでいることを前提にするので、add の iteration は減らせない
+（開き直したら last_iteration より後の番号から続ける）。
+
+    buffer = ReplayBuffer('./models/replay', capacity=200000, window_iterations=20)
+    buffer.add(examples, iteration=3, version=2)        # examples: [(盤面, 方策, 価値), ...]
+    boards, policies, values = buffer.sample(32)      # 窓の中から一様に
+"""
+import json
+import os
+
+import numpy as np
+
+
+_COLUMNS = ('boards', 'policies', 'values', 'iterations', 'versions')
+
+
+class ReplayBuffer:
+    """
+    引数:
+        path: ファイルを置くディレクトリ（無ければ作る。既にあれば開き直す）
+        capacity: 持つ行数の上限（超えたら古い行から上書き）
+        window_iterations: 学習に使う直近のイテレーション数（None なら capacity 行すべて）
+        board_height, board_width, num_actions: 盤面と方策の形
+        seed: sample の乱数シード
+    """
+    def __init__(self, path, capacity=200000, window_iterations=20,
+                 board_height=14, board_width=6, num_actions=24, seed=None):
+        self.path = path
+        self.capacity = capacity
+        self.window_iterations = window_iterations
+        self.rng = np.random.default_rng(seed)
+        os.makedirs(path, exist_ok=True)
+
+        shapes = {
+            'boards': ((capacity, board_height, board_width), np.int8),
+            'policies': ((capacity, num_actions), np.float16),
+            'values': ((capacity,), np.float32),
+            'iterations': ((capacity,), np.int32),
+            'versions': ((capacity,), np.int32),
+        }
+        meta = self._read_meta()
+        if meta is not None and meta['capacity'] != capacity:
+            raise ValueError(f"Replay buffer at {path} has capacity {meta['capacity']}, not {capacity}")
+        self.head = meta['head'] if meta is not None else 0     # 次に書く行
+        self.size = meta['size'] if meta is not None else 0     # 書いた行数（最大 capacity）
+
+        mode = 'r+' if meta is not None else 'w+'
+        for name in _COLUMNS:
+            shape, dtype = shapes[name]
+            column = np.lib.format.open_memmap(os.path.join(path, f'{name}.npy'), mode=mode, dtype=dtype, shape=shape)
+            if column.shape != shape or column.dtype != dtype:
+                raise ValueError(f"Replay buffer column {name} is {column.dtype}{column.shape}, expected {np.dtype(dtype)}{shape}")
+            setattr(self, name, column)
+        self._window = self._count_window()
+        if meta is not None:
+            print(f"[INFO] Replay buffer reopened: {path} ({self.size}行, 窓 {self._window}行)", flush=True)
+
+    def _meta_path(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def _read_meta(self):
+        if not os.path.exists(self._meta_path()):
+            return None
+        with open(self._meta_path(), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_meta(self):
+        tmp_path = self._meta_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'capacity': self.capacity, 'head': self.head, 'size': self.size}, f)
+        os.replace(tmp_path, self._meta_path())
+
+    def _recent(self, count):
+        """直近 count 行の行番号（古い順）"""
+        return (self.head - count + np.arange(count)) % self.capacity
+
+    def _count_window(self):
+        """
+        直近 window_iterations イテレーション分の行数
+        行はイテレーション順に並ぶので、窓は末尾の連続した区間になる（境目を二分探索する）
+        """
+        if self.size == 0 or self.window_iterations is None:
+            return self.size
+        first = self.head - self.size
+        oldest = self.iterations[(self.head - 1) % self.capacity] - self.window_iterations + 1
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.iterations[(first + mid) % self.capacity] < oldest:
+                lo = mid + 1
+            else:
+                hi = mid
+        return self.size - lo
+
+    @property
+    def last_iteration(self):
+        """最後に足した行のイテレーション（空なら None）"""
+        if self.size == 0:
+            return None
+        return int(self.iterations[(self.head - 1) % self.capacity])
+
+    def add_arrays(self, boards, policies, values, iteration, version=0):
+        """配列のまま行を足す（capacity を超えた分は古い行から上書き）"""
+        n = len(boards)
+        if n == 0:
+            return
+        last = self.last_iteration
+        if last is not None and iteration < last:
+            raise ValueError(f"Replay buffer iterations must not decrease: got {iteration} after {last}")
+        if n > self.capacity:
+            boards, policies, values = boards[-self.capacity:], policies[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+        rows = (self.head + np.arange(n)) % self.capacity
+        self.boards[rows] = boards
+        self.policies[rows] = policies
+        self.values[rows] = values
+        self.iterations[rows] = iteration
+        self.versions[rows] = version
+        self.head = int((self.head + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+        self._window = self._count_window()
+        self.flush()
+
+    def add(self, examples, iteration, version=0):
+        """Solver の例 [(盤面, 方策, 価値), ...] を足す"""
+        if len(examples) == 0:
+            return
+        boards, policies, values = zip(*examples)
+        self.add_arrays(np.asarray(boards, dtype=np.int8), np.asarray(policies, dtype=np.float16),
+                        np.asarray(values, dtype=np.float32), iteration, version)
+
+    def sample(self, batch_size):
+        """窓の中から一様に batch_size 行取る（返り値: 盤面 int8, 方策 float32, 価値 float32）"""
+        if self._window == 0:
+            raise ValueError("Replay buffer is empty")
+        offsets = self.rng.integers(0, self._window, size=batch_size)
+        rows = (self.head - self._window + offsets) % self.capacity
+        return self.boards[rows], self.policies[rows].astype(np.float32), self.values[rows]
+
+    def recent_boards(self, count):
+        """直近 count 行の盤面（静的量子化のキャリブレーション用）"""
+        return np.array(self.boards[self._recent(min(count, self._window))])
+
+    def flush(self):
+        for name in _COLUMNS:
+            getattr(self, name).flush()
+        self._write_meta()
+
+    def __len__(self):
+        """学習に使う行数（窓の中の行数）"""
+        return self._window
+
+    def stats(self):
+        window = self._recent(self._window)
+        return {
+            'rows': self.size,
+            'window': self._window,
+            'oldest_iteration': int(self.iterations[window[0]]) if self._window else None,
+            'newest_iteration': int(self.iterations[window[-1]]) if self._window else None,
+        }
@@ -0,0 +1,249 @@
+"""
+自己対戦の並列化（複数プロセスで Solver.execute_episode を同時に回す）
+
+各ワーカープロセスは自分用の PuyoPuyoGame（シミュレータ）・一時ディレクトリ・乱数シードを持ち、
+torch の推論スレッドは1本にする（プロセス数ぶん並列にするので、スレッドを増やすと取り合いになる）。
+ワーカーはイテレーションをまたいで起動したままにし、学習後は重みだけを送り直す
+（新しい重みは、次にそのワーカーへ割り当てるエピソードと一緒に送る）。
+
+inference_server=True なら、ネットワークは推論サーバー（inference_server.py）の1プロセスだけが持ち、
+ワーカーはそのクライアントで推論する。新しい重みはサーバーだけに送り（update_weights）、
+ワーカーには次のエピソードと一緒にバージョンだけを送って評価キャッシュを捨てさせる。
+（サーバーの重みはすぐ替わるので、打っている途中のエピソードも残りの手は新しい重みで打つ）
+
+    pool = SelfPlayPool(game, net, num_workers=8, solver_kwargs={'num_sims': 120})
+    pool.load_weights(net, version=0)
+    episodes, cache_stats = pool.run(num_episodes=30)   # [(examples, result), ...]（エピソード番号順）
+    pool.close()
+
+止めずに回し続けるとき（actor_learner.py）:
+    pool.submit()                   # 空いているワーカー全部にエピソードを割り当てる
+    for record in pool.poll(timeout=0):
+        record['examples'], record['version']   # version はそのエピソードを打った重みのバージョン
+
+Solver(num_selfplay_workers=8) から使う（Solver.execute_episodes / Solver.selfplay_pool）。
+"""
+import copy
+import multiprocessing as mp
+import shutil
+import tempfile
+import traceback
+from multiprocessing.connection import wait
+
+import numpy as np
+import torch
+
+from inference_server import InferenceServer
+
+
+def _cpu_state_dict(net):
+    return {key: value.detach().cpu() for key, value in net.state_dict().items()}
+
+
+def _worker_loop(conn, index, seed, backend, simulator_path, net, solver_kwargs):
+    """ワーカープロセス本体: 重みの読み込みと1エピソード分の自己対戦を受け持つ"""
+    from puyopuyo_env_cpp import PuyoPuyoGame
+    from solver import Solver
+
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.set_num_threads(1)
+
+    # 'subprocess' バックエンドは一時ディレクトリを作り直すので、ワーカーごとに分ける
+    temp_dir = tempfile.mkdtemp(prefix=f'puyo_selfplay{index}_')
+    simulator_kwargs = {'temp_dir': temp_dir} if backend == 'subprocess' else None
+    game = PuyoPuyoGame(backend=backend, simulator_path=simulator_path, simulator_kwargs=simulator_kwargs)
+    solver = Solver(game=game, net=net, **solver_kwargs)
+    version = None
+
+    try:
+        while True:
+            try:
+                command, args = conn.recv()
+            except EOFError:
+                break
+            try:
+                if command == 'episode':
+                    episode, weights = args
+                    if weights is not None:
+                        # 推論サーバーを使うときは state_dict が None（評価キャッシュを捨てるだけ）
+                        state_dict, calibration, version = weights
+                        solver.load_weights(state_dict, calibration=calibration)
+                    examples, result = solver.execute_episode(net)
+                    conn.send(('ok', {
+                        'episode': episode,
+                        'examples': examples,
+                        'result': result,
+                        'version': version,
+                        'cache_stats': solver.eval_cache_stats(reset=True),
+                    }))
+                elif command == 'close':
+                    conn.send(('ok', None))
+                    break
+                else:
+                    conn.send(('error', f"Unknown command: {command}"))
+            except Exception:
+                conn.send(('error', traceback.format_exc()))
+    finally:
+        solver.close()
+        game.simulator.close()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class SelfPlayPool:
+    """
+    引数:
+        game: PuyoPuyoGame（ワーカーは同じ backend / simulator_path で自分用に作り直す）
+        net: ネットワーク（CPUにコピーしてワーカーへ送る。推論サーバーを使うならサーバーへ送る）
+        num_workers: ワーカープロセス数
+        seed: ワーカー i の乱数シードは seed + i（Noneなら毎回ランダム）
+        solver_kwargs: 各ワーカーの Solver に渡す引数（num_sims など。探索はワーカー内で1プロセス）
+        inference_server: 推論サーバーを立ててワーカーの推論をまとめる（重みはサーバーだけが持つ）
+        server_kwargs: InferenceServer に渡す引数（max_batch, max_wait_ms など）
+    """
+    def __init__(self, game, net, num_workers, seed=None, solver_kwargs=None, inference_server=False, server_kwargs=None):
+        self.num_workers = num_workers
+        self.weights_version = None
+        self._weights = None                           # (state_dict, calibration, version)。サーバーなら state_dict は None
+        self._published = 0                            # load_weights で重みが変わった回数
+        self._worker_published = [None] * num_workers  # ワーカーが持っている重み（_published の値）
+        self._busy = {}                                # ワーカー番号 → 実行中のエピソード番号
+        self._next_episode = 0
+
+        if seed is None:
+            seed = np.random.randint(0, 2 ** 31 - num_workers)
+        # デーモンプロセスは子プロセスを作れないので、ワーカー内の探索は1プロセスにする
+        solver_kwargs = dict(solver_kwargs or {}, num_search_workers=1)
+        self._server = None
+        if inference_server:
+            self._server = InferenceServer(net, num_workers, **(server_kwargs or {}))
+            worker_nets = [self._server.client(i) for i in range(num_workers)]
+        else:
+            worker_nets = [copy.deepcopy(net).cpu()] * num_workers
+
+        ctx = mp.get_context('spawn')
+        self._conns = []
+        self._procs = []
+        for i in range(num_workers):
+            parent_conn, child_conn = ctx.Pipe()
+            proc = ctx.Process(
+                target=_worker_loop,
+                args=(child_conn, i, seed + i, game.backend, game.simulator_path, worker_nets[i], solver_kwargs),
+                daemon=True,
+            )
+            proc.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._procs.append(proc)
+
+    def _receive(self, i):
+        status, result = self._conns[i].recv()
+        if status != 'ok':
+            raise RuntimeError(f"Self-play worker {i} failed:\n{result}")
+        return result
+
+    def load_weights(self, net, version=None, calibration=None, inference_kwargs=None):
+        """
+        新しい重みを登録する（各ワーカーには次に割り当てるエピソードと一緒に送り、評価キャッシュも捨てさせる）
+        推論サーバーを使うときは重みをサーバーへ送り（inference_kwargs は quantize など）、ワーカーにはバージョンだけ送る
+        version が前回と同じなら何もしない（None なら毎回新しい重みとして扱う）
+        """
+        if version is not None and version == self.weights_version:
+            return
+        if self._server is not None:
+            self._server.update_weights(net, inference_kwargs)
+            self._weights = (None, None, version)
+        else:
+            self._weights = (_cpu_state_dict(net), calibration, version)
+        self._published += 1
+        self.weights_version = version
+
+    def _dispatch(self, i, episode):
+        weights = self._weights if self._worker_published[i] != self._published else None
+        self._conns[i].send(('episode', (episode, weights)))
+        self._worker_published[i] = self._published
+        self._busy[i] = episode
+
+    def submit(self, on_start=None):
+        """空いているワーカー全部に次のエピソードを割り当てる（on_start(episode, worker) は進捗表示用）"""
+        for i in range(self.num_workers):
+            if i not in self._busy:
+                if on_start is not None:
+                    on_start(self._next_episode, i)
+                self._dispatch(i, self._next_episode)
+                self._next_episode += 1
+
+    def poll(self, timeout=None):
+        """
+        終わったエピソードを受け取る（timeout 秒待っても無ければ空のリスト。None ならどれか終わるまで待つ）
+        返り値: [{'episode', 'examples', 'result', 'version', 'cache_stats'}, ...]
+        """
+        if not self._busy:
+            return []
+        ready = wait([self._conns[i] for i in self._busy], timeout)
+        records = []
+        for i in [i for i in self._busy if self._conns[i] in ready]:
+            records.append(self._receive(i))
+            del self._busy[i]
+        return records
+
+    def run(self, num_episodes, on_start=None):
+        """
+        num_episodes 回の自己対戦を空いたワーカーに順に割り当てて回す
+
+        引数:
+            on_start: エピソードを割り当てるたびに on_start(episode, worker) を呼ぶ（進捗表示用）
+
+        返り値:
+            [(examples, result), ...]（エピソード番号順）と、全ワーカー合計の評価キャッシュの統計
+        """
+        episodes = [None] * num_episodes
+        cache_hits = 0
+        cache_evaluations = 0
+        next_episode = 0
+        while next_episode < num_episodes or self._busy:
+            for i in range(self.num_workers):
+                if next_episode < num_episodes and i not in self._busy:
+                    if on_start is not None:
+                        on_start(next_episode, i)
+                    self._dispatch(i, next_episode)
+                    next_episode += 1
+            for record in self.poll():
+                episodes[record['episode']] = (record['examples'], record['result'])
+                cache_hits += record['cache_stats']['hits']
+                cache_evaluations += record['cache_stats']['evaluations']
+        return episodes, {'hits': cache_hits, 'evaluations': cache_evaluations}
+
+    def server_stats(self):
+        """推論サーバーの統計（サーバーを使っていなければ None）"""
+        return self._server.stats() if self._server is not None else None
+
+    def close(self):
+        # 実行中のエピソードは終わるのを待って捨てる
+        for i in list(self._busy):
+            try:
+                self._conns[i].recv()
+            except (OSError, EOFError):
+                pass
+        self._busy = {}
+        for conn in self._conns:
+            try:
+                conn.send(('close', None))
+                conn.recv()
+            except (OSError, EOFError, BrokenPipeError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+        self._conns = []
+        self._procs = []
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,264 @@
+"""
+C++シミュレータ（puyop_simulator.exe）の呼び出しバックエンド
+
+PuyoPuyoGame.next_state から「ペア設置 → 連鎖」までの1手分だけを受け持つ。
+おじゃまぷよの処理はPython側（PuyoPuyoGame）で行う。
+
+各バックエンドは step(board, x, r, pair) を持ち、
+成功時は (next_board, score, chain_count)、失敗時は None を返す。
+"""
+import os
+import queue
+import struct
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+
+DEFAULT_SIMULATOR_PATH = r"C:\Users\h.okada\OneDrive - NITech\ドキュメント\研究室\ama\提案手法\Alpha-ojyama\bin\puyop\puyop_simulator.exe"
+
+BOARD_HEIGHT = 14
+BOARD_WIDTH = 6
+BOARD_SIZE = BOARD_HEIGHT * BOARD_WIDTH
+
+# main_simulator.cpp の Request / Reply と同じレイアウト
+REQUEST_SIZE = BOARD_SIZE + 4
+REPLY_SIZE = BOARD_SIZE + 12
+_REPLY_TAIL = struct.Struct('<iii')
+
+# 起動時の挨拶（main_simulator.cpp の SERVER_MAGIC / SERVER_PROTOCOL_VERSION と同じ）
+SERVER_MAGIC = b'PUYS'
+SERVER_PROTOCOL_VERSION = 1
+_HELLO = struct.Struct('<4si')
+
+
+class SubprocessSimulator:
+    """
+    1手ごとにシミュレータを起動する従来方式
+    （CSVを書いてexeを起動し、結果ファイルを読んで消す）
+    """
+    def __init__(self, simulator_path, temp_dir="C:/temp/puyo_sim"):
+        self.simulator_path = simulator_path
+        self.temp_dir = temp_dir
+
+        if os.path.exists(self.temp_dir):
+            import shutil
+            shutil.rmtree(self.temp_dir)
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def step(self, board, x, r, pair):
+        pid = os.getpid()
+        timestamp = int(time.time() * 1000000) + np.random.randint(0, 99999)
+
+        input_file = os.path.join(self.temp_dir, f"input_{pid}_{timestamp}.txt")
+        output_field_file = os.path.join(self.temp_dir, f"output_field_{pid}_{timestamp}.txt")
+        output_result_file = os.path.join(self.temp_dir, f"output_result_{pid}_{timestamp}.txt")
+
+        for f in [input_file, output_field_file, output_result_file]:
+            if os.path.exists(f):
+                os.remove(f)
+
+        np.savetxt(input_file, board, fmt='%d', delimiter=',')
+
+        cmd = [
+            self.simulator_path,
+            input_file,
+            str(x),
+            str(r),
+            str(pair[0]),
+            str(pair[1]),
+            output_field_file,
+            output_result_file
+        ]
+
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=5)
+        except Exception as e:
+            print(f"[ERROR] Simulator failed: {e}", flush=True)
+            return None
+
+        max_wait = 100
+        wait_count = 0
+        while not os.path.exists(output_result_file) and wait_count < max_wait:
+            time.sleep(0.01)
+            wait_count += 1
+
+        if not os.path.exists(output_result_file):
+            print(f"[ERROR] Result file not created", flush=True)
+            return None
+
+        try:
+            next_board = np.loadtxt(output_field_file, delimiter=',', dtype=np.int8)
+
+            with open(output_result_file, 'r') as f:
+                lines = f.readlines()
+                score = int(lines[0].strip())
+                chain_count = int(lines[1].strip())
+        except Exception as e:
+            print(f"[ERROR] Failed to read result:  {e}", flush=True)
+            return None
+        finally:
+            try:
+                os.remove(input_file)
+                os.remove(output_field_file)
+                os.remove(output_result_file)
+            except:
+                pass
+
+        return next_board, score, chain_count
+
+    def close(self):
+        pass
+
+
+class ServerSimulator:
+    """
+    シミュレータを `--server` モードで常駐させ、標準入出力のバイナリで1手ずつやり取りする
+
+    プロセスはワーカー（プロセス）ごとに1つだけ起動し、全ステップで使い回す。
+    fork等でPIDが変わった場合は、そのプロセス用に起動し直す。
+    起動時に挨拶（マジックと版数）を確かめ、--server 非対応の古いexeや版数違いは RuntimeError にする。
+    標準出力は別スレッドで読み、timeout 秒以内に応答が無ければ止まったとみなす（Windowsでも使える）。
+    サーバーが落ちた・止まった場合は RuntimeError（引数エラーだけは他のバックエンドと同じく None）。
+    """
+    def __init__(self, simulator_path, timeout=5):
+        self.simulator_path = simulator_path
+        self.timeout = timeout
+        self._proc = None
+        self._owner_pid = None
+        self._replies = None
+        self._request = bytearray(REQUEST_SIZE)
+
+    def _ensure_started(self):
+        if self._proc is not None and self._owner_pid == os.getpid():
+            returncode = self._proc.poll()
+            if returncode is None:
+                return
+            self._proc = None
+            raise RuntimeError(f"Simulator server {self.simulator_path} has exited (code {returncode})")
+        self._proc = subprocess.Popen(
+            [self.simulator_path, '--server'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._owner_pid = os.getpid()
+        self._replies = queue.Queue()
+        threading.Thread(target=_read_replies, args=(self._proc.stdout, self._replies), daemon=True).start()
+
+        hello = self._receive(_HELLO.size)
+        if hello is None:
+            raise RuntimeError(f"Simulator server {self.simulator_path} exited without a handshake; "
+                               f"rebuild puyop_simulator with --server support")
+        magic, version = _HELLO.unpack(hello)
+        if magic != SERVER_MAGIC or version != SERVER_PROTOCOL_VERSION:
+            self._kill()
+            raise RuntimeError(f"Simulator server {self.simulator_path} speaks {magic!r} v{version}, "
+                               f"expected {SERVER_MAGIC!r} v{SERVER_PROTOCOL_VERSION}; rebuild puyop_simulator")
+
+    def _receive(self, size):
+        """読み取りスレッドから size バイトを受け取る（EOFなら None。timeout 秒で応答が無ければ RuntimeError）"""
+        try:
+            data = self._replies.get(timeout=self.timeout)
+        except queue.Empty:
+            self._kill()
+            raise RuntimeError(f"Simulator server {self.simulator_path} did not respond within {self.timeout}s")
+        if len(data) != size:
+            self._kill()
+            return None
+        return data
+
+    def step(self, board, x, r, pair):
+        self._ensure_started()
+
+        request = self._request
+        request[:BOARD_SIZE] = np.ascontiguousarray(board, dtype=np.int8).tobytes()
+        request[BOARD_SIZE:] = bytes((x, r, pair[0], pair[1]))
+
+        try:
+            self._proc.stdin.write(request)
+            self._proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            self._kill()
+            raise RuntimeError(f"Simulator server {self.simulator_path} has exited: {e}") from e
+
+        reply = self._receive(REPLY_SIZE)
+        if reply is None:
+            raise RuntimeError(f"Simulator server {self.simulator_path} closed unexpectedly")
+
+        score, chain_count, status = _REPLY_TAIL.unpack_from(reply, BOARD_SIZE)
+        if status < 0:
+            print(f"[ERROR] Simulator server rejected: x={x}, r={r}, pair={pair}", flush=True)
+            return None
+        next_board = np.frombuffer(reply, dtype=np.int8, count=BOARD_SIZE).reshape(BOARD_HEIGHT, BOARD_WIDTH).copy()
+        return next_board, score, chain_count
+
+    def close(self):
+        proc = self._proc
+        self._proc = None
+        if proc is None or self._owner_pid != os.getpid():
+            return
+        try:
+            proc.stdin.close()
+            proc.wait(timeout=self.timeout)
+        except Exception:
+            proc.kill()
+
+    def _kill(self):
+        """応答しない・落ちたサーバーを待たずに止める（次の step で起動し直す）"""
+        proc = self._proc
+        self._proc = None
+        if proc is None or self._owner_pid != os.getpid():
+            return
+        proc.kill()
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _read_replies(stream, replies):
+    """サーバーの標準出力を読み、挨拶と応答を1つずつ replies に積む（EOFなら短いバイト列を積んで終わる）"""
+    size = _HELLO.size
+    while True:
+        data = stream.read(size)
+        replies.put(data)
+        if len(data) != size:
+            return
+        size = REPLY_SIZE
+
+
+BACKENDS = {
+    'subprocess': SubprocessSimulator,
+    'server': ServerSimulator,
+}
+
+
+def create_simulator(backend, simulator_path=None, **kwargs):
+    """
+    名前からバックエンドを生成
+
+    'native' の場合 simulator_path は共有ライブラリ（puyo_capi.dll / .so）のパス
+    'python' の場合 simulator_path は使わない（C++不要のPython版エンジン）
+    """
+    if backend == 'native':
+        from puyo_native import NativeSimulator
+        return NativeSimulator(simulator_path, **kwargs)
+    if backend == 'python':
+        from puyo_engine import PythonSimulator
+        return PythonSimulator(**kwargs)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown simulator backend: {backend} (choose from {', '.join(list(BACKENDS) + ['native', 'python'])})")
+    if simulator_path is None:
+        simulator_path = DEFAULT_SIMULATOR_PATH
+    if not os.path.exists(simulator_path):
+        raise FileNotFoundError(f"Simulator not found:   {simulator_path}")
+    return BACKENDS[backend](simulator_path, **kwargs)
@@ -1,23 +1,185 @@
 """
 Solver（モンテカルロ + 最終ボーナス + 早期ゲームオーバーペナルティ・真手数カウント対応版）
 """
+import time
 import numpy as np
+from data_loader import TensorDataLoader
+from inference import InferenceNet
+from lru_cache import LRUCache
 from mcts import MCTS
+from parallel_mcts import RootParallelMCTS
 from puyopuyo_env_cpp import PuyoPuyoGame
 from puyop_url_encoder import PuyopURLEncoder
+from selfplay_pool import SelfPlayPool
 
 class Solver:
-    def __init__(self, game, net, num_sims=50, temp_threshold=10):
+    def __init__(self, game, net, num_sims=50, temp_threshold=10, search_batch_size=1, reuse_tree=True,
+                 num_search_workers=1, early_stop=True, time_budget=None, stability_threshold=None,
+                 beam_prior=None, eval_cache_size=100000, inference_quantize=None, inference_server=False,
+                 num_selfplay_workers=1):
         self.game = game
         self.net = net
         self.num_sims = num_sims
         self.temp_threshold = temp_threshold
+        self.search_batch_size = search_batch_size  # >1 なら葉をまとめて推論（MCTS.search_batch）
+        self.reuse_tree = reuse_tree                # 実際の次の盤面の部分木を引き継ぐ（根の訪問回数は0からやり直す）
+        self.num_search_workers = num_search_workers  # >1 ならルート並列（ワーカープロセスで探索して根の訪問回数を合算）
+        self.early_stop = early_stop                # t=0 の手で1位が逆転できなくなったら探索を打ち切る（方策は変わらない）
+        self.time_budget = time_budget              # 1手あたりの探索時間の上限（秒、Noneなら無制限）
+        self.stability_threshold = stability_threshold  # 訪問割合の変化がこれ未満になったら打ち切る（Noneなら使わない）
+        self.beam_prior = beam_prior                # BeamPrior なら、根の事前確率にビームサーチの分布を混ぜる
+        # 評価キャッシュ: 盤面ハッシュ → (マスク済みの方策, 価値)。エピソードをまたいで使い、train() で捨てる
+        self.eval_cache_size = eval_cache_size
+        self.eval_cache = LRUCache(eval_cache_size) if eval_cache_size > 0 else None
+        self._weights_version = 0
+        self._eval_cache_hits = 0
+        self._eval_cache_evaluations = 0
+        self._inference = None           # 推論用ネットワーク（重みのバージョンが変わったら作り直す）
+        self._inference_version = None
+        # 自己対戦の推論だけ int8 にする（None / 'dynamic' / 'static'）。学習は fp32 のまま
+        # 'static' のキャリブレーションには直前の train() の盤面を使う（まだ無ければ 'dynamic'）
+        self.inference_quantize = inference_quantize
+        self._calibration_boards = None
+        # ルート並列・自己対戦ワーカーの推論を推論サーバー1プロセスにまとめる（ワーカーは重みを持たない）
+        self.inference_server = inference_server
+        self._search_pool = None
+        # >1 なら execute_episodes でエピソードごとにワーカープロセスへ割り当てる（ワーカーはイテレーションをまたいで使い回す）
+        self.num_selfplay_workers = num_selfplay_workers
+        self._selfplay_pool = None
+    
+    def _create_search(self, nnet):
+        """1エピソード分の探索器（ルート並列ならワーカーは使い回し、重みと木だけリセット）"""
+        inference_kwargs = self._inference_kwargs()
+        if self.num_search_workers <= 1:
+            if self._inference is None or self._inference_version != self._weights_version:
+                # 推論サーバーのクライアント（自己対戦ワーカー）はそのまま使う
+                self._inference = InferenceNet.wrap(nnet, **inference_kwargs)
+                self._inference_version = self._weights_version
+            return MCTS(game=self.game, net=self._inference, num_sims=self.num_sims, batch_size=self.search_batch_size,
+                        prior_source=self.beam_prior, eval_cache=self.eval_cache)
+        if self._search_pool is None:
+            self._search_pool = RootParallelMCTS(
+                self.game, nnet, self.num_search_workers, num_sims=self.num_sims, batch_size=self.search_batch_size,
+                prior_source=self.beam_prior, eval_cache_size=self.eval_cache_size,
+                inference_server=self.inference_server,
+            )
+        self._search_pool.reset(nnet, weights_version=self._weights_version, inference_kwargs=inference_kwargs)
+        return self._search_pool
+    
+    @property
+    def weights_version(self):
+        """今の重みのバージョン（new_weights のたびに1増える）"""
+        return self._weights_version
+    
+    def _inference_kwargs(self):
+        quantize = self.inference_quantize
+        if quantize == 'static' and self._calibration_boards is None:
+            quantize = 'dynamic'
+        return {'quantize': quantize, 'calibration': self._calibration_boards}
+    
+    def invalidate_eval_cache(self):
+        """重みが変わったので評価キャッシュを捨てる（ルート並列のワーカーは次の reset で捨てる）"""
+        if self.eval_cache is not None:
+            self.eval_cache.clear()
+        self._weights_version += 1
+    
+    def eval_cache_stats(self, reset=True):
+        """前回 reset してからのエピソードの評価キャッシュのヒット率（entries はこのプロセスのキャッシュだけ）"""
+        hits = self._eval_cache_hits
+        evaluations = self._eval_cache_evaluations
+        stats = {
+            'hits': hits,
+            'evaluations': evaluations,
+            'hit_rate': hits / (hits + evaluations) if hits + evaluations > 0 else 0.0,
+            'entries': len(self.eval_cache) if self.eval_cache is not None else 0,
+        }
+        if reset:
+            self._eval_cache_hits = 0
+            self._eval_cache_evaluations = 0
+        return stats
+    
+    def load_weights(self, state_dict, calibration=None):
+        """
+        別のプロセスで学習した重みを読み込む（自己対戦ワーカー用。評価キャッシュは捨てる）
+        state_dict が None なら重みは推論サーバー側で替わっているので、評価キャッシュを捨てるだけ
+        """
+        if state_dict is not None:
+            self.net.load_state_dict(state_dict)
+        if calibration is not None:
+            self._calibration_boards = calibration
+        self.invalidate_eval_cache()
+    
+    def execute_episodes(self, nnet, num_episodes):
+        """
+        num_episodes 回の自己対戦（num_selfplay_workers > 1 ならワーカープロセスで同時に回す）
+        返り値: [(examples, result), ...]（エピソード番号順。execute_episode を順に呼んだのと同じ形）
+        """
+        if self.num_selfplay_workers <= 1:
+            episodes = []
+            for ep in range(num_episodes):
+                print(f"エピソード {ep + 1}/{num_episodes}", flush=True)
+                episodes.append(self.execute_episode(nnet))
+            return episodes
+        
+        episodes, cache_stats = self.selfplay_pool(nnet).run(
+            num_episodes,
+            on_start=lambda ep, worker: print(f"エピソード {ep + 1}/{num_episodes}（ワーカー{worker}）", flush=True),
+        )
+        self.add_eval_cache_stats(cache_stats)
+        self._print_server_stats(self._selfplay_pool)
+        return episodes
+    
+    def selfplay_pool(self, nnet=None):
+        """
+        自己対戦ワーカー（最低1プロセス）。初回に起動し、以後は使い回す
+        今の重み（nnet、None なら self.net）を次に割り当てるエピソードから使わせる
+        """
+        if nnet is None:
+            nnet = self.net
+        if self._selfplay_pool is None:
+            self._selfplay_pool = SelfPlayPool(
+                self.game, nnet, max(1, self.num_selfplay_workers), solver_kwargs=self._selfplay_solver_kwargs(),
+                inference_server=self.inference_server,
+            )
+        self._selfplay_pool.load_weights(nnet, version=self._weights_version, calibration=self._calibration_boards,
+                                         inference_kwargs=self._inference_kwargs())
+        return self._selfplay_pool
+    
+    def _selfplay_solver_kwargs(self):
+        """自己対戦ワーカーの Solver を同じ設定で作るための引数"""
+        return {
+            'num_sims': self.num_sims,
+            'temp_threshold': self.temp_threshold,
+            'search_batch_size': self.search_batch_size,
+            'reuse_tree': self.reuse_tree,
+            'early_stop': self.early_stop,
+            'time_budget': self.time_budget,
+            'stability_threshold': self.stability_threshold,
+            'beam_prior': self.beam_prior,
+            'eval_cache_size': self.eval_cache_size,
+            'inference_quantize': self.inference_quantize,
+        }
+    
+    def add_eval_cache_stats(self, stats):
+        """別プロセス（自己対戦ワーカー）の評価キャッシュのヒット数・推論数を足す"""
+        self._eval_cache_hits += stats['hits']
+        self._eval_cache_evaluations += stats['evaluations']
+    
+    def close(self):
+        """ルート並列・自己対戦のワーカープロセスを止める"""
+        if self._search_pool is not None:
+            self._search_pool.close()
+            self._search_pool = None
+        if self._selfplay_pool is not None:
+            self._selfplay_pool.close()
+            self._selfplay_pool = None
     
     def execute_episode(self, nnet):
         examples = []
-        mcts = MCTS(game=self.game, net=nnet, num_sims=self.num_sims)
+        mcts = self._create_search(nnet)
         
         state = self.game.reset()
+        self.game.reset_cache_stats()
         url_encoder = PuyopURLEncoder()
         url_encoder.reset()
         current_pair = self._generate_random_pair()
@@ -35,22 +197,34 @@ class Solver:
         
         immediate_rewards = []
         last_garbage_cols = None
+        tree_stats = []              # 1手ごとの探索木のノード数・メモリ量
+        inherited_nodes = []         # 1手ごとの、前の手の探索から引き継いだノード数
+        sims_used = []               # 1手ごとの、(実際に回したシミュレーション数, 予算)
 
         temperature = 1
 
         while True:
-            # 1. MCTS探索
-            for i in range(self.num_sims):
-                mcts.search(state.copy())
-            
             if num_moves > self.temp_threshold:
                 temperature = 0
             else:
                 temperature = 1
             
+            # 1. MCTS探索（引き継いだ部分木の子の統計は使うが、根の訪問はこのペアで num_sims 回やり直す）
+            inherited_nodes.append(mcts.advance_root(state) if self.reuse_tree else 0)
+            budget = self.num_sims
+            # 今置くペアは分かっているので、根の手はそのペアで探索する
+            # 1位が逆転できないかの打ち切りは t=0 の手だけ（t=1 の手は訪問回数の分布が教師になるため）
+            used = mcts.run_anytime(
+                state, budget, time_budget=self.time_budget, pair=current_pair,
+                stop_when_decided=self.early_stop and temperature == 0,
+                stability_threshold=self.stability_threshold,
+            )
+            sims_used.append((used, budget))
+            
             pi = mcts.get_action_probabilities(state, t=temperature)
+            tree_stats.append(mcts.tree_stats())
             
-            valid = self.game.get_valid_moves(state)
+            valid = self.game.board_info(state).valid_moves
             pi = pi * valid  # 有効手以外は確率0
             if np.sum(pi) == 0:
                 # もしpi全部0のときは有効手一様
@@ -95,7 +269,7 @@ class Solver:
 
             # 5. last_action系情報を必ず盤面確定直後に更新
             last_action_col = x
-            last_action_row = self.game._get_column_height(state, x) - 1
+            last_action_row = self.game.board_info(state).heights[x] - 1
             last_garbage_cols = garbage_columns.copy() if len(garbage_columns) > 0 else []
 
             # 6. ペナルティ判定・表示（必ずlast_action更新後で！）
@@ -155,6 +329,15 @@ class Solver:
                 url = url_encoder.generate_url()
                 print(f"エピソード終了（{true_step_count}手、{chain_str}、スコア{total_score}、おじゃま{ojama_drop_count}回）:   最終ボーナス={final_bonus:.3f}", flush=True)
                 print(f"  URL: {url}", flush=True)
+                self._print_cache_stats()
+                self._print_tree_stats(tree_stats, inherited_nodes)
+                search_stats = mcts.search_stats()
+                self._print_search_stats(search_stats)
+                self._eval_cache_hits += search_stats['cache_hits']
+                self._eval_cache_evaluations += search_stats['evaluations']
+                self._print_budget_stats(sims_used)
+                self._print_beam_stats()
+                self._print_server_stats()
                 returns = self._calculate_returns_with_bonus(immediate_rewards, final_bonus, gamma=0.99)
                 # ⭐ここでepisode_resultの定義を必ず入れる！
                 episode_result = {
@@ -177,6 +360,15 @@ class Solver:
                 url = url_encoder.generate_url()
                 print(f"最大手数到達（{true_step_count}手、{chain_str}、スコア{total_score}、おじゃま{ojama_drop_count}回）: 最終ボーナス={final_bonus:.3f}", flush=True)
                 print(f"  URL: {url}", flush=True)
+                self._print_cache_stats()
+                self._print_tree_stats(tree_stats, inherited_nodes)
+                search_stats = mcts.search_stats()
+                self._print_search_stats(search_stats)
+                self._eval_cache_hits += search_stats['cache_hits']
+                self._eval_cache_evaluations += search_stats['evaluations']
+                self._print_budget_stats(sims_used)
+                self._print_beam_stats()
+                self._print_server_stats()
                 returns = self._calculate_returns_with_bonus(immediate_rewards, final_bonus, gamma=0.99)
                 episode_result = {
                     "score": total_score,
@@ -237,6 +429,61 @@ class Solver:
         normalized = np.tanh(normalized * 0.5)
         return normalized.tolist()
     
+    def _print_cache_stats(self):
+        stats = self.game.cache_stats()
+        if stats is None:
+            return
+        print(f"  遷移キャッシュ: hit={stats['hits']} miss={stats['misses']} "
+              f"({stats['hit_rate']:.1%}), entries={stats['entries']}, evicted={stats['evictions']}", flush=True)
+    
+    def _print_tree_stats(self, tree_stats, inherited_nodes):
+        if not tree_stats:
+            return
+        largest = max(tree_stats, key=lambda stats: stats['nodes'])
+        print(f"  探索木: 最大nodes={largest['nodes']} (チャンスノード{largest['chance_nodes']}), "
+              f"memory={largest['allocated_bytes'] / 1024:.0f}KB 確保 (容量{largest['capacity']}行, "
+              f"{largest['bytes_per_row']}B/行)", flush=True)
+        if self.reuse_tree:
+            print(f"  木の再利用: 引き継ぎノード 平均{np.mean(inherited_nodes):.1f}/手 "
+                  f"(最大{max(inherited_nodes)})", flush=True)
+    
+    def _print_search_stats(self, stats):
+        if stats['sims'] == 0:
+            return
+        print(f"  探索: {stats['sims']}sims, {stats['us_per_sim']:.0f}us/sim "
+              f"(推論以外 {stats['overhead_us_per_sim']:.0f}us), 深さ 平均{stats['mean_depth']:.1f} 最大{stats['max_depth']}, "
+              f"打ち切り{stats['cutoffs']}回, 推論{stats['evaluations']}回 (キャッシュhit {stats['cache_hits']}回)", flush=True)
+    
+    def _print_budget_stats(self, sims_used):
+        if not sims_used:
+            return
+        used = np.array([u for u, _ in sims_used])
+        budget = np.array([b for _, b in sims_used])
+        stopped = int(np.sum(used < budget))
+        saved = 1 - used.sum() / budget.sum() if budget.sum() > 0 else 0.0
+        print(f"  探索量: 平均{used.mean():.1f}/{budget.mean():.1f}sims/手, "
+              f"早期終了{stopped}/{len(sims_used)}手 (予算の{saved:.1%}を節約)", flush=True)
+    
+    def _print_beam_stats(self):
+        # ルート並列ではワーカーごとにキャッシュを持つので、ここでは単一プロセスのときだけ出す
+        if self.beam_prior is None or self.num_search_workers > 1:
+            return
+        stats = self.beam_prior.stats()
+        print(f"  ビームサーチ事前確率: {stats['searches']}回探索, キャッシュ hit={stats['hits']} "
+              f"({stats['hit_rate']:.1%}), entries={stats['entries']}", flush=True)
+    
+    def _print_server_stats(self, pool=None):
+        """推論サーバーの統計（pool が None ならルート並列の探索器のもの）"""
+        if pool is None:
+            pool = self._search_pool
+        if pool is None:
+            return
+        stats = pool.server_stats()
+        if stats is None or stats['batches'] == 0:
+            return
+        print(f"  推論サーバー: {stats['requests']}要求 / {stats['batches']}バッチ "
+              f"(平均{stats['mean_batch']:.1f}盤面/バッチ), 重み差し替え{stats['weight_swaps']}回", flush=True)
+    
     def _format_chain_events(self, chain_events):
         if len(chain_events) == 0:
             return "連鎖なし"
@@ -254,34 +501,92 @@ class Solver:
         color2 = np.random.randint(1, 5)
         return (color1, color2)
     
-    def train(self, examples, batch_size=32, epochs=10):
+    def create_optimizer(self):
+        """学習用の optimizer（ネットワークは GPU があれば GPU に移す）"""
         import torch
         import torch.optim as optim
         
-        optimizer = optim.Adam(self.net.parameters(), lr=0.0005)
         device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         self.net = self.net.to(device)
+        return optim.Adam(self.net.parameters(), lr=0.0005)
+    
+    def train_batch(self, optimizer, batch):
+        """1ミニバッチ分の更新（batch は (盤面, 方策, 価値) のリスト）。損失を返す"""
+        return self.train_arrays(optimizer, np.array([s for s, _, _ in batch]),
+                                 np.array([pi for _, pi, _ in batch]), np.array([z for _, _, z in batch]))
+    
+    def train_arrays(self, optimizer, boards, policies, values):
+        """1ミニバッチ分の更新（盤面 (n, 14, 6)・方策 (n, 24)・価値 (n,) の配列。リプレイバッファから）。損失を返す"""
+        import torch
+        
+        device = next(self.net.parameters()).device
+        states = torch.from_numpy(np.asarray(boards, dtype=np.float32)).unsqueeze(1).to(device)
+        target_pis = torch.from_numpy(np.asarray(policies, dtype=np.float32)).to(device)
+        target_vs = torch.from_numpy(np.asarray(values, dtype=np.float32)).view(-1, 1).to(device)
+        return self.train_tensors(optimizer, states, target_pis, target_vs)
+    
+    def train_tensors(self, optimizer, states, target_pis, target_vs):
+        """1ミニバッチ分の更新（ネットワークと同じデバイスのテンソル (n, 1, 14, 6), (n, 24), (n, 1)）。損失を返す"""
+        import torch
+        
+        pred_pis, pred_vs = self.net(states)
+        loss_pi = -torch.sum(target_pis * torch.log(pred_pis + 1e-8)) / target_pis.size(0)
+        loss_v = torch.sum((target_vs - pred_vs) ** 2) / target_vs.size(0)
+        loss = loss_pi + loss_v
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+        return loss.item()
+    
+    def new_weights(self, calibration_boards=None):
+        """
+        学習で重みが変わったら呼ぶ: 評価キャッシュを捨てて重みのバージョンを進める
+        calibration_boards (n, 14, 6) を渡したら、先頭256個を静的量子化のキャリブレーション用に取っておく
+        返り値: 新しい重みのバージョン
+        """
+        if calibration_boards is not None and len(calibration_boards) > 0:
+            self._calibration_boards = np.asarray(calibration_boards[:256], dtype=np.int8)
+        self.invalidate_eval_cache()
+        return self._weights_version
+    
+    def train(self, examples, batch_size=32, epochs=10, prefetch=True):
+        optimizer = self.create_optimizer()
+        # 例は最初に1回だけ連続したテンソルにし、エポックごとのシャッフルは添字の並べ替えだけにする
+        device = next(self.net.parameters()).device
+        loader = TensorDataLoader.from_examples(examples, device=device, batch_size=batch_size, prefetch=prefetch)
         
         print(f"学習開始（データ数:  {len(examples)}）", flush=True)
         
         for epoch in range(epochs):
-            np.random.shuffle(examples)
+            start = time.perf_counter()
+            total_loss = 0
+            for states, target_pis, target_vs in loader:
+                total_loss += self.train_tensors(optimizer, states, target_pis, target_vs)
+            avg_loss = total_loss / len(loader)
+            samples_per_sec = loader.num_samples / (time.perf_counter() - start)
+            print(f"    Epoch {epoch+1}/{epochs}, Loss: {avg_loss:.4f}, {samples_per_sec:.0f} samples/s", flush=True)
+        # 静的量子化のキャリブレーション用に自己対戦の盤面を取っておく
+        self.new_weights(calibration_boards=loader.random_boards(256))
+        print(f"学習完了", flush=True)
+    
+    def train_replay(self, buffer, batch_size=32, epochs=10):
+        """
+        リプレイバッファ（replay_buffer.ReplayBuffer）の窓の中から一様に取ったミニバッチで学習する
+        1エポック = 窓の行数 / batch_size ステップ
+        """
+        optimizer = self.create_optimizer()
+        steps = max(1, len(buffer) // batch_size)
+        stats = buffer.stats()
+        
+        print(f"学習開始（リプレイバッファ: {len(buffer)}行, イテレーション"
+              f"{stats['oldest_iteration']}〜{stats['newest_iteration']}）", flush=True)
+        
+        for epoch in range(epochs):
+            start = time.perf_counter()
             total_loss = 0
-            batches = 0
-            for i in range(0, len(examples), batch_size):
-                batch = examples[i:i+batch_size]
-                states = torch.FloatTensor(np.array([s for s, _, _ in batch])).unsqueeze(1).to(device)
-                target_pis = torch.FloatTensor(np.array([pi for _, pi, _ in batch])).to(device)
-                target_vs = torch.FloatTensor(np.array([[z] for _, _, z in batch])).to(device)
-                pred_pis, pred_vs = self.net(states)
-                loss_pi = -torch.sum(target_pis * torch.log(pred_pis + 1e-8)) / target_pis.size(0)
-                loss_v = torch.sum((target_vs - pred_vs) ** 2) / target_vs.size(0)
-                loss = loss_pi + loss_v
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
-                total_loss += loss.item()
-                batches += 1
-            avg_loss = total_loss / batches
-            print(f"    Epoch {epoch+1}/{epochs}, Loss: {avg_loss:.4f}", flush=True)
+            for _ in range(steps):
+                total_loss += self.train_arrays(optimizer, *buffer.sample(batch_size))
+            samples_per_sec = steps * batch_size / (time.perf_counter() - start)
+            print(f"    Epoch {epoch+1}/{epochs}, Loss: {total_loss / steps:.4f}, {samples_per_sec:.0f} samples/s", flush=True)
+        self.new_weights(calibration_boards=buffer.recent_boards(256))
         print(f"学習完了", flush=True)
\ No newline at end of file
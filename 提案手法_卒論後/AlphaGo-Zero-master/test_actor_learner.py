@@ -0,0 +1,66 @@
+"""
+ActorLearner のバッファのテスト（max_staleness 版より古い重みで打った例を捨てるか）
+ワーカーは起動せず、重みのバージョンだけを持つ代わりの Solver で回す
+"""
+from actor_learner import ActorLearner
+
+
+class VersionPool:
+    def __init__(self, version):
+        self.weights_version = version
+
+
+class VersionSolver:
+    """ActorLearner が使う Solver のうち、バッファの出し入れに要るものだけ"""
+    def __init__(self):
+        self.version = 0
+        self.cache_stats = []
+
+    def create_optimizer(self):
+        return None
+
+    def selfplay_pool(self):
+        return VersionPool(self.version)
+
+    def add_eval_cache_stats(self, stats):
+        self.cache_stats.append(stats)
+
+
+def record(version, examples):
+    return {'episode': 0, 'examples': examples, 'result': {},
+            'version': version, 'cache_stats': {'hits': 0, 'evaluations': 0}}
+
+
+def make_learner(version, **kwargs):
+    solver = VersionSolver()
+    solver.version = version
+    return ActorLearner(solver, **kwargs)
+
+
+def test_add_skips_episodes_older_than_max_staleness():
+    learner = make_learner(5, max_staleness=2)
+    results, new_examples = [], []
+    learner._add([record(2, ['a']), record(3, ['b', 'c']), record(5, ['d'])], results, new_examples)
+    assert learner.examples == ['b', 'c', 'd']
+    assert learner.versions == [3, 3, 5]
+    assert new_examples == ['b', 'c', 'd']
+    # 捨てたエピソードも結果とキャッシュの統計には数える
+    assert len(results) == 3 and learner.num_episodes == 3
+    assert len(learner.solver.cache_stats) == 3
+
+
+def test_add_keeps_only_the_newest_replay_size_examples():
+    learner = make_learner(1, max_staleness=2, replay_size=3)
+    learner._add([record(0, ['a', 'b']), record(1, ['c', 'd'])], [], [])
+    assert learner.examples == ['b', 'c', 'd']
+    assert learner.versions == [0, 1, 1]
+
+
+def test_drop_stale_after_publishing_new_weights():
+    learner = make_learner(1, max_staleness=1)
+    learner._add([record(0, ['a']), record(1, ['b'])], [], [])
+    assert learner.examples == ['a', 'b']
+    learner.version = 2
+    learner._drop_stale()
+    assert learner.examples == ['b']
+    assert learner.versions == [1]
@@ -0,0 +1,74 @@
+"""
+TensorDataLoader のバッチが1エポックで全例をちょうど1回ずつ覆うかのテスト
+"""
+import numpy as np
+import pytest
+import torch
+
+from data_loader import TensorDataLoader
+
+
+def make_examples(n):
+    """盤面の左下に例の番号を入れておく（方策・価値もそこから決める）"""
+    examples = []
+    for i in range(n):
+        board = np.zeros((14, 6), dtype=np.int8)
+        board[0, 0] = i % 100
+        board[0, 1] = i // 100
+        pi = np.zeros(24, dtype=np.float32)
+        pi[i % 24] = 1.0
+        examples.append((board, pi, i / n))
+    return examples
+
+
+def example_ids(states):
+    return (states[:, 0, 0, 0] + 100 * states[:, 0, 0, 1]).long().tolist()
+
+
+@pytest.mark.parametrize('prefetch', [False, True])
+@pytest.mark.parametrize('n, batch_size', [(100, 32), (96, 32), (5, 8)])
+def test_epoch_covers_every_example_once(n, batch_size, prefetch):
+    loader = TensorDataLoader.from_examples(make_examples(n), batch_size=batch_size, prefetch=prefetch)
+    assert loader.num_samples == n
+    assert len(loader) == -(-n // batch_size)
+
+    for _ in range(2):
+        seen = []
+        sizes = []
+        for states, target_pis, target_vs in loader:
+            ids = example_ids(states)
+            # 方策・価値は同じ例の行が一緒に並ぶ
+            assert target_pis.argmax(dim=1).tolist() == [i % 24 for i in ids]
+            np.testing.assert_allclose(target_vs[:, 0].numpy(), np.array(ids) / n, rtol=1e-6)
+            assert states.shape[1:] == (1, 14, 6) and target_vs.shape[1:] == (1,)
+            seen.extend(ids)
+            sizes.append(len(ids))
+        assert sorted(seen) == list(range(n))
+        assert sizes[:-1] == [batch_size] * (len(sizes) - 1)
+        assert len(sizes) == len(loader)
+
+
+def test_shuffle_changes_order_between_epochs():
+    np.random.seed(0)
+    loader = TensorDataLoader.from_examples(make_examples(64), batch_size=64, prefetch=False)
+    first = example_ids(next(iter(loader))[0])
+    second = example_ids(next(iter(loader))[0])
+    assert first != second
+    ordered = TensorDataLoader.from_examples(make_examples(64), batch_size=64, shuffle=False)
+    assert example_ids(next(iter(ordered))[0]) == list(range(64))
+
+
+def test_stopping_early_releases_prefetch_thread():
+    loader = TensorDataLoader.from_examples(make_examples(100), batch_size=4, prefetch=True)
+    for i, _ in enumerate(loader):
+        if i == 2:
+            break
+    # 途中でやめても次のエポックは最初からすべて出る
+    assert sum(len(states) for states, _, _ in loader) == 100
+
+
+def test_random_boards_returns_int8_boards():
+    loader = TensorDataLoader.from_examples(make_examples(10), batch_size=4)
+    boards = loader.random_boards(4)
+    assert boards.shape == (4, 14, 6) and boards.dtype == np.int8
+    assert torch.is_tensor(loader.states)
@@ -0,0 +1,70 @@
+"""
+InferenceNet（BatchNorm 吸収・TorchScript・int8 量子化）の出力が学習用の net と近いかのテスト
+"""
+import numpy as np
+import pytest
+import torch
+
+from inference import InferenceNet
+from model import PuyoNet
+
+
+@pytest.fixture(scope='module')
+def net():
+    torch.manual_seed(0)
+    return PuyoNet()
+
+
+@pytest.fixture(scope='module')
+def boards():
+    rng = np.random.default_rng(0)
+    boards = np.zeros((64, 14, 6), dtype=np.int8)
+    for board in boards:
+        for x in range(6):
+            height = rng.integers(0, 12)
+            board[:height, x] = rng.choice([1, 2, 3, 4, 6], size=height)
+    return boards
+
+
+def reference(net, boards):
+    """学習用の net（eval モード）の出力 (方策, 価値)"""
+    was_training = net.training
+    net.eval()
+    with torch.no_grad():
+        pi, v = net(torch.from_numpy(boards.astype(np.float32)).unsqueeze(1))
+    net.train(was_training)
+    return pi.numpy(), v.view(-1).numpy()
+
+
+def test_fp32_matches_net(net, boards):
+    policy, value = InferenceNet(net).predict(boards)
+    ref_policy, ref_value = reference(net, boards)
+    np.testing.assert_allclose(policy, ref_policy, atol=1e-5)
+    np.testing.assert_allclose(value, ref_value, atol=1e-5)
+
+
+@pytest.mark.parametrize('quantize', ['dynamic', 'static'])
+def test_int8_stays_close_to_fp32(net, boards, quantize):
+    inference = InferenceNet(net, quantize=quantize, calibration=boards)
+    policy, value = inference.predict(boards)
+    ref_policy, ref_value = reference(net, boards)
+    assert policy.shape == ref_policy.shape and value.shape == ref_value.shape
+    np.testing.assert_allclose(policy.sum(axis=1), 1.0, atol=1e-4)
+    assert np.abs(policy - ref_policy).max() < 0.05
+    assert np.abs(value - ref_value).max() < 0.05
+    # 一番高い手はほとんど変わらない
+    assert (policy.argmax(axis=1) == ref_policy.argmax(axis=1)).mean() >= 0.9
+
+
+def test_training_net_is_not_modified(net, boards):
+    net.train()
+    before = {key: value.clone() for key, value in net.state_dict().items()}
+    InferenceNet(net, quantize='dynamic').predict(boards)
+    assert net.training
+    for key, value in net.state_dict().items():
+        assert torch.equal(value, before[key]), key
+
+
+def test_static_without_calibration_is_rejected(net):
+    with pytest.raises(ValueError):
+        InferenceNet(net, quantize='static')
@@ -0,0 +1,55 @@
+"""
+推論サーバーのテスト（クライアント経由の結果が InferenceNet と同じか、重みの差し替えが効くか）
+"""
+import numpy as np
+import pytest
+import torch
+
+from inference import InferenceNet
+from inference_server import InferenceServer
+from model import PuyoNet
+
+
+def make_net(seed):
+    torch.manual_seed(seed)
+    return PuyoNet().eval()
+
+
+@pytest.fixture(scope='module')
+def boards():
+    rng = np.random.default_rng(0)
+    boards = np.zeros((40, 14, 6), dtype=np.int8)
+    for board in boards:
+        for x in range(6):
+            height = rng.integers(0, 12)
+            board[:height, x] = rng.choice([1, 2, 3, 4, 6], size=height)
+    return boards
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = InferenceServer(make_net(0), num_clients=2, max_batch=16, capacity=32)
+    yield server
+    server.close()
+
+
+def test_two_clients_match_inference_net(server, boards):
+    ref_policy, ref_value = InferenceNet(make_net(0)).predict(boards)
+    # 2つ目のクライアントには capacity を超える要求を送る（クライアント側で分けて送る）
+    for client, part in [(server.client(0), slice(0, 10)), (server.client(1), slice(0, 40))]:
+        policy, value = client.predict(boards[part])
+        np.testing.assert_allclose(policy, ref_policy[part], atol=1e-5)
+        np.testing.assert_allclose(value, ref_value[part], atol=1e-5)
+    assert server.stats()['requests'] >= 2
+
+
+def test_update_weights_changes_outputs(server, boards):
+    before_policy, _ = server.client(0).predict(boards)
+    server.update_weights(make_net(1))
+    ref_policy, ref_value = InferenceNet(make_net(1)).predict(boards)
+    for i in range(2):
+        policy, value = server.client(i).predict(boards)
+        np.testing.assert_allclose(policy, ref_policy, atol=1e-5)
+        np.testing.assert_allclose(value, ref_value, atol=1e-5)
+    assert not np.allclose(policy, before_policy, atol=1e-5)
+    assert server.stats()['weight_swaps'] >= 1
@@ -0,0 +1,94 @@
+"""
+MCTS のテスト（C++不要の 'python' バックエンドと乱数初期化した PuyoNet で回す）
+"""
+import numpy as np
+import pytest
+import torch
+
+from mcts import MCTS
+from model import PuyoNet
+from puyopuyo_env_cpp import PuyoPuyoGame
+
+
+@pytest.fixture(scope='module')
+def net():
+    torch.manual_seed(0)
+    return PuyoNet()
+
+
+def start_board():
+    board = np.zeros((14, 6), dtype=np.int8)
+    board[0] = [1, 2, 3, 4, 1, 2]
+    board[1] = [1, 2, 3, 4, 0, 0]
+    return board
+
+
+def run(net, num_sims, batched):
+    np.random.seed(0)
+    mcts = MCTS(game=PuyoPuyoGame(backend='python'), net=net, num_sims=num_sims)
+    state = start_board()
+    for _ in range(num_sims):
+        if batched:
+            mcts.search_batch(state, 1)
+        else:
+            mcts.search(state)
+    return mcts, state
+
+
+def test_search_batch_of_one_matches_search(net):
+    single, state = run(net, 40, batched=False)
+    batched, _ = run(net, 40, batched=True)
+
+    assert len(single.nodes) == len(batched.nodes)
+    assert single.nodes.index == batched.nodes.index
+    size = len(single.nodes)
+    np.testing.assert_array_equal(single.nodes.N[:size], batched.nodes.N[:size])
+    np.testing.assert_allclose(single.nodes.W[:size], batched.nodes.W[:size], rtol=1e-6)
+    np.testing.assert_array_equal(single.nodes.chance_child[:single.nodes.chance_size],
+                                  batched.nodes.chance_child[:batched.nodes.chance_size])
+    np.testing.assert_array_equal(single.get_action_probabilities(state), batched.get_action_probabilities(state))
+    assert (batched.nodes.V == 0).all()     # 仮想損失は戻っている
+
+
+def test_chance_children_match_next_state(net):
+    mcts, _ = run(net, 60, batched=False)
+    nodes = mcts.nodes
+    game = PuyoPuyoGame(backend='python')
+    checked = 0
+    for idx in range(len(nodes)):
+        for action in np.flatnonzero(nodes.chance[idx] >= 0):
+            for outcome, child in enumerate(nodes.chance_child[nodes.chance[idx, action]]):
+                if child < 0:
+                    continue
+                # 保存した盤面から降りた子は、next_state で進めた盤面と同じノード
+                expected, _, _, _, _ = game.next_state(nodes.board[idx], int(action),
+                                                       current_pair=game.pair_outcomes[outcome], is_simulation=True)
+                assert nodes.lookup(game.hash(expected)) == child
+                np.testing.assert_array_equal(nodes.board[child], expected)
+                checked += 1
+    assert checked > 0
+
+
+def test_advance_root_keeps_only_visits_under_the_real_pair(net):
+    np.random.seed(0)
+    game = PuyoPuyoGame(backend='python')
+    mcts = MCTS(game=game, net=net, num_sims=30)
+    state = start_board()
+    mcts.run_simulations(state, 30)                 # 前の手の探索（次のペアは抽選）
+
+    # 展開済みの子（前の探索で抽選されたペア）へ実際に進む
+    nodes = mcts.nodes
+    action = int(np.argmax(mcts.get_action_probabilities(state, t=0)))
+    children = nodes.chance_child[nodes.chance[nodes.lookup(game.hash(state)), action]]
+    pair = game.pair_outcomes[int(np.flatnonzero(children >= 0)[0])]
+    next_board = game.next_state(state, action, current_pair=pair, is_simulation=True)[0]
+    next_pair = (3, 4)
+    kept = mcts.advance_root(next_board)
+    root = nodes.lookup(game.hash(next_board))
+    assert kept == len(nodes) and root >= 0
+    assert nodes.N[root].sum() == 0 and nodes.total[root] == 0
+
+    # 予算はまるごと今のペアで回し、根の訪問回数（方策の教師）もそのぶんだけ
+    mcts.run_simulations(next_board, 20, pair=next_pair)
+    assert nodes.N[root].sum() == nodes.total[root] == 20
+    np.testing.assert_allclose(mcts.get_action_probabilities(next_board, t=1) * 20, nodes.N[root])
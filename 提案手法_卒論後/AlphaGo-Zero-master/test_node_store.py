@@ -0,0 +1,92 @@
+"""
+NodeStore の追加・伸長・retain_subtree（行の詰め直し）のテスト
+"""
+import numpy as np
+
+from node_store import NodeStore
+
+
+def make_store(capacity=4):
+    """
+    次の木を作る（キーは文字列、行は追加順）:
+        a ─ b ─ d
+        │    └ e
+        └ c ─ f
+    """
+    store = NodeStore(num_actions=3, capacity=capacity, num_outcomes=2, board_shape=(2, 2))
+    rows = {}
+    for key, parent in [('a', None), ('b', 'a'), ('c', 'a'), ('d', 'b'), ('e', 'b'), ('f', 'c')]:
+        priors = np.full(3, 1 / 3)
+        board = np.full((2, 2), len(rows), dtype=np.int8)
+        rows[key] = store.add(key, priors, rows[parent] if parent else -1, value=len(rows) / 10, board=board)
+    # 子へのつながりはチャンスノード経由で持つ（行動0・結果1 → 子）
+    for parent, child, action in [('a', 'b', 0), ('a', 'c', 1), ('b', 'd', 0), ('b', 'e', 1), ('c', 'f', 0)]:
+        row = store.chance_row(rows[parent], action)
+        store.chance_child[row, 1] = rows[child]
+        store.update(rows[parent], action, 0.5)
+    return store, rows
+
+
+def test_add_grows_capacity():
+    store, rows = make_store(capacity=2)
+    assert len(store) == 6
+    assert store.capacity >= 6
+    assert [store.lookup(key) for key in 'abcdef'] == [rows[key] for key in 'abcdef']
+    assert store.lookup('z') == -1
+    np.testing.assert_array_equal(store.board[rows['f']], np.full((2, 2), 5))
+
+
+def test_retain_subtree_remaps_parent_and_children():
+    store, rows = make_store()
+    old_b = rows['b']
+    n_before = store.N[old_b].copy()
+    discarded = store.retain_subtree(old_b)
+
+    assert discarded == 3                      # a, c, f を捨てる
+    assert len(store) == 3
+    assert 'a' not in store and 'c' not in store and 'f' not in store
+    b, d, e = store.lookup('b'), store.lookup('d'), store.lookup('e')
+    assert sorted([b, d, e]) == [0, 1, 2]      # 行は前に詰める
+
+    # 親の行は詰めたあとの番号に付け替え、新しい根の親は -1
+    assert store.parent[b] == -1
+    assert store.parent[d] == b
+    assert store.parent[e] == b
+
+    # チャンスノードの子も付け替える（捨てたノードのチャンスノードは残さない）
+    assert store.chance_size == 2
+    assert store.chance_child[store.chance[b, 0], 1] == d
+    assert store.chance_child[store.chance[b, 1], 1] == e
+    assert (store.chance[store.size:] == -1).all()
+
+    # 行ごとの値も一緒に動く
+    np.testing.assert_array_equal(store.N[b], n_before)
+    np.testing.assert_array_equal(store.board[d], np.full((2, 2), 3))
+    assert store.value[e] == np.float32(0.4)
+    assert (store.N[store.size:] == 0).all()
+
+
+def test_retain_subtree_keeps_adding_after_compaction():
+    store, _ = make_store()
+    store.retain_subtree(store.lookup('c'))
+    g = store.add('g', np.full(3, 1 / 3), parent=store.lookup('f'))
+    assert g == 2
+    assert store.parent[g] == store.lookup('f')
+    assert store.chance_row(store.lookup('c'), 2) == 1     # 次のチャンスノードは詰めた後ろに付く
+
+
+def test_retain_subtree_minus_one_clears():
+    store, _ = make_store()
+    assert store.retain_subtree(-1) == 6
+    assert len(store) == 0
+    assert store.chance_size == 0
+    assert store.lookup('a') == -1
+
+
+def test_stats_report_row_and_allocated_bytes():
+    store, _ = make_store()
+    stats = store.stats()
+    # 行動3つ × (N, W, P, V, chance 4バイト + valid 1バイト) + 盤面4 + parent, value, total 4 + sqrt_total 8
+    assert stats['bytes_per_row'] == 3 * (4 * 5 + 1) + 4 + 4 * 3 + 8
+    assert stats['bytes_per_chance_row'] == 2 * 4 * 2
+    assert stats['allocated_bytes'] >= stats['capacity'] * stats['bytes_per_row']
@@ -0,0 +1,66 @@
+"""
+ルート並列MCTSのテスト（2ワーカーの根の訪問回数が、同じシードで MCTS を2回回して足したものと一致するか）
+"""
+import numpy as np
+import pytest
+import torch
+
+from mcts import MCTS
+from model import PuyoNet
+from parallel_mcts import RootParallelMCTS
+from puyopuyo_env_cpp import PuyoPuyoGame
+
+SEED = 0
+NUM_SIMS = 20
+
+
+@pytest.fixture(scope='module')
+def net():
+    torch.manual_seed(0)
+    return PuyoNet()
+
+
+def start_board():
+    board = np.zeros((14, 6), dtype=np.int8)
+    board[0] = [1, 2, 3, 4, 1, 2]
+    board[1] = [1, 2, 3, 4, 0, 0]
+    return board
+
+
+@pytest.fixture(scope='module')
+def reference(net):
+    """ワーカー i（シード SEED + i）が NUM_SIMS / 2 回探索した根の (N, W) を、このプロセスで足したもの"""
+    game = PuyoPuyoGame(backend='python')
+    board = start_board()
+    N = np.zeros(game.num_actions, dtype=np.int64)
+    W = np.zeros(game.num_actions, dtype=np.float64)
+    for i in range(2):
+        np.random.seed(SEED + i)
+        mcts = MCTS(game=game, net=net, num_sims=NUM_SIMS)
+        mcts.run_simulations(board, NUM_SIMS // 2)
+        idx = mcts.nodes.lookup(game.hash(board))
+        N += mcts.nodes.N[idx]
+        W += mcts.nodes.W[idx]
+    return N, W
+
+
+@pytest.mark.parametrize('inference_server', [False, True])
+def test_root_counts_are_summed_over_workers(net, reference, inference_server):
+    board = start_board()
+    pool = RootParallelMCTS(PuyoPuyoGame(backend='python'), net, 2, num_sims=NUM_SIMS, seed=SEED,
+                            inference_server=inference_server)
+    try:
+        pool.reset(net, weights_version=0)
+        pool.run_simulations(board, NUM_SIMS)
+        ref_N, ref_W = reference
+        np.testing.assert_array_equal(pool.root_counts(board), ref_N)
+        np.testing.assert_allclose(pool.W, ref_W, atol=1e-4)
+        assert np.isclose(sum(pool.get_action_probabilities(board, t=1)), 1.0)
+        assert pool.search_stats()['sims'] == NUM_SIMS
+        assert pool.advance_root(board) == pool.tree_stats()['nodes']
+        if inference_server:
+            assert pool.server_stats()['requests'] > 0
+        else:
+            assert pool.server_stats() is None
+    finally:
+        pool.close()
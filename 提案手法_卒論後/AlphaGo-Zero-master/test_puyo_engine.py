@@ -0,0 +1,72 @@
+"""
+Python版エンジン（puyo_engine）のテスト
+
+C++エンジン（puyo_capi）との一致は fuzz_engine_parity.run_fuzz を少ない手数で回す
+（共有ライブラリが無ければ `make puyo_capi` するまでスキップ）。
+"""
+import ctypes
+
+import numpy as np
+import pytest
+
+import puyo_engine
+from fuzz_engine_parity import random_board, run_fuzz
+
+
+def test_four_connected_pops_as_one_chain():
+    board = np.zeros((14, 6), dtype=np.int8)
+    board[0:3, 0] = 1
+    next_board, score, chain, game_over = puyo_engine.step(board, 0, 0, (1, 2))
+    assert (chain, score, game_over) == (1, 40, False)
+    expected = np.zeros((14, 6), dtype=np.int8)
+    expected[0, 0] = 2          # 残った子ぷよが落ちる
+    np.testing.assert_array_equal(next_board, expected)
+
+
+def test_step_leaves_input_board_unchanged():
+    board = random_board(np.random.default_rng(0))
+    before = board.copy()
+    puyo_engine.step(board, 2, 0, (1, 2))
+    np.testing.assert_array_equal(board, before)
+
+
+def test_python_simulator_rejects_placements_outside_the_wall():
+    simulator = puyo_engine.PythonSimulator()
+    board = np.zeros((14, 6), dtype=np.int8)
+    for x, r in [(0, 3), (5, 1), (-1, 0), (6, 0), (2, 4)]:
+        assert simulator.step(board, x, r, (1, 2)) is None
+    assert simulator.step(board, 0, 1, (1, 2)) is not None
+    assert simulator.step(board, 5, 3, (1, 2)) is not None
+
+
+@pytest.fixture(scope='module')
+def native_lib():
+    from puyo_native import load_library
+    try:
+        return load_library()
+    except (FileNotFoundError, OSError) as e:
+        pytest.skip(f"puyo_capi is not built: {e}")
+
+
+def test_matches_native_engine(native_lib):
+    result = run_fuzz(native_lib, steps=3000, seed=0)
+    assert result['mismatches'] == 0
+    assert result['chains'] > 0      # 連鎖の処理も比べられている
+
+
+def test_native_rejects_placements_outside_the_wall(native_lib):
+    board = random_board(np.random.default_rng(1))
+    out = np.empty_like(board)
+    score = ctypes.c_int32()
+    chain = ctypes.c_int32()
+    for x, r in [(0, 3), (5, 1)]:
+        ret = native_lib.puyo_step(board.ctypes.data, out.ctypes.data, x, r, 1, 2,
+                                   ctypes.byref(score), ctypes.byref(chain))
+        assert ret == -1
+
+    from puyo_native import NativeSimulator
+    boards = np.stack([board, board, board])
+    out, scores, chains, game_overs = NativeSimulator().step_batch(
+        boards, [0, 5, 2], [3, 1, 0], [(1, 2)] * 3)
+    assert game_overs[:2].tolist() == [-1, -1] and game_overs[2] >= 0
+    np.testing.assert_array_equal(out[:2], boards[:2])   # 引数エラーの盤面はそのまま
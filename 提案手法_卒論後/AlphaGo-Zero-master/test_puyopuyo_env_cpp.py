@@ -0,0 +1,91 @@
+"""
+PuyoPuyoGame の盤面ハッシュ・BoardInfo が ndarray と PackedBoard で一致するか、VecPuyoGame が1盤面ずつと同じ結果になるかのテスト
+（C++不要の 'python' バックエンドで回す）
+"""
+import numpy as np
+import pytest
+
+from puyo_state import PackedBoard, zobrist_of_array
+from puyopuyo_env_cpp import PuyoPuyoGame, VecPuyoGame, column_heights
+
+
+@pytest.fixture
+def game():
+    return PuyoPuyoGame(backend='python')
+
+
+def random_boards(count, seed=0):
+    """下から積まれた盤面（ときどきおじゃま入り）"""
+    rng = np.random.default_rng(seed)
+    boards = []
+    for _ in range(count):
+        board = np.zeros((14, 6), dtype=np.int8)
+        for x in range(6):
+            height = rng.integers(0, 13)
+            board[:height, x] = rng.choice([1, 2, 3, 4, 6], size=height)
+        boards.append(board)
+    return boards
+
+
+def test_ndarray_and_packed_board_share_hash(game):
+    for board in random_boards(50):
+        packed = PackedBoard.from_array(board)
+        assert game.hash(board) == game.hash(packed) == packed.zobrist
+        assert zobrist_of_array(board) == packed.zobrist
+
+
+def test_floating_puyo_hashes_like_packed_board():
+    board = np.zeros((14, 6), dtype=np.int8)
+    board[3, 2] = 1     # 宙に浮いたぷよ（PackedBoard では詰められる）
+    board[13, 0] = 2    # 14段目（PackedBoard には残らない）
+    assert zobrist_of_array(board) == PackedBoard.from_array(board).zobrist
+
+
+def test_board_info_accepts_packed_board(game):
+    for board in random_boards(20, seed=1):
+        packed = PackedBoard.from_array(board)
+        from_array = game.board_info(board)
+        from_packed = game.board_info(packed)
+        assert from_array is from_packed    # 同じハッシュでメモ化される
+        np.testing.assert_array_equal(from_packed.heights, packed.heights())
+
+
+def test_board_info_is_not_shared_with_compacted_board(game):
+    board = np.zeros((14, 6), dtype=np.int8)
+    board[11, 2] = 1    # 宙に浮いたぷよ（Zobristハッシュは空の盤面の3列目に1個と同じ）
+    compacted = PackedBoard.from_array(board).to_array()
+    assert game.hash(board) == game.hash(compacted)
+    assert not game.board_info(compacted).game_over
+    assert game.board_info(board).game_over
+    np.testing.assert_array_equal(game.board_info(board).heights, column_heights(board))
+
+
+def test_next_state_accepts_packed_board(game):
+    board = random_boards(1, seed=2)[0]
+    board[:, 2] = 0
+    game.reset()
+    expected = game.next_state(board, 2, current_pair=(1, 2), is_simulation=True)
+    result = game.next_state(PackedBoard.from_array(board), 2, current_pair=(1, 2), is_simulation=True)
+    np.testing.assert_array_equal(result[0], expected[0])
+    assert result[2:4] == expected[2:4]
+    assert game.transition_cache.hits == 1   # 2回目は同じキーでキャッシュから
+
+
+def test_vec_step_matches_next_state(game):
+    boards = random_boards(8, seed=3)
+    rng = np.random.default_rng(3)
+    actions = rng.integers(0, 24, size=len(boards))
+    pairs = rng.integers(1, 5, size=(len(boards), 2))
+
+    vec = VecPuyoGame(len(boards))
+    vec.boards = np.stack(boards)
+    next_boards, scores, chains, game_over, valid_moves = vec.step(actions, pairs, is_simulation=True)
+
+    for i, board in enumerate(boards):
+        next_board, _, score, chain, _ = game.next_state(
+            board, int(actions[i]), current_pair=tuple(pairs[i]), is_simulation=True)
+        np.testing.assert_array_equal(next_boards[i], next_board)
+        assert (scores[i], chains[i]) == (score, chain)
+        info = game.board_info(next_board)
+        assert game_over[i] == info.game_over
+        np.testing.assert_array_equal(valid_moves[i], info.valid_moves)
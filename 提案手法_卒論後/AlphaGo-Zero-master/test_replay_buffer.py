@@ -0,0 +1,91 @@
+"""
+ReplayBuffer（memmap のリングバッファ）の上書き・窓・開き直しのテスト
+"""
+import numpy as np
+import pytest
+
+from replay_buffer import ReplayBuffer
+
+
+def make_rows(n, start):
+    """行番号が分かるように、価値に start からの連番を入れた行"""
+    boards = np.zeros((n, 14, 6), dtype=np.int8)
+    boards[:, 0, 0] = np.arange(start, start + n) % 100
+    policies = np.full((n, 24), 1 / 24, dtype=np.float32)
+    values = np.arange(start, start + n, dtype=np.float32)
+    return boards, policies, values
+
+
+def window_values(buffer):
+    """窓の中の行の価値（古い順）"""
+    rows = (buffer.head - len(buffer) + np.arange(len(buffer))) % buffer.capacity
+    return buffer.values[rows].tolist()
+
+
+def test_wraparound_overwrites_oldest_rows(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), capacity=10, window_iterations=None)
+    buffer.add_arrays(*make_rows(7, 0), iteration=1)
+    buffer.add_arrays(*make_rows(7, 7), iteration=2)
+    assert buffer.size == 10 and buffer.head == 4
+    assert window_values(buffer) == list(range(4, 14))
+
+    # capacity より多く足したら最後の capacity 行だけ残る
+    buffer.add_arrays(*make_rows(25, 100), iteration=3)
+    assert window_values(buffer) == list(range(115, 125))
+
+
+def test_window_keeps_recent_iterations(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), capacity=100, window_iterations=2)
+    start = 0
+    for iteration, n in [(1, 5), (2, 3), (3, 4), (3, 2)]:
+        buffer.add_arrays(*make_rows(n, start), iteration=iteration)
+        start += n
+    assert len(buffer) == 3 + 4 + 2          # イテレーション2と3だけ
+    assert window_values(buffer) == list(range(5, 14))
+    stats = buffer.stats()
+    assert (stats['oldest_iteration'], stats['newest_iteration']) == (2, 3)
+
+    boards, policies, values = buffer.sample(200)
+    assert set(values.tolist()) <= set(range(5, 14))
+    assert policies.dtype == np.float32 and boards.dtype == np.int8
+
+
+def test_window_after_wraparound(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), capacity=8, window_iterations=2)
+    for iteration in range(1, 6):
+        buffer.add_arrays(*make_rows(3, 3 * iteration), iteration=iteration)
+    # 残っているのはイテレーション3（2行）・4・5 で、窓は4と5
+    assert buffer.size == 8
+    assert len(buffer) == 6
+    assert window_values(buffer) == list(range(12, 18))
+
+
+def test_reopen_continues_from_saved_rows(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), capacity=10, window_iterations=3)
+    buffer.add([(np.ones((14, 6)), np.full(24, 1 / 24), 0.5)] * 4, iteration=1, version=7)
+    buffer.add_arrays(*make_rows(8, 0), iteration=2, version=8)
+    del buffer
+
+    reopened = ReplayBuffer(str(tmp_path), capacity=10, window_iterations=3)
+    assert (reopened.size, reopened.head) == (10, 2)
+    assert reopened.last_iteration == 2
+    assert len(reopened) == 10
+    assert window_values(reopened)[-8:] == list(range(8))
+    assert reopened.versions[(reopened.head - 1) % 10] == 8
+
+    reopened.add_arrays(*make_rows(1, 50), iteration=3)
+    assert window_values(reopened)[-1] == 50
+
+
+def test_reopen_with_other_capacity_is_rejected(tmp_path):
+    ReplayBuffer(str(tmp_path), capacity=10).add_arrays(*make_rows(2, 0), iteration=1)
+    with pytest.raises(ValueError):
+        ReplayBuffer(str(tmp_path), capacity=20)
+
+
+def test_decreasing_iteration_is_rejected(tmp_path):
+    buffer = ReplayBuffer(str(tmp_path), capacity=10)
+    buffer.add_arrays(*make_rows(2, 0), iteration=5)
+    with pytest.raises(ValueError):
+        buffer.add_arrays(*make_rows(2, 2), iteration=4)
+    assert buffer.size == 2
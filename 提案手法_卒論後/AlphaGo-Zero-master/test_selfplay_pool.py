@@ -0,0 +1,55 @@
+"""
+自己対戦ワーカーのテスト（2ワーカーで回した結果がエピソード番号順に、同じシードの1プロセス実行と一致するか）
+"""
+import numpy as np
+import pytest
+import torch
+
+from model import PuyoNet
+from puyopuyo_env_cpp import PuyoPuyoGame
+from selfplay_pool import SelfPlayPool
+from solver import Solver
+
+SEED = 10
+SOLVER_KWARGS = {'num_sims': 4, 'eval_cache_size': 0}
+
+
+@pytest.fixture(scope='module')
+def net():
+    torch.manual_seed(0)
+    return PuyoNet()
+
+
+@pytest.fixture(scope='module')
+def reference(net):
+    """ワーカー i の最初のエピソード（シード SEED + i）を、このプロセスで打った結果"""
+    results = []
+    for i in range(2):
+        np.random.seed(SEED + i)
+        torch.manual_seed(SEED + i)
+        solver = Solver(game=PuyoPuyoGame(backend='python'), net=net, **SOLVER_KWARGS)
+        results.append(solver.execute_episode(net))
+    return results
+
+
+@pytest.mark.parametrize('inference_server', [False, True])
+def test_run_returns_episodes_in_order(net, reference, inference_server):
+    pool = SelfPlayPool(PuyoPuyoGame(backend='python'), net, num_workers=2, seed=SEED,
+                        solver_kwargs=SOLVER_KWARGS, inference_server=inference_server)
+    try:
+        pool.load_weights(net, version=0)
+        workers = {}
+        episodes, _ = pool.run(2, on_start=lambda episode, worker: workers.__setitem__(episode, worker))
+        assert workers == {0: 0, 1: 1}
+        for (examples, result), (ref_examples, ref_result) in zip(episodes, reference):
+            assert (result['moves'], result['score']) == (ref_result['moves'], ref_result['score'])
+            assert len(examples) == len(ref_examples)
+
+        if inference_server:
+            assert pool.server_stats()['requests'] > 0
+            pool.load_weights(net, version=1)
+            assert pool.server_stats()['weight_swaps'] == 2
+        else:
+            assert pool.server_stats() is None
+    finally:
+        pool.close()